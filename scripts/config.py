@@ -21,9 +21,22 @@ NOTCH_FILTER = False
 
 # Read Data
 SESSION_RECORDING = True
+DATA_SOURCE = 'board'  # source of a session: 'board', 'replay' (read_data.session_file_name) or 'synthetic'
+STREAM_NOTCH_FILTER = True  # notch filter at NOTCH_FILTER_FREQ of the live stream (StreamFilter)
+BANDPASS_FILTER = None  # (f_low, f_high) in Hz of the streaming bandpass filter, None to disable it
+BANDPASS_FILTER_ORDER = 4
+ACQUISITION_PROCESS = False  # read the board in a separate process which writes into a shared memory ring
+ALGORITHM_PROCESS = False  # process the sliding windows in a worker process, requires ACQUISITION_PROCESS
+LATENCY_TRACING = True  # latency histograms from the samples to the player movement, saved next to the session
 
 # Algorithm
 WEIGHT = 1
+ONLINE_TRAINING = False  # retrain the classifier of the algorithm in the background from the recorded trials
+STAGE_PROFILING = False  # timers of the stages of the algorithm, can also be switched on with "Profiling" in the ui
+CLASSIFIER_FILE = None  # classifier (or session with a classifier next to it) in data/session for the algorithm
+CSP_TRAINING = False  # train CSP filters from the first trials of a session, they replace the montage afterwards
+CSP_TRAINING_TRIALS = 5  # number of left and of right trials which the CSP training waits for
+SIGNAL_DTYPE = 'float64'  # 'float32' processes the windows from the ring buffer to the band powers in float32
 
 # channel configuration of the headset we use
 BCI_CHANNELS = ['C3', 'Cz', 'C4', 'P3', 'Pz', 'P4', 'O1', 'O2', 'FC5', 'FC1', 'FC2', 'FC6', 'CP5', 'CP1', 'CP2',
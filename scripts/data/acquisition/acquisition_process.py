@@ -0,0 +1,112 @@
+import multiprocessing
+
+import numpy as np
+
+from scripts.data.acquisition.shared_ring import SharedSampleRing
+from scripts.data.acquisition.sources import SampleSource
+from scripts.data.acquisition.stream_filter import StreamFilter
+
+"""
+Data acquisition in a process of its own.
+The process reads the source, filters the samples and writes them into a SharedSampleRing. It does not share the
+GIL with the Tk mainloop, the plots and the algorithm, so a slow redraw can not delay the reads of the board.
+"""
+
+
+def run_acquisition(source: SampleSource, ring_descriptor: tuple, stream_filter: StreamFilter, connection,
+                    stop_event):
+    """
+    Main function of the acquisition process
+    :param SampleSource source: source of the samples, it is connected within the process
+    :param tuple ring_descriptor: descriptor of the SharedSampleRing which receives the samples
+    :param StreamFilter stream_filter: filter of the samples, None if the source is prefiltered
+    :param connection: sending end of a pipe, receives True if the source is connected, otherwise False
+    :param stop_event: multiprocessing.Event which stops the acquisition
+    """
+    ring = SharedSampleRing.attach(ring_descriptor)
+    try:
+        connected = source.connect()
+        connection.send(connected)
+        if not connected:
+            return
+        source.start()
+        while not stop_event.is_set():
+            data = source.read_block()
+            if data is None:
+                # a replay or a generated stream has ended
+                break
+            if len(data[0]) == 0:
+                continue
+            if stream_filter is not None:
+                # filter all channels at once, the filter state is carried over to the next chunk
+                data = stream_filter.process(data)
+            ring.write(data)
+    finally:
+        ring.mark_closed()
+        source.stop()
+        ring.close()
+
+
+class AcquisitionProcess:
+    """
+    Acquisition process with the shared ring of its samples.
+    The ring belongs to the creating process, it is removed with close.
+
+    Attribute:
+    ----------
+    ring: SharedSampleRing
+        ring with all channels of the source (filtered unless the source is prefiltered)
+    """
+
+    def __init__(self, source: SampleSource, stream_filter: StreamFilter = None, capacity: int = 1250):
+        """
+        Constructor method
+        :param SampleSource source: source of the samples, it must be picklable
+        :param StreamFilter stream_filter: filter of the samples, None for unfiltered samples
+        :param int capacity: number of samples per channel which are kept in the ring
+        """
+        self.ring = SharedSampleRing(len(source.channel_names), capacity, dtype=np.float64)
+        # spawn: the child must not inherit the threads and the Tk state of the GUI process
+        context = multiprocessing.get_context('spawn')
+        self.__connection, self.__child_connection = context.Pipe(duplex=False)
+        self.__stop_event = context.Event()
+        self.__process = context.Process(target=run_acquisition, name='Acquisition', daemon=True,
+                                         args=(source, self.ring.descriptor, stream_filter, self.__child_connection,
+                                               self.__stop_event))
+
+    @property
+    def is_alive(self) -> bool:
+        return self.__process.is_alive()
+
+    def start(self, timeout: float = 30) -> bool:
+        """
+        Starts the process and waits until it has connected the source
+        :param float timeout: maximal time in s to wait for the connection
+        :return: bool: says if the connection was successful
+        """
+        self.__process.start()
+        # only the child keeps the sending end, so the pipe reports its end if it fails before the connection
+        self.__child_connection.close()
+        if self.__connection.poll(timeout):
+            try:
+                return bool(self.__connection.recv())
+            except EOFError:
+                pass
+        return False
+
+    def stop(self, timeout: float = 5):
+        """
+        Stops the acquisition, the samples in the ring stay readable until close
+        :param float timeout: maximal time in s to wait for the end of the process
+        """
+        self.__stop_event.set()
+        if self.__process.pid is not None:
+            self.__process.join(timeout)
+            if self.__process.is_alive():
+                self.__process.terminate()
+                self.__process.join()
+
+    def close(self):
+        """Stops the acquisition and removes the ring"""
+        self.stop()
+        self.ring.close()
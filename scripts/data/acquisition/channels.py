@@ -0,0 +1,34 @@
+import scripts.config as config
+
+"""
+Selection and order of the channels for the cursor control algorithm.
+The module has no side effects on import, so the offline evaluation and the worker processes can use it without the
+live acquisition.
+"""
+
+# weight of every channel of the headset, channels with a weight of 0 are not used by the algorithm
+CHANNEL_WEIGHTS = dict(zip(config.BCI_CHANNELS, config.CH_NAMES_WEIGHT))
+
+
+def sort_channels(used_ch_names):
+    """
+    Filters and sorts the data channels for the algorithm
+    Channels with a weight of 0 in config.CH_NAMES_WEIGHT are removed, channels unknown to config.BCI_CHANNELS are kept
+    :param list used_ch_names: names of all channels of the source
+    :return: indices of the channels used by the algorithm (C3 at position 0 and C4 at position 1) and their names
+    """
+    filtered_channel_indices = list()
+    filtered_channel_names = list()
+    for i in range(len(used_ch_names)):
+        if CHANNEL_WEIGHTS.get(used_ch_names[i], 1) != 0:
+            if used_ch_names[i] == 'C3':
+                filtered_channel_names.insert(0, used_ch_names[i])
+                filtered_channel_indices.insert(0, i)
+            elif used_ch_names[i] == 'C4':
+                filtered_channel_names.insert(1, used_ch_names[i])
+                filtered_channel_indices.insert(1, i)
+            else:
+                filtered_channel_names.append(used_ch_names[i])
+                filtered_channel_indices.append(i)
+
+    return filtered_channel_indices, filtered_channel_names
@@ -1,27 +1,52 @@
-import platform
 import time
 
-import brainflow
 import numpy as np
-import serial
-import serial.tools.list_ports
-from brainflow.board_shim import BoardShim, BrainFlowInputParams, BrainFlowError
-from numpy_ringbuffer import RingBuffer
 
 import scripts.config as config
+from scripts.data.acquisition.acquisition_process import AcquisitionProcess
+from scripts.data.acquisition.channels import sort_channels
+from scripts.data.acquisition.replay import ReplayMode
+from scripts.data.acquisition.sources import SampleSource, BoardSource, ReplaySource, SyntheticSource
+from scripts.data.acquisition.stream_filter import StreamFilter
+from scripts.data.acquisition.window_buffer import WindowRingBuffer
+from scripts.data.acquisition.window_scheduler import SchedulingPolicy, WindowScheduler
 from scripts.data.extraction import trial_handler
-from scripts.data.loader.game_dataset_loader import get_channel_rawdata
 from scripts.mvc.models import ConfigData
 from scripts.utils.QueueManager import QueueManager
+from scripts.utils.latency_tracing import WindowTrace, tracer
 
 """ Script to read Data from the OpenBci-Headset and creating the Sliding-Windows """
 
-# constants
-live_Data = True  # boolean to replay a recorded session with session_file_name as file name
+# constants, the source of a session is selected by config.DATA_SOURCE
 session_file_name = 'session-1-05052022-154258.npz'
+replay_mode = ReplayMode.real_time  # speed of the session replay
+replay_speed = 1.0  # speed factor of the session replay, only used for ReplayMode.scaled
+scheduling_policy = SchedulingPolicy.drop_late  # handling of sliding windows which are late for the algorithm
 chan_labels = ['C3', 'C4', 'FC5', 'FC1', 'FC2', 'FC6', 'CP5', 'CP1', 'CP2', 'CP6']
 
-SAMPLING_RATE = BoardShim.get_sampling_rate(brainflow.board_shim.BoardIds.CYTON_DAISY_BOARD) if live_Data else 125
+POLL_INTERVAL = 0.02  # time in s to wait between two reads of the board buffer
+SHARED_RING_DURATION = 10  # time in s of the samples kept in the shared ring of the acquisition process
+
+
+def create_default_source() -> SampleSource:
+    """
+    Creates the source selected by config.DATA_SOURCE, a replay plays session_file_name
+    :return: SampleSource: board source, replay source or synthetic source
+    """
+    if config.DATA_SOURCE == 'board':
+        return BoardSource(poll_interval=POLL_INTERVAL)
+    if config.DATA_SOURCE == 'replay':
+        return ReplaySource('../scripts/data/session/' + session_file_name, chan_labels, sampling_rate=125,
+                            mode=replay_mode, speed=replay_speed)
+    if config.DATA_SOURCE == 'synthetic':
+        return SyntheticSource(mode=replay_mode, speed=replay_speed)
+    raise ValueError(f'Unknown data source: {config.DATA_SOURCE}')
+
+
+# source of the samples, can be exchanged per session with set_source
+source: SampleSource = create_default_source()
+
+SAMPLING_RATE = source.sampling_rate
 
 # time which is needed for one sample in s, T = 1/f = 1/125 = 0.008
 TIME_FOR_ONE_SAMPLE = 1 / SAMPLING_RATE
@@ -32,22 +57,47 @@ SLIDING_WINDOW_SAMPLES: int  # size of sliding window in amount of samples, *8ms
 OFFSET_DURATION: float  # size of offset in s between two consecutive sliding windows
 OFFSET_SAMPLES: int  # size of offset in amount of samples, *8ms for time
 
-NUMBER_CHANNELS = len(BoardShim.get_eeg_channels(
-    brainflow.board_shim.BoardIds.CYTON_DAISY_BOARD)) if live_Data else len(chan_labels)
+NUMBER_CHANNELS = len(source.channel_names)
 
 # global variables
 allow_window_creation = True
 first_window = True
 first_data = True
+count_samples = 0  # amount of samples written into the window_buffer since the last sliding window
 stream_available = False  # indicates if stream is available
+lost_samples = 0  # amount of samples which were overwritten in the shared ring before they were consumed
 
-board: BoardShim
-window_buffer: RingBuffer
+window_buffer: WindowRingBuffer
+window_scheduler: WindowScheduler = None
+stream_filter: StreamFilter
+channel_order: list  # indices of the channels used by the algorithm, C3 and C4 first
+used_channels: list  # names of the channels in the window_buffer
 data_model: ConfigData
+acquisition: AcquisitionProcess = None  # acquisition process of config.ACQUISITION_PROCESS
+algorithm_worker = None  # worker process of the algorithm of config.ALGORITHM_PROCESS
 
 queue_manager = QueueManager()
 
 
+def set_source(new_source: SampleSource):
+    """
+    Exchanges the source of the samples, must be called before init_board
+    :param SampleSource new_source: e.g. BoardSource, ReplaySource or SyntheticSource
+    """
+    global source, SAMPLING_RATE, TIME_FOR_ONE_SAMPLE, NUMBER_CHANNELS
+    source = new_source
+    SAMPLING_RATE = source.sampling_rate
+    TIME_FOR_ONE_SAMPLE = 1 / SAMPLING_RATE
+    NUMBER_CHANNELS = len(source.channel_names)
+
+
+def is_live():
+    """
+    :return: True if the current source delivers live data of a subject
+    """
+    return source.is_live
+
+
 def init(data_mdl):
     """
     --- starting point ---
@@ -58,179 +108,249 @@ def init(data_mdl):
     :param Any data_mdl: data model object
     """
     queue_manager.connect_queues()
-    global data_model, first_window
+    global data_model, first_window, count_samples
     data_model = data_mdl
     first_window = True
+    count_samples = 0
 
-    global SLIDING_WINDOW_DURATION, SLIDING_WINDOW_SAMPLES, OFFSET_DURATION, OFFSET_SAMPLES, TIME_FOR_ONE_SAMPLE, window_buffer, NUMBER_CHANNELS
+    global SLIDING_WINDOW_DURATION, SLIDING_WINDOW_SAMPLES, OFFSET_DURATION, OFFSET_SAMPLES, window_buffer
     SLIDING_WINDOW_DURATION = data_model.window_size / 1000
     SLIDING_WINDOW_SAMPLES = int(SLIDING_WINDOW_DURATION / TIME_FOR_ONE_SAMPLE)
     OFFSET_DURATION = data_model.window_offset / 1000
     OFFSET_SAMPLES = int(OFFSET_DURATION / TIME_FOR_ONE_SAMPLE)
-    window_buffer = [RingBuffer(capacity=SLIDING_WINDOW_SAMPLES, dtype=float) for _ in range(NUMBER_CHANNELS)]
 
-    if live_Data:
-        try:
-            handle_samples()
-        except BrainFlowError as err:
-            print(err.args[0])
-    else:
-        path = '../scripts/data/session/' + session_file_name
-        chan_data, label_data = get_channel_rawdata(session_path=path, ch_names=chan_labels)
-        global stream_available
+    # the channels are stored already sorted for the laplacian calculation, so a window needs no reordering
+    global channel_order, used_channels
+    channel_order, used_channels = sort_channels(source.channel_names)
+    window_buffer = WindowRingBuffer(len(channel_order), SLIDING_WINDOW_SAMPLES, dtype=config.SIGNAL_DTYPE)
+    # a window is late when the next window arrives
+    global window_scheduler
+    window_scheduler = WindowScheduler(scheduling_policy, OFFSET_DURATION)
+    tracer.reset()
+
+    # the filter state is kept over the whole session
+    global stream_filter
+    stream_filter = StreamFilter(NUMBER_CHANNELS, SAMPLING_RATE)
+    from scripts.data.analysis.cursor_control_algorithm import used_profiler
+    if used_profiler is not None:
+        used_profiler.reset()
+    if config.CLASSIFIER_FILE:
+        from scripts.data.analysis.classifiers import load_configured_classifier
+        from scripts.data.analysis.cursor_control_algorithm import set_classifier
+        set_classifier(load_configured_classifier())
+
+    # the CSP filters and the classifier can only be trained from the trials of a live session
+    if config.CSP_TRAINING and source.is_live and data_model.trial_recording:
+        from scripts.data.analysis.spatial_patterns import start_spatial_patterns_training
+        start_spatial_patterns_training(SAMPLING_RATE, SLIDING_WINDOW_DURATION, OFFSET_DURATION, data_model.f_min,
+                                        data_model.f_max)
+    if config.ONLINE_TRAINING and source.is_live and data_model.trial_recording:
+        from scripts.data.analysis.online_training import start_online_training
+        start_online_training(source.channel_names, SAMPLING_RATE, SLIDING_WINDOW_DURATION, OFFSET_DURATION,
+                              data_model.f_min, data_model.f_max)
+
+    global stream_available
+    if config.ACQUISITION_PROCESS:
+        if acquisition is None or not acquisition.is_alive:
+            # recorded and generated samples are not connected with init_board
+            stream_available = start_acquisition()
+        handle_shared_samples()
+        return
+    if not source.is_live:
+        # recorded and generated samples need no connection
         stream_available = True
-        handle_samples(chan_data)
+    handle_samples()
 
 
 def init_board():
     """
-    Initializing steps:
+    Prepares the source of the samples, for the board:
     (1) Search for the serial port
     (2) Board get initialized
     (3) Data stream get started
     :return: bool: says if the connection was successful
     """
+    global stream_available
+    if config.ACQUISITION_PROCESS:
+        stream_available = start_acquisition()
+    else:
+        stream_available = source.connect()
+    return stream_available
 
-    if live_Data:
-        params = BrainFlowInputParams()
-        params.serial_port = search_port()
-
-        if params.serial_port is not None:
-            # BoardShim.enable_dev_board_logger()
-            global board, stream_available
-            board = BoardShim(brainflow.board_shim.BoardIds.CYTON_DAISY_BOARD, params)
-            try:
-                stream_available = True
-                board.prepare_session()
-                board.start_stream()
-                return stream_available
-            except BrainFlowError as err:
-                print(err.args[0])
 
-        else:
-            print('Port not found')
-            return False
-    return True
+def start_acquisition():
+    """
+    Starts the acquisition process, it connects the source and writes the filtered samples into its shared ring
+    :return: bool: says if the connection was successful
+    """
+    global acquisition
+    if acquisition is not None:
+        acquisition.close()
+    acquisition = AcquisitionProcess(source, None if source.prefiltered else StreamFilter(NUMBER_CHANNELS,
+                                                                                        SAMPLING_RATE),
+                                     int(SHARED_RING_DURATION * SAMPLING_RATE))
+    return acquisition.start()
 
 
-def search_port():
+def handle_samples():
     """
-    Search for the name of the used usb port and return it
-    Returns None if no usb port was found
-    :return: str port_name: name of the used serial port
+    Reads EEG data from the source, sends it to trial_handler and writes into in the window_buffer
+    Every read returns everything the source has buffered since the last read (for the board at most
+    every POLL_INTERVAL), so the amount of reads does not grow with the sample rate or the number of channels.
     """
+    source.start()
+    while stream_available:
+        data = source.read_block()
+        arrival_time = time.perf_counter()
+        if data is None:
+            # a replay or a generated stream has ended
+            break
+        if len(data[0]) == 0:
+            continue
+        if not source.prefiltered:
+            # filter all channels at once, the filter state is carried over to the next chunk
+            data = stream_filter.process(data)
+        consume_samples(data, arrival_time=arrival_time)
+    if source.is_live:
+        stop_stream()
 
-    print('Search...')
-    ports = serial.tools.list_ports.comports(include_links=False)
-    for port in ports:
-        if port.vid == 1027 and port.pid == 24597:
-            port_name = port.device
-            print('found port: ', port_name)
-
-            # If operating system is Linux set the Latency of the USB-Port to 1ms
-            if platform.system() == 'Linux':
-                import os
-                set_latency_cmd = 'setserial ' + port_name + ' low_latency'
-                os.system(set_latency_cmd)
-                get_latency_cmd = 'cat /sys/bus/usb-serial/devices/' + port_name[5:] + '/latency_timer'
-                print('set latency timer to: ' + os.popen(get_latency_cmd).read().strip() + 'ms')
 
-            return port_name
-    print("Ended Search")
-    return None
+def handle_shared_samples():
+    """
+    Reads the samples of the acquisition process from its shared ring, sends them to trial_handler and writes them
+    into the window_buffer. The acquisition process keeps reading the source while this thread waits for the GIL,
+    samples are only lost if this thread falls behind by more than SHARED_RING_DURATION.
+    """
+    global lost_samples, acquisition, algorithm_worker
+    ring = acquisition.ring
+    if config.ALGORITHM_PROCESS and stream_available:
+        from scripts.data.analysis.algorithm_worker import AlgorithmWorker
+        algorithm_worker = AlgorithmWorker(ring.descriptor, channel_order, used_channels, SAMPLING_RATE, data_model,
+                                           queue_manager, scheduler=window_scheduler)
+        algorithm_worker.start()
+    # the session starts with the next sample, the samples since the connection are not used
+    position = ring.sequence
+    while stream_available:
+        ring.wait(position + 1, timeout=POLL_INTERVAL)
+        closed = ring.is_closed
+        sequence = ring.sequence
+        if sequence == position:
+            if closed:
+                # a replay or a generated stream has ended
+                break
+            continue
+        data = ring.read(position, sequence - position)
+        if data is None:
+            # continue with the oldest sample which is still in the ring
+            oldest = ring.sequence - ring.capacity
+            lost_samples += oldest - position
+            position = oldest
+            continue
+        timestamp_sequence, write_time = ring.timestamp()
+        consume_samples(data, write_time - (timestamp_sequence - sequence) * TIME_FOR_ONE_SAMPLE, position,
+                        ring.timestamp(monotonic=True)[1])
+        position = sequence
+    if source.is_live:
+        stop_stream()
+    if algorithm_worker is not None:
+        algorithm_worker.stop()
+        print("Algorithm worker: ", {'processed_windows': algorithm_worker.processed_windows,
+                                     'skipped_windows': algorithm_worker.skipped_windows})
+        algorithm_worker = None
+    acquisition.close()
+    acquisition = None
 
 
-def handle_samples(chan_data=None):
+def consume_samples(data: np.ndarray, end_time: float = None, sequence: int = None, arrival_time: float = None):
     """
-    Reads EEG data from port, sends it to trial_handler and writes into in the window_buffer
-    :param float[] chan_data: raw data from recorded Sessions
+    Sends a chunk of filtered samples to trial_handler and writes it into the window_buffer
+    :param np.ndarray data: chunk of samples with the shape (channels, samples)
+    :param float end_time: time stamp of the last sample of the chunk, default is now
+    :param int sequence: sequence number of the first sample of the chunk in the shared ring
+    :param float arrival_time: time.perf_counter() when the chunk was read from the source, default is now
     """
-    global first_window, window_buffer, allow_window_creation, first_data
-    count_samples = 0
-    sample_index = 0
-    while stream_available and (live_Data or len(chan_data[0]) > sample_index):
-        if chan_data is not None:
-            data = np.ndarray((len(chan_data), 1))
-            for channel_index, samples in enumerate(chan_data[:, sample_index]):
-                data[channel_index, 0] = samples
-            sample_index += 1
-            time.sleep(0.008)
+    global first_data
+    end_time = time.time() if end_time is None else end_time
+    # only sends trial_handler raw data if trial recording is wished
+    if data_model.trial_recording and source.is_live:
+        if first_data:
+            # the first chunk started (n - 1) samples before its last sample
+            trial_handler.send_raw_data(data, start=end_time - (len(data[0]) - 1) * TIME_FOR_ONE_SAMPLE)
+            first_data = False
         else:
-            data = board.get_board_data(1)[board.get_eeg_channels(
-                brainflow.board_shim.BoardIds.CYTON_DAISY_BOARD)]  # get all data and remove it from internal buffer
-            if len(data[0]) > 0:
-                # filter data
-                for channel in range(NUMBER_CHANNELS):
-                    brainflow.DataFilter.perform_bandstop(data[channel], SAMPLING_RATE, 0.0, 50.0, 5,
-                                                          brainflow.FilterTypes.BUTTERWORTH.value, 0)
-            else:
-                continue
-            # only sends trial_handler raw data if trial recording is wished
-        if data_model.trial_recording and live_Data:
-            if first_data:
-                trial_handler.send_raw_data(data, start=time.time())
-                first_data = False
-            else:
-                trial_handler.send_raw_data(data)
-        if allow_window_creation:
-            for samples in range(len(data)):
-                window_buffer[samples].extend(data[samples])
-            count_samples += 1
-            if first_window and count_samples == SLIDING_WINDOW_SAMPLES:
-                first_window = False
-                send_window()
-                count_samples = 0
-            elif not first_window and count_samples == OFFSET_SAMPLES:
-                send_window()
-                count_samples = 0
-    if live_Data:
-        stop_stream()
+            trial_handler.send_raw_data(data)
+    if allow_window_creation:
+        write_window_buffer(data, end_time, sequence, arrival_time)
 
 
-def sort_channels(sliding_window, used_ch_names):
-    """Filters and sorts the data channels for the algorithm"""
-    filtered_sliding_window = list()
-    filtered_channel_names = list()
-    for i in range(len(used_ch_names)):
-        if config.CH_NAMES_WEIGHT[i] != 0:
-            if used_ch_names[i] == 'C3':
-                filtered_channel_names.insert(0, used_ch_names[i])
-                filtered_sliding_window.insert(0, sliding_window[i])
-            elif used_ch_names[i] == 'C4':
-                filtered_channel_names.insert(1, used_ch_names[i])
-                filtered_sliding_window.insert(1, sliding_window[i])
-            else:
-                filtered_channel_names.append(used_ch_names[i])
-                filtered_sliding_window.append(sliding_window[i])
-
-    filtered_sliding_window = np.asarray(filtered_sliding_window)
-    return filtered_sliding_window, filtered_channel_names
-
-
-def send_window():
-    """Create sliding window and send it to the algorithm"""
-    global window_buffer, NUMBER_CHANNELS
-    window = np.zeros((NUMBER_CHANNELS, SLIDING_WINDOW_SAMPLES), dtype=float)
-    for i in range(len(window)):
-        window[i] = np.array(window_buffer[i])
-    # sort channels for laplacian calculation
-    if live_Data:
-        window, used_channels = sort_channels(window, config.BCI_CHANNELS)
-    else:
-        used_channels = chan_labels
+def write_window_buffer(data: np.ndarray, end_time: float = None, sequence: int = None,
+                        arrival_time: float = None):
+    """
+    Writes a chunk of samples into the window_buffer and sends a sliding window each time enough new samples arrived.
+    The chunk is split at the window borders, so a chunk which covers several offsets creates several windows.
+    If the algorithm has fallen behind, the window_scheduler drops the windows which are late and followed by a
+    newer window of the same chunk. With the algorithm worker only the position of the window in the shared ring is
+    sent, the worker schedules the windows itself.
+    :param np.ndarray data: chunk of samples with the shape (channels, samples)
+    :param float end_time: time stamp of the last sample of the chunk, default is now
+    :param int sequence: sequence number of the first sample of the chunk in the shared ring
+    :param float arrival_time: time.perf_counter() when the chunk was read from the source, default is now
+    """
+    global first_window, count_samples
+    end_time = time.time() if end_time is None else end_time
+    position = 0
+    chunk_length = len(data[0])
+    while position < chunk_length:
+        samples_per_window = SLIDING_WINDOW_SAMPLES if first_window else OFFSET_SAMPLES
+        end = min(chunk_length, position + samples_per_window - count_samples)
+        if algorithm_worker is None:
+            window_buffer.extend(data[channel_order, position:end])
+        count_samples += end - position
+        position = end
+        if count_samples == samples_per_window:
+            first_window = False
+            count_samples = 0
+            release_time = end_time - (chunk_length - end) * TIME_FOR_ONE_SAMPLE
+            if algorithm_worker is not None:
+                algorithm_worker.submit(sequence + end - SLIDING_WINDOW_SAMPLES, SLIDING_WINDOW_SAMPLES,
+                                        OFFSET_DURATION / SLIDING_WINDOW_DURATION, release_time,
+                                        tracer.begin(arrival_time))
+            elif window_scheduler.admit(release_time, chunk_length - end >= OFFSET_SAMPLES):
+                send_window(tracer.begin(arrival_time))
+
+
+def send_window(trace: WindowTrace = None):
+    """
+    Send the sliding window as a read-only view of the window_buffer to the algorithm
+    :param WindowTrace trace: latency trace of the window, see latency_tracing
+    """
+    window = window_buffer.view()
     # push window to cursor control algorithm
     from scripts.data.analysis.cursor_control_algorithm import perform_algorithm
     perform_algorithm(window, used_channels, SAMPLING_RATE, data_mdl=data_model, queue_manager=queue_manager,
-                      offset_in_percentage=OFFSET_DURATION / SLIDING_WINDOW_DURATION)
+                      offset_in_percentage=OFFSET_DURATION / SLIDING_WINDOW_DURATION, trace=trace)
 
 
 def stop_stream():
     """Stops the data stream and the releases session"""
     global stream_available
     stream_available = False
-    if live_Data and 'board' in globals() and board:
-        try:
-            board.stop_stream()
-            board.release_session()
-        except BrainFlowError as err:
-            print(err.args[0])
+    if config.ACQUISITION_PROCESS:
+        # the ring is removed by the reading thread when it has finished
+        if acquisition is not None:
+            acquisition.stop()
+    else:
+        source.stop()
+        if window_scheduler is not None:
+            print("Window scheduler: ", window_scheduler.summary())
+    if tracer.enabled:
+        print("Latency: ", tracer.summary())
+    from scripts.data.analysis import cursor_control_algorithm
+    if cursor_control_algorithm.used_profiler is not None:
+        print("Stage profiler: ", cursor_control_algorithm.used_profiler.summary())
+    if config.CSP_TRAINING:
+        from scripts.data.analysis.spatial_patterns import stop_spatial_patterns_training
+        stop_spatial_patterns_training()
+    if config.ONLINE_TRAINING:
+        from scripts.data.analysis.online_training import stop_online_training
+        stop_online_training()
@@ -0,0 +1,114 @@
+import enum
+import time
+
+import numpy as np
+
+""" Replay of recorded sessions in blocks, driven by a virtual sample clock """
+
+
+class ReplayMode(enum.Enum):
+    """
+    Speed of a session replay
+    """
+    real_time = 1  # one second of recording takes one second
+    scaled = 2  # one second of recording takes 1 / speed seconds
+    as_fast_as_possible = 3  # no waiting at all
+
+
+class VirtualSampleClock:
+    """
+    Clock which maps sample numbers to wall-clock time: the n-th sample is due at start + n / (sampling_rate * speed).
+    If the consumer is too slow the clock does not wait, all overdue samples are released immediately until
+    the consumer has caught up again.
+    """
+
+    def __init__(self, sampling_rate: float, mode: ReplayMode = ReplayMode.real_time, speed: float = 1.0):
+        """
+        Constructor method
+        :param float sampling_rate: sample rate of the clock
+        :param ReplayMode mode: speed mode of the clock
+        :param float speed: speed factor, only used for ReplayMode.scaled
+        """
+        if mode == ReplayMode.scaled and speed <= 0:
+            raise ValueError(f'Invalid speed: {speed}')
+        self.sampling_rate = sampling_rate
+        self.mode = mode
+        self.speed = speed if mode == ReplayMode.scaled else 1.0
+        self.__start_time = time.perf_counter()
+
+    def start(self):
+        """Sets the current time as time of the first sample"""
+        self.__start_time = time.perf_counter()
+
+    def wait_for(self, sample_count: int):
+        """
+        Blocks until the clock has reached the given sample
+        :param int sample_count: number of samples which should be available
+        """
+        if self.mode == ReplayMode.as_fast_as_possible:
+            return
+        delay = self.__start_time + sample_count / (self.sampling_rate * self.speed) - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class SessionReplay:
+    """
+    Iterates over the samples of a recorded session in blocks.
+    The blocks are slices of the recorded data (no copies), the pacing is done with a VirtualSampleClock,
+    a block is released when the clock reaches its last sample.
+
+    Attribute:
+    ----------
+    samples_played: int
+        number of samples which have been released so far
+    """
+
+    def __init__(self, chan_data: np.ndarray, sampling_rate: float, block_size: int,
+                 mode: ReplayMode = ReplayMode.real_time, speed: float = 1.0):
+        """
+        Constructor method
+        :param np.ndarray chan_data: recorded data with the shape (channels, samples)
+        :param float sampling_rate: sample rate of the recording
+        :param int block_size: number of samples per block
+        :param ReplayMode mode: speed mode of the replay
+        :param float speed: speed factor, only used for ReplayMode.scaled
+        """
+        if block_size < 1:
+            raise ValueError(f'Invalid block_size: {block_size}')
+        self.chan_data = chan_data
+        self.sampling_rate = sampling_rate
+        self.block_size = block_size
+        self.clock = VirtualSampleClock(sampling_rate, mode, speed)
+        self.samples_played = 0
+
+    def __len__(self):
+        """
+        :return: number of blocks of the replay
+        """
+        return -(-self.chan_data.shape[1] // self.block_size)
+
+    def __iter__(self):
+        self.samples_played = 0
+        self.clock.start()
+        return self
+
+    def __next__(self) -> np.ndarray:
+        """
+        Waits until the virtual clock reaches the end of the next block and returns it
+        :return: np.ndarray: block with the shape (channels, samples)
+        """
+        if self.samples_played >= self.chan_data.shape[1]:
+            raise StopIteration
+        end = min(self.samples_played + self.block_size, self.chan_data.shape[1])
+        self.clock.wait_for(end)
+        block = self.chan_data[:, self.samples_played:end]
+        self.samples_played = end
+        return block
+
+    @property
+    def virtual_time(self) -> float:
+        """
+        :return: position of the replay in the recording in s
+        """
+        return self.samples_played / self.sampling_rate
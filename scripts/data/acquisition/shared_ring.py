@@ -0,0 +1,194 @@
+import time
+from multiprocessing import shared_memory
+from typing import Optional
+
+import numpy as np
+
+""" Ring buffer in shared memory which carries the samples of the acquisition process to its consumers """
+
+# size of the header in bytes: sequence counter and closed flag (int64), time.time() and time.perf_counter() of the
+# last write (float64), end of the write in progress (int64), time stamps of the last write before it (float64),
+# the samples start at the next cache line
+HEADER_SIZE = 64
+# number of attempts of timestamp to read a sequence number and a time stamp which belong together
+TIMESTAMP_RETRIES = 100
+
+
+class SharedSampleRing:
+    """
+    Ring buffer with the shape (channels, capacity) in a shared memory block, written by one process and read by any
+    number of processes.
+    Every sample is addressed by its sequence number, the number of samples which were written before it. The writer
+    works like a seqlock: it first announces the end of the block in the write counter, then copies the block into
+    the ring and afterwards increases the sequence counter to the same value, so all samples below the sequence
+    counter are complete. A reader copies a range and checks afterwards against the write counter that the writer
+    has not started to overwrite it in the meantime, neither side ever waits for the other.
+
+    Attribute:
+    ----------
+    n_channels: int
+        number of channels
+    capacity: int
+        number of samples per channel which are kept
+    dtype: np.dtype
+        data type of the samples
+    """
+
+    def __init__(self, n_channels: int, capacity: int, dtype=float, name: str = None):
+        """
+        Constructor method, creates a new ring or attaches to an existing one
+        :param int n_channels: number of channels
+        :param int capacity: number of samples per channel which are kept
+        :param dtype: data type of the samples
+        :param str name: name of the shared memory block of an existing ring, None to create a new ring
+        """
+        self.n_channels = n_channels
+        self.capacity = capacity
+        self.dtype = np.dtype(dtype)
+        self.__owner = name is None
+        size = HEADER_SIZE + n_channels * capacity * self.dtype.itemsize
+        # attached processes share the resource tracker of the creating process, which unlinks the block at the end
+        self.__memory = shared_memory.SharedMemory(name=name, create=self.__owner, size=size)
+        self.__counters = np.ndarray((2,), dtype=np.int64, buffer=self.__memory.buf)
+        self.__times = np.ndarray((2,), dtype=np.float64, buffer=self.__memory.buf, offset=16)
+        self.__write_end = np.ndarray((1,), dtype=np.int64, buffer=self.__memory.buf, offset=32)
+        self.__previous_times = np.ndarray((2,), dtype=np.float64, buffer=self.__memory.buf, offset=40)
+        self.__samples = np.ndarray((n_channels, capacity), dtype=self.dtype, buffer=self.__memory.buf,
+                                    offset=HEADER_SIZE)
+        if self.__owner:
+            self.__counters[:] = 0
+            self.__times[:] = 0
+            self.__write_end[:] = 0
+            self.__previous_times[:] = 0
+
+    @classmethod
+    def attach(cls, descriptor: tuple):
+        """
+        Attaches to a ring of another process
+        :param tuple descriptor: descriptor of the ring, see descriptor
+        :return: SharedSampleRing: the attached ring
+        """
+        name, n_channels, capacity, dtype = descriptor
+        return cls(n_channels, capacity, dtype, name)
+
+    @property
+    def descriptor(self) -> tuple:
+        """
+        :return: (name, n_channels, capacity, dtype) to attach to the ring in another process
+        """
+        return self.__memory.name, self.n_channels, self.capacity, self.dtype.str
+
+    @property
+    def sequence(self) -> int:
+        """
+        :return: number of samples written so far, the sequence number of the next sample
+        """
+        return int(self.__counters[0])
+
+    @property
+    def is_closed(self) -> bool:
+        """
+        :return: True if the writer has written its last samples
+        """
+        return bool(self.__counters[1])
+
+    def timestamp(self, monotonic: bool = False):
+        """
+        Returns the time stamp of the latest complete write together with its sequence number.
+        While a write is in progress (or a writer stopped within a write) the time stamp of the write before it is
+        returned, so the reader never waits for the writer.
+        :param bool monotonic: return time.perf_counter() instead of time.time() of the latest write
+        :return: sequence number after the latest complete write, time stamp of this write
+        """
+        column = 1 if monotonic else 0
+        for _ in range(TIMESTAMP_RETRIES):
+            write_end = int(self.__write_end[0])
+            sequence = int(self.__counters[0])
+            # the time stamp of the write in progress may already be written, the previous one is kept until the
+            # next write begins
+            write_time = float((self.__times if write_end == sequence else self.__previous_times)[column])
+            if write_end == self.__write_end[0] and sequence == self.__counters[0]:
+                return sequence, write_time
+        # the writer has moved on during every attempt, the time stamp is at most a few writes newer
+        return sequence, write_time
+
+    def write(self, data: np.ndarray):
+        """
+        Appends a block of samples, the oldest samples get overwritten. Must only be called by one process.
+        :param np.ndarray data: block with the shape (channels, samples)
+        """
+        sequence = int(self.__counters[0])
+        length = data.shape[1]
+        if length > self.capacity:
+            data = data[:, -self.capacity:]
+        start = (sequence + length - data.shape[1]) % self.capacity
+        # the time stamp of the complete samples stays readable while the new ones are written
+        self.__previous_times[:] = self.__times
+        # readers treat the samples which are overwritten from now on as lost
+        self.__write_end[0] = sequence + length
+        first_part = min(data.shape[1], self.capacity - start)
+        self.__samples[:, start:start + first_part] = data[:, :first_part]
+        self.__samples[:, :data.shape[1] - first_part] = data[:, first_part:]
+        # the time stamp is valid as soon as the readers see the new sequence number
+        self.__times[:] = time.time(), time.perf_counter()
+        self.__counters[0] = sequence + length
+
+    def mark_closed(self):
+        """Tells the readers that no more samples follow"""
+        self.__counters[1] = 1
+
+    def read(self, start: int, length: int, out: np.ndarray = None, channels: list = None) -> Optional[np.ndarray]:
+        """
+        Copies samples out of the ring
+        :param int start: sequence number of the first sample
+        :param int length: number of samples
+        :param np.ndarray out: array with the shape (channels, length) which receives the samples
+        :param list channels: indices of the channels which are copied in this order, default are all channels
+        :return: np.ndarray: copy with the shape (channels, length), None if the samples are already overwritten
+        """
+        if start + length > self.sequence:
+            raise ValueError(f'Samples {start}..{start + length} are not written yet')
+        if start < int(self.__write_end[0]) - self.capacity or length > self.capacity:
+            return None
+        rows = slice(None) if channels is None else channels
+        if out is None:
+            out = np.empty((self.n_channels if channels is None else len(channels), length), dtype=self.dtype)
+        index = start % self.capacity
+        first_part = min(length, self.capacity - index)
+        out[:, :first_part] = self.__samples[rows, index:index + first_part]
+        out[:, first_part:] = self.__samples[rows, :length - first_part]
+        # the writer may have started to overwrite the beginning while the samples were copied
+        if start < int(self.__write_end[0]) - self.capacity:
+            return None
+        return out
+
+    def wait(self, sequence: int, timeout: float = None, poll_interval: float = 0.0005,
+             max_poll_interval: float = 0.004) -> int:
+        """
+        Blocks until the ring has reached a sequence number, the writer has closed the ring or the timeout is over.
+        The time between two checks of the sequence counter starts at poll_interval and doubles up to
+        max_poll_interval, so a sample which arrives soon is seen soon and a long wait costs few wake-ups.
+        :param int sequence: sequence number to wait for
+        :param float timeout: maximal waiting time in s, None to wait without limit
+        :param float poll_interval: time in s between the first two checks of the sequence counter
+        :param float max_poll_interval: longest time in s between two checks of the sequence counter
+        :return: int: current sequence number
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while self.sequence < sequence and not self.is_closed:
+            if deadline is None:
+                time.sleep(poll_interval)
+            else:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                time.sleep(min(poll_interval, remaining))
+            poll_interval = min(2 * poll_interval, max_poll_interval)
+        return self.sequence
+
+    def close(self):
+        """Detaches from the ring, the ring is removed when the creating process closes it"""
+        self.__counters = self.__times = self.__write_end = self.__previous_times = self.__samples = None
+        self.__memory.close()
+        if self.__owner:
+            self.__memory.unlink()
@@ -0,0 +1,286 @@
+import platform
+import time
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+import brainflow
+import numpy as np
+import serial
+import serial.tools.list_ports
+from brainflow.board_shim import BoardShim, BrainFlowInputParams, BrainFlowError
+
+import scripts.config as config
+from scripts.data.acquisition.replay import ReplayMode, SessionReplay, VirtualSampleClock
+from scripts.data.loader.game_dataset_loader import get_channel_rawdata
+from scripts.data.synthetic.eeg_generator import SyntheticEEG
+
+""" Interchangeable sources of EEG samples for the data acquisition """
+
+
+class SampleSource(ABC):
+    """
+    Abstract source of EEG samples.
+    The consumer pulls the samples with read_block, a source never buffers more than its own device does,
+    so a slow consumer slows the source down instead of piling up data.
+
+    Attribute:
+    ----------
+    is_live: bool
+        True if the samples come from a subject in real time (calibration and trial recording are possible)
+    prefiltered: bool
+        True if the samples are already filtered and must not pass the streaming filter again
+    """
+
+    is_live = False
+    prefiltered = False
+
+    @property
+    @abstractmethod
+    def sampling_rate(self) -> float:
+        """
+        :return: sample rate of the delivered samples
+        """
+
+    @property
+    @abstractmethod
+    def channel_names(self) -> List[str]:
+        """
+        :return: names of the channels in the order of the rows of a block
+        """
+
+    def connect(self) -> bool:
+        """
+        Prepares the source, e.g. opens the connection to a device
+        :return: bool: says if the source is ready
+        """
+        return True
+
+    def start(self):
+        """Starts the delivery of samples"""
+
+    def stop(self):
+        """Stops the delivery of samples and releases the source"""
+
+    @abstractmethod
+    def read_block(self) -> Optional[np.ndarray]:
+        """
+        Blocks until new samples are available and returns them
+        :return: np.ndarray: block with the shape (channels, samples), None if the source has no more samples
+        """
+
+
+class BoardSource(SampleSource):
+    """
+    Source for the live samples of the OpenBCI Cyton-Daisy board.
+    Every read drains everything BrainFlow has buffered since the last read, two reads are at least
+    poll_interval seconds apart.
+    """
+
+    is_live = True
+    board_id = brainflow.board_shim.BoardIds.CYTON_DAISY_BOARD
+
+    def __init__(self, poll_interval: float = 0.02, channel_names: List[str] = None):
+        """
+        Constructor method
+        :param float poll_interval: minimal time in s between two reads of the board buffer
+        :param list[str] channel_names: channel mapping of the headset
+        """
+        self.poll_interval = poll_interval
+        self.__channel_names = channel_names if channel_names else config.BCI_CHANNELS
+        self.__eeg_channels = BoardShim.get_eeg_channels(self.board_id)
+        self.__board = None
+        self.__last_poll = 0
+
+    @property
+    def sampling_rate(self) -> float:
+        return BoardShim.get_sampling_rate(self.board_id)
+
+    @property
+    def channel_names(self) -> List[str]:
+        return self.__channel_names
+
+    def connect(self) -> bool:
+        """
+        Initializing steps:
+        (1) Search for the serial port
+        (2) Board get initialized
+        (3) Data stream get started
+        :return: bool: says if the connection was successful
+        """
+        params = BrainFlowInputParams()
+        params.serial_port = search_port()
+        if params.serial_port is None:
+            print('Port not found')
+            return False
+
+        # BoardShim.enable_dev_board_logger()
+        self.__board = BoardShim(self.board_id, params)
+        try:
+            self.__board.prepare_session()
+            self.__board.start_stream()
+            return True
+        except BrainFlowError as err:
+            print(err.args[0])
+            return False
+
+    def read_block(self) -> Optional[np.ndarray]:
+        """
+        Waits until poll_interval has passed since the last read and returns all buffered samples
+        :return: np.ndarray: block with the shape (channels, samples), may be empty
+        """
+        delay = self.__last_poll + self.poll_interval - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        self.__last_poll = time.perf_counter()
+        # get all data and remove it from internal buffer
+        return self.__board.get_board_data()[self.__eeg_channels]
+
+    def stop(self):
+        """Stops the data stream and the releases session"""
+        if self.__board:
+            try:
+                self.__board.stop_stream()
+                self.__board.release_session()
+            except BrainFlowError as err:
+                print(err.args[0])
+            self.__board = None
+
+
+class ReplaySource(SampleSource):
+    """Source which replays a recorded MindPong session (npz file)"""
+
+    prefiltered = True
+
+    def __init__(self, session_path: str, channel_names: List[str], sampling_rate: float = 125,
+                 block_size: int = 5, mode: ReplayMode = ReplayMode.real_time, speed: float = 1.0):
+        """
+        Constructor method
+        :param str session_path: path of the npz file
+        :param list[str] channel_names: channels which are replayed
+        :param float sampling_rate: sample rate of the recording
+        :param int block_size: number of samples per block
+        :param ReplayMode mode: speed mode of the replay
+        :param float speed: speed factor, only used for ReplayMode.scaled
+        """
+        self.session_path = session_path
+        self.block_size = block_size
+        self.mode = mode
+        self.speed = speed
+        self.__channel_names = channel_names
+        self.__sampling_rate = sampling_rate
+        self.__replay = None
+
+    @property
+    def sampling_rate(self) -> float:
+        return self.__sampling_rate
+
+    @property
+    def channel_names(self) -> List[str]:
+        return self.__channel_names
+
+    def start(self):
+        """Loads the session and starts the replay clock"""
+        chan_data, label_data = get_channel_rawdata(session_path=self.session_path, ch_names=self.__channel_names)
+        self.__replay = iter(SessionReplay(chan_data, self.__sampling_rate, self.block_size, self.mode, self.speed))
+
+    def read_block(self) -> Optional[np.ndarray]:
+        return next(self.__replay, None)
+
+
+class SyntheticSource(SampleSource):
+    """
+    Source which generates synthetic EEG data with a SyntheticEEG generator.
+    Can be used to load-test the pipeline with arbitrary sample rates and channel counts without a headset.
+
+    Attribute:
+    ----------
+    labels: list
+        ground truth labels of the generated blocks, only collected if keep_labels is True
+    """
+
+    def __init__(self, sampling_rate: float = 125, n_channels: int = None, channel_names: List[str] = None,
+                 block_size: int = 5, duration: float = None, mode: ReplayMode = ReplayMode.real_time,
+                 speed: float = 1.0, seed: int = None, generator: SyntheticEEG = None, keep_labels: bool = False):
+        """
+        Constructor method
+        :param float sampling_rate: sample rate of the generated samples
+        :param int n_channels: number of channels, the names of config.BCI_CHANNELS are extended if necessary
+        :param list[str] channel_names: names of the channels (overrides n_channels)
+        :param int block_size: number of samples per block
+        :param float duration: length of the generated data in s, None for an endless stream
+        :param ReplayMode mode: speed mode of the generation
+        :param float speed: speed factor, only used for ReplayMode.scaled
+        :param int seed: seed of the random generator
+        :param SyntheticEEG generator: configured generator (overrides sampling_rate, channel names and seed)
+        :param bool keep_labels: collect the ground truth labels of the generated blocks in labels
+        """
+        if generator is None:
+            if channel_names is None:
+                n_channels = n_channels if n_channels else len(config.BCI_CHANNELS)
+                channel_names = list(config.BCI_CHANNELS[:n_channels])
+                channel_names += ['Ch' + str(i + 1) for i in range(len(channel_names), n_channels)]
+            generator = SyntheticEEG(channel_names, sampling_rate, seed=seed)
+        self.generator = generator
+        self.block_size = block_size
+        self.total_samples = int(duration * generator.sampling_rate) if duration else None
+        self.clock = VirtualSampleClock(generator.sampling_rate, mode, speed)
+        self.keep_labels = keep_labels
+        self.labels = list()
+        self.samples_generated = 0
+
+    @property
+    def sampling_rate(self) -> float:
+        return self.generator.sampling_rate
+
+    @property
+    def channel_names(self) -> List[str]:
+        return self.generator.channel_names
+
+    def start(self):
+        self.samples_generated = 0
+        self.labels = list()
+        self.clock.start()
+
+    def read_block(self) -> Optional[np.ndarray]:
+        """
+        Waits until the clock reaches the end of the next block and generates it
+        :return: np.ndarray: block with the shape (channels, samples), None if duration is reached
+        """
+        end = self.samples_generated + self.block_size
+        if self.total_samples is not None:
+            if self.samples_generated >= self.total_samples:
+                return None
+            end = min(end, self.total_samples)
+        self.clock.wait_for(end)
+        block, labels = self.generator.next_block(end - self.samples_generated)
+        if self.keep_labels:
+            self.labels.append(labels)
+        self.samples_generated = end
+        return block
+
+
+def search_port():
+    """
+    Search for the name of the used usb port and return it
+    Returns None if no usb port was found
+    :return: str port_name: name of the used serial port
+    """
+
+    print('Search...')
+    ports = serial.tools.list_ports.comports(include_links=False)
+    for port in ports:
+        if port.vid == 1027 and port.pid == 24597:
+            port_name = port.device
+            print('found port: ', port_name)
+
+            # If operating system is Linux set the Latency of the USB-Port to 1ms
+            if platform.system() == 'Linux':
+                import os
+                set_latency_cmd = 'setserial ' + port_name + ' low_latency'
+                os.system(set_latency_cmd)
+                get_latency_cmd = 'cat /sys/bus/usb-serial/devices/' + port_name[5:] + '/latency_timer'
+                print('set latency timer to: ' + os.popen(get_latency_cmd).read().strip() + 'ms')
+
+            return port_name
+    print("Ended Search")
+    return None
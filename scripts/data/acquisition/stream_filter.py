@@ -0,0 +1,83 @@
+from typing import Optional, Tuple
+
+import numpy as np
+from scipy import signal
+
+import scripts.config as config
+
+""" Stateful IIR filter stage for the live data acquisition """
+
+# default argument of StreamFilter, the setting of the config is read when the filter is created
+FROM_CONFIG = object()
+
+
+class StreamFilter:
+    """
+    Filters the incoming EEG chunks with a notch filter and an optional bandpass filter.
+    The filter state of every channel is carried over from one chunk to the next, so filtering many small chunks
+    gives the same result as filtering the whole recording at once.
+
+    Attribute:
+    ----------
+    sos: np.ndarray
+        coefficients of the filter as second-order sections, shape (n_sections, 6)
+    sampling_rate: float
+        sample rate of the filtered data
+    notch_freq: float
+        frequency which is removed by the notch filter (None if no notch filter is used)
+    passband: (float, float)
+        lower and upper edge of the bandpass filter (None if no bandpass filter is used)
+    """
+
+    def __init__(self, n_channels: int, sampling_rate: float,
+                 notch_freq: Optional[float] = FROM_CONFIG, passband: Optional[Tuple[float, float]] = FROM_CONFIG,
+                 order: int = FROM_CONFIG, quality: float = 30.0):
+        """
+        Constructor method
+        :param int n_channels: number of channels which get filtered
+        :param float sampling_rate: sample rate of the data
+        :param float notch_freq: frequency of the powerline noise, None disables the notch filter, by default
+                                 config.NOTCH_FILTER_FREQ if config.STREAM_NOTCH_FILTER is set
+        :param (float, float) passband: lower and upper edge of the bandpass, None disables the bandpass filter,
+                                        by default config.BANDPASS_FILTER
+        :param int order: order of the butterworth bandpass filter, by default config.BANDPASS_FILTER_ORDER
+        :param float quality: quality factor of the notch filter
+        """
+        if notch_freq is FROM_CONFIG:
+            notch_freq = config.NOTCH_FILTER_FREQ if config.STREAM_NOTCH_FILTER else None
+        if passband is FROM_CONFIG:
+            passband = config.BANDPASS_FILTER
+        if order is FROM_CONFIG:
+            order = config.BANDPASS_FILTER_ORDER
+        self.n_channels = n_channels
+        self.sampling_rate = sampling_rate
+        self.notch_freq = notch_freq if notch_freq and notch_freq < sampling_rate / 2 else None
+        self.passband = tuple(passband) if passband else None
+
+        sections = list()
+        if self.notch_freq:
+            b, a = signal.iirnotch(self.notch_freq, quality, fs=sampling_rate)
+            sections.append(signal.tf2sos(b, a))
+        if self.passband:
+            sections.append(signal.butter(order, self.passband, btype='bandpass', fs=sampling_rate, output='sos'))
+        self.sos = np.vstack(sections) if sections else np.empty((0, 6))
+        self.__zi_step = signal.sosfilt_zi(self.sos) if sections else None
+        self.__zi = None
+
+    def process(self, data: np.ndarray) -> np.ndarray:
+        """
+        Filters a chunk of samples of all channels at once and keeps the filter state for the next chunk
+        :param np.ndarray data: chunk with the shape (channels, samples)
+        :return: np.ndarray: the filtered chunk
+        """
+        if len(self.sos) == 0 or data.shape[1] == 0:
+            return data
+        if self.__zi is None:
+            # start in the steady state of the first sample to avoid a step response at the beginning of the stream
+            self.__zi = self.__zi_step[:, np.newaxis, :] * data[np.newaxis, :, 0, np.newaxis]
+        filtered, self.__zi = signal.sosfilt(self.sos, data, axis=-1, zi=self.__zi)
+        return filtered
+
+    def reset(self):
+        """Discards the filter state, the next chunk starts a new stream"""
+        self.__zi = None
@@ -0,0 +1,80 @@
+import numpy as np
+
+""" Ring buffer for the sliding windows of the data acquisition """
+
+
+class WindowRingBuffer:
+    """
+    Mirrored ring buffer with the shape (channels, samples).
+    Every sample is stored twice, at its position and capacity samples behind it. Because of that the latest
+    capacity samples are always lying in one piece in memory and can be handed out as a view without any copy.
+
+    Attribute:
+    ----------
+    capacity: int
+        number of samples per channel which are kept
+    n_channels: int
+        number of channels
+    """
+
+    def __init__(self, n_channels: int, capacity: int, dtype=float):
+        """
+        Constructor method
+        :param int n_channels: number of channels
+        :param int capacity: number of samples per channel (= size of the sliding window)
+        :param dtype: data type of the stored samples
+        """
+        self.n_channels = n_channels
+        self.capacity = capacity
+        self.__buffer = np.zeros((n_channels, 2 * capacity), dtype=dtype)
+        self.__write_index = 0  # position of the next sample in the first half of the buffer
+        self.__count = 0
+
+    def __len__(self):
+        return self.__count
+
+    @property
+    def is_full(self):
+        return self.__count == self.capacity
+
+    @property
+    def dtype(self):
+        return self.__buffer.dtype
+
+    def extend(self, data: np.ndarray):
+        """
+        Appends a chunk of samples, the oldest samples get overwritten if the buffer is full
+        :param np.ndarray data: chunk with the shape (channels, samples)
+        """
+        length = data.shape[1]
+        if length > self.capacity:
+            data = data[:, -self.capacity:]
+            length = self.capacity
+
+        first_part = min(length, self.capacity - self.__write_index)
+        start = self.__write_index
+        self.__buffer[:, start:start + first_part] = data[:, :first_part]
+        self.__buffer[:, start + self.capacity:start + self.capacity + first_part] = data[:, :first_part]
+        rest = length - first_part
+        if rest > 0:
+            self.__buffer[:, :rest] = data[:, first_part:]
+            self.__buffer[:, self.capacity:self.capacity + rest] = data[:, first_part:]
+
+        self.__write_index = (self.__write_index + length) % self.capacity
+        self.__count = min(self.capacity, self.__count + length)
+
+    def view(self) -> np.ndarray:
+        """
+        Returns the stored samples in chronological order without copying them.
+        The view is read-only and only valid until the next call of extend.
+        :return: np.ndarray: view with the shape (channels, len(self))
+        """
+        end = self.__write_index + self.capacity
+        window = self.__buffer[:, end - self.__count:end]
+        window.flags.writeable = False
+        return window
+
+    def clear(self):
+        """Removes all samples"""
+        self.__write_index = 0
+        self.__count = 0
@@ -0,0 +1,80 @@
+import enum
+import time
+
+from scripts.utils.latency_tracing import LatencyHistogram
+
+""" Scheduling of the sliding windows for the algorithm: late windows are dropped instead of queueing up """
+
+
+class SchedulingPolicy(enum.Enum):
+    """
+    Handling of sliding windows which are pending for the algorithm
+    """
+    all = 1  # every window is processed, late windows queue up
+    drop_late = 2  # a window is dropped if its deadline has passed and a newer window is already pending
+    latest = 3  # only the newest pending window is processed
+
+
+class WindowScheduler:
+    """
+    Decides for every pending sliding window if it is processed or dropped.
+    The deadline of a window is its release time (the time of its last sample) plus the deadline, by default the
+    window offset, when the next window arrives. The newest pending window is always processed, so the cursor
+    control follows the latest samples instead of working off a backlog.
+
+    Attribute:
+    ----------
+    policy: SchedulingPolicy
+        handling of the pending windows
+    deadline: float
+        time in s after its release until a window is late
+    processed_windows: int
+        number of admitted windows
+    dropped_windows: int
+        number of dropped windows
+    late_windows: int
+        number of admitted windows which started after their deadline
+    delays: LatencyHistogram
+        time in s from the release until the admission of the admitted windows
+    """
+
+    def __init__(self, policy: SchedulingPolicy = SchedulingPolicy.drop_late, deadline: float = 0.05):
+        """
+        Constructor method
+        :param SchedulingPolicy policy: handling of the pending windows
+        :param float deadline: time in s after its release until a window is late
+        """
+        self.policy = policy
+        self.deadline = deadline
+        self.processed_windows = 0
+        self.dropped_windows = 0
+        self.late_windows = 0
+        self.delays = LatencyHistogram()
+
+    def admit(self, release_time: float, newer_pending: bool = False, now: float = None) -> bool:
+        """
+        Decides if a window is processed, must be called right before the processing
+        :param float release_time: time.time() of the last sample of the window
+        :param bool newer_pending: True if a newer window is already waiting
+        :param float now: current time.time()
+        :return: bool: True if the window is processed, False if it is dropped
+        """
+        now = time.time() if now is None else now
+        late = now > release_time + self.deadline
+        if newer_pending and (self.policy == SchedulingPolicy.latest or
+                              (self.policy == SchedulingPolicy.drop_late and late)):
+            self.dropped_windows += 1
+            return False
+        self.processed_windows += 1
+        self.late_windows += late
+        self.delays.add(now - release_time)
+        return True
+
+    def summary(self) -> dict:
+        """
+        :return: dict with the number of processed, dropped and late windows, mean, p95 and maximum delay in ms
+        """
+        delays = self.delays.summary()
+        return {'processed_windows': self.processed_windows, 'dropped_windows': self.dropped_windows,
+                'late_windows': self.late_windows, 'delay_mean_ms': delays['mean_ms'],
+                'delay_p95_ms': delays['p95_ms'], 'delay_max_ms': delays['max_ms']}
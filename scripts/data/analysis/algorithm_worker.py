@@ -0,0 +1,206 @@
+import multiprocessing
+import queue
+import threading
+import time
+from typing import Callable, List
+
+from scripts.data.acquisition.shared_ring import SharedSampleRing
+from scripts.data.acquisition.window_scheduler import WindowScheduler
+from scripts.data.analysis import cursor_control_algorithm
+from scripts.data.analysis.cursor_control_algorithm import CursorControlPipeline, publish_result
+from scripts.utils.event_listener import subscribe, unsubscribe
+from scripts.utils.latency_tracing import WindowTrace
+
+"""
+Cursor control algorithm in a worker process.
+The acquisition only sends descriptors (start, length) of the sliding windows in the shared ring of the acquisition
+process. The worker reads the windows from the ring, processes them with its own pipeline and sends the results back,
+where a thread publishes them to the game and the live plot. So the acquisition never waits for the spectral analysis.
+One worker processes all windows in their order, because the normalization of hcon and the sliding DFT carry their
+state from window to window. If the worker falls behind, its WindowScheduler drops the late windows.
+"""
+
+
+def run_worker(pipeline: CursorControlPipeline, ring_descriptor: tuple, channel_order: List[int],
+               used_ch_names: List[str], sample_rate: float, scheduler: WindowScheduler, tasks, results):
+    """
+    Main function of the worker process
+    :param CursorControlPipeline pipeline: pipeline which processes the windows
+    :param tuple ring_descriptor: descriptor of the SharedSampleRing with the samples
+    :param list[int] channel_order: indices of the channels of the algorithm in the ring, C3 and C4 first
+    :param list[str] used_ch_names: names of the channels of the algorithm
+    :param float sample_rate: sample rate of the samples
+    :param WindowScheduler scheduler: decides which of the pending windows are processed
+    :param tasks: queue of the tasks, ('window', start, length, f_min, f_max, threshold, offset_in_percentage,
+                  release_time) or ('set', attribute, value) to change the pipeline, None ends the worker
+    :param results: queue which receives (start, CursorControlResult), the result is None for a skipped window
+    """
+    ring = SharedSampleRing.attach(ring_descriptor)
+    try:
+        running = True
+        while running:
+            # all tasks which arrived in the meantime are scheduled together
+            pending = [tasks.get()]
+            try:
+                while pending[-1] is not None:
+                    pending.append(tasks.get_nowait())
+            except queue.Empty:
+                pass
+            newest = max((index for index, task in enumerate(pending) if task and task[0] == 'window'), default=-1)
+            for index, task in enumerate(pending):
+                if task is None:
+                    running = False
+                elif task[0] == 'set':
+                    _, attribute, value = task
+                    setattr(pipeline, attribute, value)
+                    if attribute == 'spatial_patterns':
+                        # hcon changes its scale with the spatial filter
+                        pipeline.reset()
+                else:
+                    results.put(process_task(pipeline, ring, channel_order, used_ch_names, sample_rate, scheduler,
+                                             task, index < newest))
+    finally:
+        if pipeline.profiler is not None:
+            # the profiler of the worker is a copy, its timings stay in this process
+            print("Stage profiler (worker): ", pipeline.profiler.summary())
+        results.put(None)
+        ring.close()
+
+
+def process_task(pipeline: CursorControlPipeline, ring: SharedSampleRing, channel_order: List[int],
+                 used_ch_names: List[str], sample_rate: float, scheduler: WindowScheduler, task: tuple,
+                 newer_pending: bool):
+    """
+    Processes the window of a task unless the scheduler drops it
+    :param bool newer_pending: True if a newer window is already waiting
+    :return: (start, CursorControlResult), the result is None if the window was dropped or overwritten
+    """
+    _, start, length, f_min, f_max, threshold, offset_in_percentage, release_time = task
+    if not scheduler.admit(release_time, newer_pending):
+        return start, None
+    window = ring.read(start, length, channels=channel_order)
+    if window is None:
+        # the worker has fallen behind by more than the ring
+        return start, None
+    # the band and the threshold can be changed in the ui during a session
+    pipeline.f_min, pipeline.f_max, pipeline.threshold = f_min, f_max, threshold
+    return start, pipeline.process(window, used_ch_names, sample_rate, offset_in_percentage)
+
+
+class AlgorithmWorker:
+    """
+    Worker process of the cursor control algorithm with the thread which publishes its results
+
+    Attribute:
+    ----------
+    processed_windows: int
+        number of windows whose result was published
+    skipped_windows: int
+        number of windows which were dropped by the scheduler or overwritten in the ring before the worker reached
+        them
+    """
+
+    def __init__(self, ring_descriptor: tuple, channel_order: List[int], used_ch_names: List[str],
+                 sample_rate: float, data_mdl, queue_manager=None, pipeline: CursorControlPipeline = None,
+                 callback: Callable = None, scheduler: WindowScheduler = None):
+        """
+        Constructor method
+        :param tuple ring_descriptor: descriptor of the SharedSampleRing of the acquisition process
+        :param list[int] channel_order: indices of the channels of the algorithm in the ring, C3 and C4 first
+        :param list[str] used_ch_names: names of the channels of the algorithm
+        :param float sample_rate: sample rate of the samples
+        :param data_mdl: reference of datamodel with the band and the threshold of the algorithm
+        :param queue_manager: reference of queue manager to pass data to the liveplot
+        :param CursorControlPipeline pipeline: pipeline which is copied into the worker, default is the pipeline
+                                               of perform_algorithm
+        :param callable callback: receives the start and the CursorControlResult of every window, default is
+                                  publish_result
+        :param WindowScheduler scheduler: scheduler of the windows in the worker, default drops late windows
+        """
+        self.data_model = data_mdl
+        self.queue_manager = queue_manager
+        self.callback = callback
+        self.processed_windows = 0
+        self.skipped_windows = 0
+        # latency traces of the submitted windows by their start, they stay in this process
+        self.__traces = dict()
+        pipeline = pipeline if pipeline else cursor_control_algorithm.get_default_pipeline()
+        # spawn: the child must not inherit the threads and the Tk state of the GUI process
+        context = multiprocessing.get_context('spawn')
+        self.__tasks = context.Queue()
+        self.__results = context.Queue()
+        self.__process = context.Process(target=run_worker, name='AlgorithmWorker', daemon=True,
+                                         args=(pipeline, ring_descriptor, list(channel_order), list(used_ch_names),
+                                               sample_rate, scheduler if scheduler else WindowScheduler(),
+                                               self.__tasks, self.__results))
+        self.__dispatcher = threading.Thread(target=self.__dispatch, name='AlgorithmResults', daemon=True)
+
+    @property
+    def is_alive(self) -> bool:
+        return self.__process.is_alive()
+
+    def start(self):
+        """Starts the worker process and the thread of the results"""
+        self.__process.start()
+        self.__dispatcher.start()
+        subscribe("pipeline_changed", self.on_pipeline_changed)
+
+    def submit(self, start: int, length: int, offset_in_percentage: float = 0.2, release_time: float = None,
+               trace: WindowTrace = None):
+        """
+        Hands a sliding window over to the worker, returns immediately
+        :param int start: sequence number of the first sample of the window in the ring
+        :param int length: number of samples of the window
+        :param float offset_in_percentage: offset between start of new window in percentage
+        :param float release_time: time.time() of the last sample of the window, default is now
+        :param WindowTrace trace: latency trace of the window, see latency_tracing
+        """
+        if trace is not None:
+            self.__traces[start] = trace
+        release_time = time.time() if release_time is None else release_time
+        self.__tasks.put_nowait(('window', start, length, self.data_model.f_min, self.data_model.f_max,
+                                 self.data_model.threshold, offset_in_percentage, release_time))
+
+    def on_pipeline_changed(self, attribute: str, value):
+        """
+        Passes a new spatial filter or classifier of perform_algorithm on to the pipeline of the worker
+        :param str attribute: name of the attribute of the pipeline
+        :param value: new value of the attribute
+        """
+        self.__tasks.put_nowait(('set', attribute, value))
+
+    def stop(self, timeout: float = 5):
+        """
+        Stops the worker after the submitted windows
+        :param float timeout: maximal time in s to wait for the worker and the results
+        """
+        unsubscribe("pipeline_changed", self.on_pipeline_changed)
+        if self.__process.pid is None:
+            return
+        self.__tasks.put(None)
+        self.__process.join(timeout)
+        if self.__process.is_alive():
+            self.__process.terminate()
+            self.__process.join()
+            self.__results.put(None)
+        self.__dispatcher.join(timeout)
+
+    def __dispatch(self):
+        """Loop of the thread which publishes the results"""
+        while True:
+            item = self.__results.get()
+            if item is None:
+                break
+            start, result = item
+            trace = self.__traces.pop(start, None)
+            if result is None:
+                self.skipped_windows += 1
+                continue
+            self.processed_windows += 1
+            if trace is not None:
+                # includes the waiting in the queues, both are part of the delay of the movement
+                trace.stamp('processed')
+            if self.callback is not None:
+                self.callback(start, result)
+            else:
+                publish_result(result, self.data_model, self.queue_manager, trace)
@@ -0,0 +1,188 @@
+from typing import List
+
+import numpy as np
+
+from scripts.data.acquisition.channels import sort_channels
+from scripts.data.analysis.cursor_control_algorithm import CursorControlPipeline
+from scripts.data.loader.game_dataset_loader import get_channel_rawdata, get_session_info
+
+""" Offline evaluation of the cursor control algorithm on whole recordings, all windows are processed batched """
+
+
+class EvaluationResult:
+    """
+    Result of the cursor control algorithm for all sliding windows of a recording
+
+    Attribute:
+    ----------
+    times: np.ndarray
+        start time of every window in s
+    hcon: np.ndarray
+        control signal of every window
+    standardized_hcon: np.ndarray
+        standardized control signal of every window
+    labels: np.ndarray
+        calculated label of every window (0 = left, 1 = right, -1 = no signal)
+    true_labels: np.ndarray
+        recorded label at the start of every window (-1 = no left or right trial)
+    """
+
+    def __init__(self, times: np.ndarray, hcon: np.ndarray, standardized_hcon: np.ndarray, labels: np.ndarray,
+                 true_labels: np.ndarray):
+        self.times = times
+        self.hcon = hcon
+        self.standardized_hcon = standardized_hcon
+        self.labels = labels
+        self.true_labels = true_labels
+
+    @property
+    def correct(self) -> np.ndarray:
+        """
+        :return: np.ndarray: True for every window of a trial whose label is correct
+        """
+        return (self.true_labels != -1) & (self.labels == self.true_labels)
+
+    @property
+    def window_accuracy(self) -> float:
+        """
+        :return: share of the windows of the trials with a correct label
+        """
+        in_trial = self.true_labels != -1
+        return float(np.mean(self.correct[in_trial])) if in_trial.any() else 0.0
+
+    @property
+    def decided_accuracy(self) -> float:
+        """
+        :return: share of the windows of the trials with a correct label, only windows with a left or right signal
+        """
+        decided = (self.true_labels != -1) & (self.labels != -1)
+        return float(np.mean(self.correct[decided])) if decided.any() else 0.0
+
+    @property
+    def trial_accuracy(self) -> float:
+        """
+        Like the evaluation of the BCIC test, a trial counts as correct if at least one of its windows has the
+        correct label
+        :return: share of the correct trials
+        """
+        # a trial is a run of windows with the same label != -1
+        starts = np.flatnonzero(np.diff(self.true_labels, prepend=-1) != 0)
+        trial_ids = np.cumsum(np.isin(np.arange(len(self.true_labels)), starts)) - 1
+        in_trial = self.true_labels != -1
+        trials = np.unique(trial_ids[in_trial])
+        if len(trials) == 0:
+            return 0.0
+        correct_trials = np.unique(trial_ids[self.correct])
+        return len(correct_trials) / len(trials)
+
+
+def load_session(session_path: str):
+    """
+    Loads a MindPong session with the channels used by the algorithm (C3 at position 0 and C4 at position 1)
+    :param str session_path: path of the npz file
+    :return: chan_data, label_data, names of the channels, sample rate
+    """
+    sample_rate, channels = get_session_info(session_path)
+    chan_data, label_data = get_channel_rawdata(session_path)
+    indices, used_ch_names = sort_channels(channels)
+    return np.ascontiguousarray(chan_data[indices], dtype=float), label_data, used_ch_names, sample_rate
+
+
+def sliding_windows(chan_data: np.ndarray, window_samples: int, offset_samples: int) -> np.ndarray:
+    """
+    Creates all sliding windows of a recording as strided view (no copy)
+    :param np.ndarray chan_data: recording with the shape (channels, samples)
+    :param int window_samples: number of samples of a window
+    :param int offset_samples: number of samples between the starts of two windows
+    :return: np.ndarray: read-only view with the shape (windows, channels, window_samples)
+    """
+    if chan_data.shape[1] < window_samples:
+        return np.empty((0, chan_data.shape[0], window_samples), dtype=chan_data.dtype)
+    windows = np.lib.stride_tricks.sliding_window_view(chan_data, window_samples, axis=1)[:, ::offset_samples]
+    return windows.transpose(1, 0, 2)
+
+
+def window_true_labels(label_data: np.ndarray, window_starts: np.ndarray, n_samples: int) -> np.ndarray:
+    """
+    Returns the recorded label at the start of every window, only left (0) and right (1) trials count as trials
+    :param np.ndarray label_data: recorded label of every sample, None if there are no labels
+    :param np.ndarray window_starts: index of the first sample of every window
+    :param int n_samples: number of samples of the recording
+    :return: np.ndarray: label of every window (-1 = no trial, e.g. also the calibration)
+    """
+    if label_data is None or len(label_data) != n_samples:
+        return np.full(len(window_starts), -1)
+    true_labels = np.asarray(label_data, dtype=int)[window_starts]
+    return np.where((true_labels == 0) | (true_labels == 1), true_labels, -1)
+
+
+def recording_windows(chan_data: np.ndarray, sample_rate: float, window_size: float, window_offset: float,
+                      t_min: float = 0.0, t_max: float = None):
+    """
+    Creates the sliding windows of a part of a recording like the data acquisition does
+    (a window of window_size seconds every window_offset seconds)
+    :return: windows: strided view with the shape (windows, channels, window_samples)
+             window_starts: index of the first sample of every window in the recording
+    """
+    window_samples = int(window_size * sample_rate)
+    offset_samples = max(int(round(window_offset * sample_rate)), 1)
+    start = int(t_min * sample_rate)
+    stop = int(t_max * sample_rate) if t_max is not None else chan_data.shape[1]
+    windows = sliding_windows(chan_data[:, start:stop], window_samples, offset_samples)
+    return windows, start + np.arange(len(windows)) * offset_samples
+
+
+def recording_band_powers(chan_data: np.ndarray, used_ch_names: List[str], sample_rate: float,
+                          window_size: float = 1.0, window_offset: float = 0.05, bands: tuple = None,
+                          t_min: float = 0.0, t_max: float = None, pipeline: CursorControlPipeline = None,
+                          chunk_size: int = 512):
+    """
+    Calculates the band powers of C3a and C4a of all sliding windows of a recording (steps 0 - 3 of the algorithm)
+    Several bands can be integrated from one spectrum, e.g. for a parameter sweep.
+    :param bands: tuple of (f_min, f_max), default is the band of the pipeline
+    :return: band powers with the shape (windows, 2, n_bands), the index of the first sample of every window
+    """
+    pipeline = pipeline if pipeline else CursorControlPipeline()
+    bands = bands if bands else ((pipeline.f_min, pipeline.f_max),)
+    windows, window_starts = recording_windows(chan_data, sample_rate, window_size, window_offset, t_min, t_max)
+    band_powers = np.empty((len(windows), 2, len(bands)))
+    for i in range(0, len(windows), chunk_size):
+        band_powers[i:i + chunk_size] = pipeline.calculate_band_powers(windows[i:i + chunk_size], used_ch_names,
+                                                                       sample_rate, bands)
+    return band_powers, window_starts
+
+
+def evaluate_recording(chan_data: np.ndarray, label_data: np.ndarray, used_ch_names: List[str], sample_rate: float,
+                       window_size: float = 1.0, window_offset: float = 0.05, t_min: float = 0.0,
+                       t_max: float = None, pipeline: CursorControlPipeline = None,
+                       chunk_size: int = 512) -> EvaluationResult:
+    """
+    Evaluates the cursor control algorithm on a whole recording, e.g. a BCIC subject or a MindPong session.
+    The windows are created like the data acquisition does (a window every window_offset seconds) and processed in
+    chunks of chunk_size windows, so the memory does not grow with the length of the recording.
+    No game events are posted and no queues are filled.
+    :param np.ndarray chan_data: recording with the shape (channels, samples), C3 and C4 at position 0 and 1
+    :param np.ndarray label_data: recorded label of every sample, None if there are no labels
+    :param list[str] used_ch_names: names of the channels
+    :param float sample_rate: sample rate of the recording
+    :param float window_size: length of a sliding window in s
+    :param float window_offset: time between the starts of two windows in s
+    :param float t_min: start of the evaluated part of the recording in s
+    :param float t_max: end of the evaluated part of the recording in s, None for the end of the recording
+    :param CursorControlPipeline pipeline: configured pipeline, a new one is used by default.
+                                           Its normalization state is continued.
+    :param int chunk_size: number of windows which are processed at once
+    :return: EvaluationResult of all windows
+    """
+    pipeline = pipeline if pipeline else CursorControlPipeline()
+    windows, window_starts = recording_windows(chan_data, sample_rate, window_size, window_offset, t_min, t_max)
+    results = [pipeline.process_windows(windows[i:i + chunk_size], used_ch_names, sample_rate,
+                                        window_offset / window_size)
+               for i in range(0, len(windows), chunk_size)]
+
+    def concatenate(attribute):
+        return np.concatenate([getattr(result, attribute) for result in results]) if results else np.empty(0)
+
+    return EvaluationResult(window_starts / sample_rate, concatenate('hcon'), concatenate('standardized_hcon'),
+                            concatenate('label').astype(int),
+                            window_true_labels(label_data, window_starts, chan_data.shape[1]))
@@ -0,0 +1,82 @@
+import argparse
+import functools
+import timeit
+
+import numpy as np
+
+from scripts.data.analysis.cursor_control_algorithm import CursorControlPipeline, PSD_METHOD
+
+"""
+Benchmark of the spectral estimation methods of the cursor control algorithm for different window sizes.
+Every method estimates the spectrum of C3a and C4a of one sliding window with CursorControlPipeline.spectral_analysis.
+Run with: python -m scripts.data.analysis.benchmark_spectral_estimation
+"""
+
+WINDOW_DURATIONS_MS = [200, 500, 1000, 1500, 2000]
+
+
+def create_methods(sampling_rate: float, f_min: float, f_max: float, burg_order: int):
+    """
+    Creates a pipeline per spectral estimation method with the configuration of the cursor control algorithm
+    :return: dict: name of the method -> function which takes the samples of C3a and C4a stacked
+    """
+    methods = dict()
+    for method in (PSD_METHOD.fft, PSD_METHOD.periodogram, PSD_METHOD.multitaper, PSD_METHOD.burg):
+        pipeline = CursorControlPipeline(method, f_min=f_min, f_max=f_max, burg_order=burg_order)
+        methods[method.name] = functools.partial(pipeline.spectral_analysis, sample_rate=sampling_rate)
+    return methods
+
+
+def run_benchmark(sampling_rate: float = 125, f_min: float = 8, f_max: float = 12, burg_order: int = 10,
+                  repeat: int = 5, number: int = 200, durations_ms: list = None):
+    """
+    Measures the time of every method per sliding window
+    :param float sampling_rate: sample rate of the windows
+    :param float f_min: lowest frequency of the band
+    :param float f_max: highest frequency of the band
+    :param int burg_order: order of the AR model of the Burg method
+    :param int repeat: number of measurements, the fastest is taken
+    :param int number: number of windows per measurement
+    :param list durations_ms: window durations in ms
+    :return: list of rows (window duration in ms, samples per window, {method: time per window in µs}),
+             the time is None if the method does not support the window size
+    """
+    rng = np.random.default_rng(0)
+    methods = create_methods(sampling_rate, f_min, f_max, burg_order)
+    results = list()
+    for duration in durations_ms if durations_ms else WINDOW_DURATIONS_MS:
+        n_times = int(duration / 1000 * sampling_rate)
+        samples = rng.standard_normal((2, n_times))
+        times = dict()
+        for name, method in methods.items():
+            try:
+                method(samples)  # creates the cached plans outside the measurement
+            except ValueError:
+                # e.g. the multitaper bandwidth is too narrow for the window
+                times[name] = None
+                continue
+            best = min(timeit.repeat(lambda: method(samples), repeat=repeat, number=number))
+            times[name] = best / number * 1e6
+        results.append((duration, n_times, times))
+    return results
+
+
+def format_time(time_us: float):
+    return f'{"n/a":>16}' if time_us is None else f'{time_us:>16.1f}'
+
+
+def print_results(results: list):
+    names = list(results[0][2].keys())
+    print(f'{"window":>8} {"samples":>8} ' + ' '.join(f'{name + " [µs]":>16}' for name in names))
+    for duration, n_times, times in results:
+        print(f'{str(duration) + " ms":>8} {n_times:>8} ' + ' '.join(format_time(times[name]) for name in names))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of the spectral estimation methods')
+    parser.add_argument('--sampling-rate', type=float, default=125)
+    parser.add_argument('--f-min', type=float, default=8)
+    parser.add_argument('--f-max', type=float, default=12)
+    parser.add_argument('--burg-order', type=int, default=10)
+    args = parser.parse_args()
+    print_results(run_benchmark(args.sampling_rate, args.f_min, args.f_max, args.burg_order))
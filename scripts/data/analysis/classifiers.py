@@ -0,0 +1,354 @@
+import copy
+import os
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+import numpy as np
+
+import scripts.config as config
+from scripts.data.analysis.batch_evaluation import load_session
+from scripts.data.analysis.cursor_control_algorithm import CursorControlPipeline
+from scripts.data.analysis.feature_extraction import BETA_BAND, MU_BAND
+from scripts.data.analysis.spatial_patterns import labelled_windows
+
+"""
+Classifier stage of the cursor control algorithm: decides left or right from the band power features of a window
+instead of the threshold comparison of the standardized hcon.
+The classifiers are trained offline from recorded sessions and saved as npz file next to the session files,
+perform_algorithm loads the classifier of config.CLASSIFIER_FILE at the start of the stream.
+"""
+
+# file name suffix of a classifier saved next to a session, session-1.npz -> session-1.classifier.npz
+CLASSIFIER_SUFFIX = '.classifier.npz'
+# directory of the recorded sessions, relative paths of config.CLASSIFIER_FILE start here
+SESSION_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'session')
+
+
+class ClassifierStage(ABC):
+    """
+    Classifier of the feature vectors of windows.
+    The feature vector are the band powers of the bands on the spatially filtered channels, see
+    CursorControlPipeline.calculate_features, in the order channel by channel.
+    The decision value is positive for left (label 0) and negative for right (label 1), like the standardized hcon.
+
+    Attribute:
+    ----------
+    bands: tuple
+        tuple of (f_min, f_max) of the band powers
+    channels: tuple
+        names of the spatially filtered channels, None for the spatial filter of hcon (C3a and C4a or CSP components)
+    margin: float
+        no signal (-1) is emitted while the absolute decision value is not above the margin
+    """
+
+    # name of the classifier in the saved files
+    name = None
+
+    def __init__(self, bands: tuple = (MU_BAND, BETA_BAND), channels: tuple = None, margin: float = 0.0):
+        """
+        Constructor method
+        :param tuple bands: tuple of (f_min, f_max) of the band powers
+        :param tuple channels: names of the spatially filtered channels, None for the spatial filter of hcon
+        :param float margin: minimal absolute decision value of a left or right signal
+        """
+        self.bands = tuple(tuple(band) for band in bands)
+        self.channels = tuple(channels) if channels else None
+        self.margin = margin
+
+    @property
+    @abstractmethod
+    def is_fitted(self) -> bool:
+        """
+        :return: True if the classifier is trained
+        """
+
+    @property
+    def can_update(self) -> bool:
+        """
+        :return: True if partial_fit can update the classifier, e.g. after it was loaded
+        """
+        return False
+
+    @abstractmethod
+    def fit(self, features: np.ndarray, labels: np.ndarray):
+        """
+        Trains the classifier
+        :param np.ndarray features: feature vectors with the shape (windows, n_features)
+        :param np.ndarray labels: label of every window (0 = left, 1 = right)
+        :return: self
+        """
+
+    def partial_fit(self, features: np.ndarray, labels: np.ndarray):
+        """
+        Updates the classifier with additional windows, e.g. of a newly recorded trial
+        :param np.ndarray features: feature vectors with the shape (windows, n_features)
+        :param np.ndarray labels: label of every window (0 = left, 1 = right)
+        :return: self
+        """
+        raise NotImplementedError(f'{type(self).__name__} can not be trained incrementally')
+
+    def reset(self):
+        """Discards the training, e.g. because the features change with a new spatial filter"""
+        raise NotImplementedError(f'{type(self).__name__} can not be reset')
+
+    def snapshot(self):
+        """
+        :return: independent copy of the classifier, e.g. to hand it over to another thread
+        """
+        return copy.deepcopy(self)
+
+    @abstractmethod
+    def decision_function(self, features: np.ndarray):
+        """
+        Calculates the decision values
+        :param np.ndarray features: feature vector with the shape (n_features,) or (windows, n_features)
+        :return: decision value (float) or decision values with the shape (windows,)
+        """
+
+    @abstractmethod
+    def parameters(self) -> dict:
+        """
+        :return: dict of the trained parameters and the settings which are saved
+        """
+
+    @abstractmethod
+    def set_parameters(self, parameters: dict):
+        """
+        Restores the trained parameters and the settings of a saved classifier
+        :param dict parameters: arrays of the saved file
+        """
+
+    def predict(self, features: np.ndarray):
+        """
+        Converts the decision values into labels
+        :param np.ndarray features: feature vector with the shape (n_features,) or (windows, n_features)
+        :return: label (int) or labels with the shape (windows,) (0 = left, 1 = right, -1 = no signal)
+        """
+        return self.decide(self.decision_function(features))
+
+    def decide(self, decision):
+        """
+        Converts decision values into labels
+        :param decision: decision value (float) or decision values with the shape (windows,)
+        :return: label (int) or labels with the shape (windows,) (0 = left, 1 = right, -1 = no signal)
+        """
+        labels = np.where(decision > self.margin, 0, np.where(decision < -self.margin, 1, -1))
+        return int(labels) if np.ndim(labels) == 0 else labels
+
+    def save(self, path: str):
+        """
+        Saves the classifier as npz file
+        :param str path: path of the file
+        """
+        channels = np.asarray(self.channels if self.channels else [], dtype=str)
+        np.savez(path, classifier=self.name, bands=np.asarray(self.bands, dtype=float), channels=channels,
+                 margin=self.margin, **self.parameters())
+
+
+class LinearDiscriminant(ClassifierStage):
+    """
+    Linear discriminant analysis (LDA) with shrinkage of the covariance matrix.
+    A window is classified with one dot product of its (log) band powers. The weights are scaled so that the
+    decision value is measured in standard deviations of the classes along the discriminant.
+    The sums of the features and of their outer products are kept per class, so the classifier can be updated
+    with new windows (partial_fit) without the old ones. They are saved with the classifier, so a loaded classifier
+    can be updated as well.
+
+    Attribute:
+    ----------
+    shrinkage: float
+        shrinkage of the covariance matrix towards a multiple of the identity (0..1)
+    log_features: bool
+        the logarithms of the band powers are classified, which makes their distributions nearly normal
+    weights: np.ndarray
+        weight of every feature
+    bias: float
+        offset of the decision value
+    """
+
+    name = 'lda'
+
+    def __init__(self, bands: tuple = (MU_BAND, BETA_BAND), channels: tuple = None, margin: float = 0.0,
+                 shrinkage: float = 0.1, log_features: bool = True):
+        """
+        Constructor method
+        :param float shrinkage: shrinkage of the covariance matrix (0..1)
+        :param bool log_features: classify the logarithms of the band powers
+        """
+        super().__init__(bands, channels, margin)
+        self.shrinkage = shrinkage
+        self.log_features = log_features
+        self.weights = None
+        self.bias = 0.0
+        # per class (left, right): number of windows, sum of the features, sum of the outer products
+        self.__counts = np.zeros(2)
+        self.__sums = None
+        self.__products = None
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.weights is not None
+
+    @property
+    def can_update(self) -> bool:
+        # a classifier of a file without the sums can only be trained again with fit
+        return self.weights is None or self.__sums is not None
+
+    def __prepare(self, features: np.ndarray) -> np.ndarray:
+        """Applies the logarithm to the band powers if required"""
+        features = np.asarray(features, dtype=float)
+        return np.log(np.maximum(features, np.finfo(float).tiny)) if self.log_features else features
+
+    def fit(self, features: np.ndarray, labels: np.ndarray):
+        self.reset()
+        return self.partial_fit(features, labels)
+
+    def reset(self):
+        self.weights = None
+        self.bias = 0.0
+        self.__counts = np.zeros(2)
+        self.__sums = None
+        self.__products = None
+
+    def partial_fit(self, features: np.ndarray, labels: np.ndarray):
+        if not self.can_update:
+            raise ValueError('The LDA was saved without the sums of its windows, it can only be trained with fit')
+        features = self.__prepare(features)
+        labels = np.asarray(labels)
+        if self.__sums is None:
+            self.__sums = np.zeros((2, features.shape[-1]))
+            self.__products = np.zeros((2, features.shape[-1], features.shape[-1]))
+        for label in (0, 1):
+            class_features = features[labels == label]
+            self.__counts[label] += len(class_features)
+            self.__sums[label] += class_features.sum(axis=0)
+            self.__products[label] += class_features.T @ class_features
+
+        n_left, n_right = self.__counts
+        if n_left < 2 or n_right < 2:
+            if self.weights is None:
+                raise ValueError('LDA needs at least two windows of left and right trials')
+            return self
+
+        mean_left, mean_right = self.__sums[0] / n_left, self.__sums[1] / n_right
+        scatter = (self.__products[0] - n_left * np.outer(mean_left, mean_left) + self.__products[1] -
+                   n_right * np.outer(mean_right, mean_right))
+        covariance = scatter / (n_left + n_right - 2)
+        identity = np.trace(covariance) / len(covariance) * np.eye(len(covariance))
+        covariance = (1 - self.shrinkage) * covariance + self.shrinkage * identity
+
+        weights = np.linalg.solve(covariance, mean_left - mean_right)
+        # log odds of left against right, scaled by the distance of the class means
+        distance = np.sqrt(max(weights @ (mean_left - mean_right), np.finfo(float).tiny))
+        bias = -weights @ (mean_left + mean_right) / 2 + np.log(n_left / n_right)
+        self.weights = weights / distance
+        self.bias = float(bias / distance)
+        return self
+
+    def decision_function(self, features: np.ndarray):
+        return self.__prepare(features) @ self.weights + self.bias
+
+    def parameters(self) -> dict:
+        parameters = {'weights': self.weights, 'bias': self.bias, 'shrinkage': self.shrinkage,
+                      'log_features': self.log_features}
+        if self.__sums is not None:
+            parameters.update(counts=self.__counts, sums=self.__sums, products=self.__products)
+        return parameters
+
+    def set_parameters(self, parameters: dict):
+        self.weights = np.asarray(parameters['weights'], dtype=float)
+        self.bias = float(parameters['bias'])
+        self.shrinkage = float(parameters['shrinkage'])
+        self.log_features = bool(parameters['log_features'])
+        if 'sums' in parameters:
+            self.__counts = np.array(parameters['counts'], dtype=float)
+            self.__sums = np.array(parameters['sums'], dtype=float)
+            self.__products = np.array(parameters['products'], dtype=float)
+        else:
+            self.__counts = np.zeros(2)
+            self.__sums = None
+            self.__products = None
+
+
+# available classifiers by their name in the saved files
+CLASSIFIERS = {LinearDiscriminant.name: LinearDiscriminant}
+
+
+def classifier_path(session_path: str) -> str:
+    """
+    :param str session_path: path of the npz file of a session
+    :return: path of the classifier which is saved next to the session
+    """
+    root, _ = os.path.splitext(session_path)
+    return root + CLASSIFIER_SUFFIX
+
+
+def load_classifier(path: str) -> ClassifierStage:
+    """
+    Loads a saved classifier
+    :param str path: path of the classifier file, or of a session file with a classifier next to it
+    :return: ClassifierStage: the trained classifier
+    """
+    if not path.endswith(CLASSIFIER_SUFFIX):
+        path = classifier_path(path)
+    with np.load(path) as data:
+        classifier = CLASSIFIERS[str(data['classifier'])](tuple(map(tuple, data['bands'])),
+                                                          tuple(str(name) for name in data['channels']),
+                                                          float(data['margin']))
+        classifier.set_parameters(data)
+    return classifier
+
+
+def load_configured_classifier() -> Optional[ClassifierStage]:
+    """
+    Loads the classifier of config.CLASSIFIER_FILE for the online use
+    :return: ClassifierStage: the trained classifier, None if no file is configured or it can not be loaded
+    """
+    if not config.CLASSIFIER_FILE:
+        return None
+    try:
+        return load_classifier(os.path.join(SESSION_DIRECTORY, config.CLASSIFIER_FILE))
+    except (OSError, KeyError, ValueError) as exception:
+        print("Classifier not loaded, the threshold decides: ", exception)
+        return None
+
+
+def session_features(session_path: str, classifier: ClassifierStage, pipeline: CursorControlPipeline = None,
+                     window_size: float = 1.0, window_offset: float = 0.05):
+    """
+    Calculates the feature vectors of all windows within the left and right trials of a session
+    :param str session_path: path of the npz file of the session
+    :param ClassifierStage classifier: classifier whose features are calculated
+    :param CursorControlPipeline pipeline: pipeline whose method, montage and spatial filter are used
+    :param float window_size: length of a sliding window in s
+    :param float window_offset: time between the starts of two windows in s
+    :return: features with the shape (windows, n_features), label of every window
+    """
+    pipeline = pipeline if pipeline else CursorControlPipeline()
+    chan_data, label_data, used_ch_names, sample_rate = load_session(session_path)
+    windows, labels = labelled_windows(chan_data, label_data, sample_rate, window_size, window_offset)
+    features = pipeline.calculate_features(windows, used_ch_names, sample_rate, classifier.bands,
+                                           classifier.channels)
+    return features.reshape(len(windows), -1), labels
+
+
+def train_classifier(session_paths: List[str], classifier: ClassifierStage = None,
+                     pipeline: CursorControlPipeline = None, window_size: float = 1.0, window_offset: float = 0.05,
+                     save: bool = True) -> ClassifierStage:
+    """
+    Trains a classifier from the trials of recorded sessions and saves it next to the last session
+    :param list[str] session_paths: paths of the npz files of the sessions
+    :param ClassifierStage classifier: configured classifier, a LinearDiscriminant by default
+    :param CursorControlPipeline pipeline: pipeline whose method, montage and spatial filter are used online
+    :param float window_size: length of a sliding window in s, should be the window size of the game
+    :param float window_offset: time between the starts of two windows in s
+    :param bool save: save the classifier next to the last session (see classifier_path)
+    :return: ClassifierStage: the trained classifier
+    """
+    classifier = classifier if classifier else LinearDiscriminant()
+    features, labels = zip(*[session_features(path, classifier, pipeline, window_size, window_offset)
+                             for path in session_paths])
+    classifier.fit(np.concatenate(features), np.concatenate(labels))
+    if save:
+        classifier.save(classifier_path(session_paths[-1]))
+    return classifier
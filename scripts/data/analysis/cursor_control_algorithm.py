@@ -1,16 +1,26 @@
 import enum
+from functools import lru_cache
+from typing import TYPE_CHECKING
 
-import mne
 import numpy as np
+import scipy.fft
 import scipy.integrate
-from numpy import linspace
 from numpy_ringbuffer import RingBuffer
 from scipy import signal
 
 import scripts.config as config
-from scripts.data.acquisition.read_data import QueueManager
-# from spectrum import arburg, arma2psd
+from scripts.data.acquisition.channels import CHANNEL_WEIGHTS
+from scripts.data.analysis.running_statistics import RunningStatistics, StatisticsMode
+from scripts.data.analysis.spectral_estimation import BandIntegrator, BurgEstimator, MultitaperEngine, \
+    SlidingDFTBandPower
+from scripts.data.analysis.stage_profiler import StageProfiler
 from scripts.utils.event_listener import post_event
+from scripts.utils.latency_tracing import WindowTrace, tracer
+
+if TYPE_CHECKING:
+    # only for the annotations: the queue manager imports the live plot, which must not be loaded by the
+    # algorithm worker and the offline evaluation
+    from scripts.utils.QueueManager import QueueManager
 
 
 class PSD_METHOD(enum.Enum):
@@ -21,25 +31,88 @@ class PSD_METHOD(enum.Enum):
     multitaper = 2
     periodogram = 3
     burg = 4
+    sliding_dft = 5  # band bins of the fft updated incrementally from window to window
+
+
+class MONTAGE(enum.Enum):
+    """
+    Spatial filter which derives C3a and C4a from the channels
+    """
+    laplacian = 1  # C3/C4 minus the mean of the surrounding channels (small or large laplacian by channel selection)
+    car = 2  # C3/C4 minus the common average of all channels
+    weighted = 3  # C3/C4 minus the weighted mean of the surrounding channels, weights from config.CH_NAMES_WEIGHT
 
 
 # Global variables
+# hcon history of manage_ringbuffer, the pipeline keeps its history in RunningStatistics
 ringbuffer_hcon = None
-F_MIN: float
-F_MAX: float
-SAMPLING_FREQ: int
+# configuration of the default pipeline of perform_algorithm
 USED_METHOD = PSD_METHOD.multitaper
+USED_MONTAGE = MONTAGE.laplacian
+USED_NORMALIZATION = StatisticsMode.frozen
+# trained CSP filters of perform_algorithm, None if the montage is used
+used_spatial_patterns = None
+# trained classifier of perform_algorithm, None if the label is derived from the threshold
+used_classifier = None
+# stage timers of perform_algorithm, None if the stages are not profiled
+used_profiler = StageProfiler() if config.STAGE_PROFILING else None
+# pipeline of perform_algorithm, created on the first window
+default_pipeline = None
+# band integration weights of integrate_psd_values, cached per frequency grid and band
+band_integrator = BandIntegrator()
+
+
+def set_spatial_patterns(spatial_patterns):
+    """
+    Replaces the montage of perform_algorithm by trained CSP filters (or the filters by the montage again).
+    hcon changes its scale with the spatial filter, so the normalization of the default pipeline starts again.
+    The default pipeline takes the filters over before its next window (see get_default_pipeline), so they can be
+    set from any thread. The event pipeline_changed passes the filters on, e.g. to the pipeline of the algorithm
+    worker.
+    :param CommonSpatialPatterns spatial_patterns: trained filters, None to use the montage
+    """
+    global used_spatial_patterns
+    used_spatial_patterns = spatial_patterns
+    post_event("pipeline_changed", "spatial_patterns", spatial_patterns)
+
+
+def set_classifier(classifier):
+    """
+    Lets a trained classifier decide the labels of perform_algorithm instead of the threshold comparison
+    The event pipeline_changed passes the classifier on, e.g. to the pipeline of the algorithm worker.
+    :param ClassifierStage classifier: trained classifier, None for the threshold comparison
+    """
+    global used_classifier
+    used_classifier = classifier
+    if default_pipeline is not None:
+        default_pipeline.classifier = classifier
+    post_event("pipeline_changed", "classifier", classifier)
 
 
+def set_profiler(profiler):
+    """
+    Switches the stage timers of perform_algorithm on or off
+    The event pipeline_changed passes the profiler on, the algorithm worker profiles with its own copy.
+    :param StageProfiler profiler: timers of the stages, None to switch the profiling off
+    """
+    global used_profiler
+    used_profiler = profiler
+    if default_pipeline is not None:
+        default_pipeline.profiler = profiler
+    post_event("pipeline_changed", "profiler", profiler)
+
+
+# The single steps of the original algorithm. CursorControlPipeline folds them into its batched stages, they are
+# kept as the reference of cursor_control_algorithm_test.
 def standardize_data(in_data: np.ndarray):
     """
     Standardizes input data
     Benefit of standardization rather than normalisation, as standardization is much more robust against outliers.
-    :param in_data: samples of a channel
-    :return: Standardized data
+    :param in_data: samples of a channel or of several channels with the shape (channels, samples)
+    :return: Standardized data (each channel is standardized on its own)
     """
-    mean = np.mean(in_data)
-    std = np.std(in_data)
+    mean = np.mean(in_data, axis=-1, keepdims=True)
+    std = np.std(in_data, axis=-1, keepdims=True)
     out_data = in_data - mean
     out_data = out_data / std
     return out_data
@@ -53,28 +126,21 @@ def calculate_laplacian(samples: np.ndarray):
     :param samples: samples of each channel
     :return: calculated average
     """
-    result = list()
-    for i in range(len(samples[0])):
-        average = 0
-        for j in range(len(samples)):
-            average += samples[j][i]
-        average /= len(samples)
-        result.append(average)
-
-    result = np.asarray(result)
-    return result
+    return np.mean(samples, axis=0)
 
 
-def split_laplacian_areas(samples_list: np.ndarray, used_ch_names: list):
+@lru_cache(maxsize=None)
+def laplacian_area_indices(used_ch_names: tuple):
     """
-    Divide the channel into the corresponding areas for c3 and c4.
-    Channels with an even number in the name belong to C4, and with an odd number to C3.
-    :param samples_list:list of the channels
-    :param used_ch_names: list of the channel names associated with the channel
-    :return: 2 list containing sorted channels belonging to c3 and c4
+    Divide the channels into the corresponding areas for c3 and c4.
+    Channels with an even number in the name belong to C4, and with an odd number to C3,
+    channels without a number (e.g. Cz) belong to both.
+    The result is cached per channel map.
+    :param used_ch_names: tuple of the channel names
+    :return: 2 tuples containing the indices of the channels belonging to c3 and c4
     """
-    channels_around_c3 = list()
-    channels_around_c4 = list()
+    indices_around_c3 = list()
+    indices_around_c4 = list()
 
     for i in range(len(used_ch_names)):
         c = used_ch_names[i][-1]
@@ -82,153 +148,603 @@ def split_laplacian_areas(samples_list: np.ndarray, used_ch_names: list):
         # sort into channels belonging to c3 and c4
         if c.isnumeric():
             if int(c) % 2 == 0:
-                channels_around_c4.append(samples_list[i])
+                indices_around_c4.append(i)
             else:
-                channels_around_c3.append(samples_list[i])
+                indices_around_c3.append(i)
         else:
-            channels_around_c3.append(samples_list[i])
-            channels_around_c4.append(samples_list[i])
+            indices_around_c3.append(i)
+            indices_around_c4.append(i)
 
-    # convert back to np arrays
-    channels_around_c3 = np.asarray(channels_around_c3)
-    channels_around_c4 = np.asarray(channels_around_c4)
-    return channels_around_c3, channels_around_c4
+    return tuple(indices_around_c3), tuple(indices_around_c4)
 
 
-def calculate_spatial_filtering(samples_list: np.ndarray, used_ch_names: list):
+def split_laplacian_areas(samples_list: np.ndarray, used_ch_names: list):
+    """
+    Divide the channel into the corresponding areas for c3 and c4.
+    Channels with an even number in the name belong to C4, and with an odd number to C3.
+    :param samples_list:list of the channels
+    :param used_ch_names: list of the channel names associated with the channel
+    :return: 2 list containing sorted channels belonging to c3 and c4
+    """
+    indices_around_c3, indices_around_c4 = laplacian_area_indices(tuple(used_ch_names))
+    samples_list = np.asarray(samples_list)
+    return samples_list[list(indices_around_c3)], samples_list[list(indices_around_c4)]
+
+
+@lru_cache(maxsize=None)
+def spatial_filter_matrix(used_ch_names: tuple, montage: MONTAGE = MONTAGE.laplacian):
+    """
+    Builds the spatial filter as matrix, so that a window is filtered with one matrix multiplication:
+    [C3a, C4a] = matrix @ samples
+    The matrix is cached per channel map and montage.
+    :param used_ch_names: tuple of the channel names (with C3 at position 0 and C4 at position 1)
+    :param montage: spatial filter which is used
+    :return: np.ndarray: matrix with the shape (2, channels)
+    """
+    return channel_filter_matrix(tuple(used_ch_names), tuple(used_ch_names[:2]), montage)
+
+
+@lru_cache(maxsize=None)
+def channel_filter_matrix(used_ch_names: tuple, channels: tuple, montage: MONTAGE = MONTAGE.laplacian):
+    """
+    Builds the spatial filter of any set of channels as matrix, see spatial_filter_matrix.
+    Each channel is referenced to the (weighted) average of the other channels of its area (see
+    laplacian_area_indices, channels without a number are referenced to all channels) or to the common average.
+    The matrix is cached per channel map, channel selection and montage.
+    :param used_ch_names: tuple of the channel names
+    :param channels: tuple of the names of the filtered channels, e.g. ('C3', 'C4', 'CP5', 'CP6')
+    :param montage: spatial filter which is used
+    :return: np.ndarray: matrix with the shape (len(channels), len(used_ch_names))
+    """
+    n_channels = len(used_ch_names)
+    matrix = np.zeros((len(channels), n_channels))
+
+    if montage == MONTAGE.weighted:
+        weights = np.asarray([CHANNEL_WEIGHTS.get(name, 1) for name in used_ch_names], dtype=float)
+    else:
+        weights = np.ones(n_channels)
+
+    indices_left, indices_right = laplacian_area_indices(tuple(used_ch_names))
+    for row, name in enumerate(channels):
+        index = used_ch_names.index(name)
+        matrix[row, index] = 1
+
+        if montage == MONTAGE.car:
+            matrix[row] -= 1 / n_channels
+            continue
+
+        # subtract the (weighted) average of the other channels of the area
+        area = set()
+        if index in indices_left:
+            area.update(indices_left)
+        if index in indices_right:
+            area.update(indices_right)
+        indices = np.asarray(sorted(area - {index}), dtype=int)
+        area_weights = weights[indices]
+        if len(indices) > 0 and area_weights.sum() != 0:
+            matrix[row, indices] -= area_weights / area_weights.sum()
+    return matrix
+
+
+def calculate_spatial_filtering(samples_list: np.ndarray, used_ch_names: list, montage: MONTAGE = None):
     """
     Subtract the calculated average samples from C3 and C4 to perform the spatial filtering
+    All samples are filtered with one multiplication with the cached spatial filter matrix of the channel map
     :param used_ch_names: associated names of all channels (with C3 at position 0 and C4 at position 1)
     :param samples_list: samples of all channels (with C3 at position 0 and C4 at position 1)
+    :param montage: spatial filter which is used, default is USED_MONTAGE
     :return: filtered C3, C4 samples
     """
-    samples_c3a = list()
-    samples_c4a = list()
-    # splits the channels into c3 and c4 related channels
-    split_channels = split_laplacian_areas(samples_list[2:], used_ch_names[2:])
-    # calculate the average for the c3 and c4 related channels
-    samples_average_c3 = calculate_laplacian(split_channels[0][:])
-    samples_average_c4 = calculate_laplacian(split_channels[1][:])
-
-    for i in range(len(samples_list[0])):
-        samples_c3a.append(samples_list[0][i] - samples_average_c3[i])
-        samples_c4a.append(samples_list[1][i] - samples_average_c4[i])
-
-    # convert back to np arrays
-    samples_c3a = np.asarray(samples_c3a)
-    samples_c4a = np.asarray(samples_c4a)
+    montage = montage if montage else USED_MONTAGE
+    samples_c3a, samples_c4a = spatial_filter_matrix(tuple(used_ch_names), montage) @ samples_list
     return samples_c3a, samples_c4a
 
 
-def perform_multitaper(samples: np.ndarray, jobs=-1):
+def perform_multitaper(samples: np.ndarray, sampling_rate: float, f_min: float, f_max: float,
+                       engine: MultitaperEngine, bandwidth: float = None):
     """
     Performs multitaper function to convert all samples from time into frequency domain
-    :param samples: all samples from a channel (should be filtered)
-    :param jobs: number of jobs to run in parallel (-1 = num of available CPU cores)
+    The tapers are cached by the engine, several channels (e.g. C3a and C4a stacked) are
+    calculated in one call and only the frequencies between f_min and f_max are calculated.
+    :param samples: all samples from a channel (should be filtered), or several channels with the shape (channels, samples)
+    :param sampling_rate: sample rate of the samples
+    :param f_min: lowest frequency of the output
+    :param f_max: highest frequency of the output
+    :param engine: multitaper engine with the cached tapers
+    :param bandwidth: frequency bandwidth of the tapers, default is f_max - f_min
     :return: psd_abs: power spectral density (PSD) of the samples
              freqs: the corresponding frequencies
     """
-    _bandwidth = F_MAX - F_MIN if F_MAX - F_MIN > 0 else 1
-    psds, freqs = mne.time_frequency.psd_array_multitaper(samples, sfreq=SAMPLING_FREQ, n_jobs=jobs, bandwidth=_bandwidth, fmin=F_MIN, fmax=F_MAX, verbose=False)
+    _bandwidth = bandwidth if bandwidth is not None else f_max - f_min
+    _bandwidth = _bandwidth if _bandwidth > 0 else 1
+    psds, freqs = engine.psd(samples, sampling_rate, _bandwidth, f_min, f_max)
     psds_abs = np.abs(psds)
 
     return psds_abs, freqs
 
 
-def perform_periodogram(samples: np.ndarray):
-    return signal.periodogram(samples, SAMPLING_FREQ)
+def perform_periodogram(samples: np.ndarray, sampling_rate: float):
+    return signal.periodogram(samples, sampling_rate)
 
 
-def perform_rfft(samples: np.ndarray):
+def perform_rfft(samples: np.ndarray, sampling_rate: float):
     """
     Performs fft function to convert all samples from time into frequency domain
-    :param samples: all samples from a channel (should be filtered)
-    :return: fft_spectrum_abs: power spectral density (PSD) of the samples
+    :param samples: all samples from a channel (should be filtered), or several channels with the shape (..., samples)
+    :param sampling_rate: sample rate of the samples
+    :return: fft_spectrum_abs: power spectral density (PSD) of the samples, float32 for float32 samples
              freqs: the corresponding frequencies
     """
-    fft_spectrum = np.fft.rfft(samples)
-    freqs = np.fft.rfftfreq(len(samples), d=1 / SAMPLING_FREQ)
+    fft_spectrum = scipy.fft.rfft(samples)
+    freqs = np.fft.rfftfreq(np.shape(samples)[-1], d=1 / sampling_rate)
     fft_spectrum_abs = np.abs(fft_spectrum)
 
     return fft_spectrum_abs, freqs
 
 
-def perform_burg(sample: np.array):
+def perform_burg(samples: np.ndarray, sampling_rate: float, f_min: float, f_max: float, estimator: BurgEstimator):
     """
-     recommended for small window sizes
-    :param sample: all samples from a channel (should be filtered)
-    :return: fft_spectrum_abs: power spectral density (PSD) of the samples
+    Estimates the PSD with an AR model fitted by the Burg method, recommended for small window sizes
+    Only the frequencies between f_min and f_max are evaluated, several channels (e.g. C3a and C4a stacked) are
+    calculated in one call.
+    :param samples: all samples from a channel (should be filtered), or several channels with the shape (channels, samples)
+    :param sampling_rate: sample rate of the samples
+    :param f_min: lowest frequency of the output
+    :param f_max: highest frequency of the output
+    :param estimator: Burg estimator with the order of the AR model
+    :return: psd: power spectral density (PSD) of the samples
              freqs: the corresponding frequencies
     """
-    AR, P, k = arburg(sample, 10)
-    PSD = arma2psd(AR)
-    space = linspace(0, 50, PSD.size)
-
-    # caution! bandpass filter with 50Hz required
-    return PSD, space
+    return estimator.psd(samples, sampling_rate, f_min, f_max)
 
 
 def integrate_psd_values(samples: np.ndarray, frequency_list: np.ndarray, used_filter: PSD_METHOD = None, freq_range: [int, int] = None):
     """
-    Integrates over the calculated PSD values in between the specified frequencies (F_MIN, F_MAX)
-    :param freq_range: Optional frequency range
+    Integrates over the calculated PSD values in between the specified frequencies
+    :param freq_range: frequency range (f_min, f_max), required for PSD_METHOD.fft and PSD_METHOD.periodogram,
+                       without it all values are integrated
     :param used_filter: Set the previously used filter to control integration
     :param samples: F(C3), F(C4)
     :param frequency_list: list of the included frequencies
     :return: sum of all PSDs in the given frequency range
     """
 
-    psds_in_band_power = list()
-    requested_frequency_range = list()
-
-    # Set FMIN and FMAX if freq_range ist not None
-    if freq_range:
-        global F_MIN, F_MAX
-        F_MIN = freq_range[0]
-        F_MAX = freq_range[1]
-
     # psd methods whose return values do not automatically contain exclusively the desired frequency range must be modified.
-    if (used_filter is not None and (used_filter == PSD_METHOD.fft or used_filter == PSD_METHOD.burg or used_filter == PSD_METHOD.periodogram)) or freq_range:
-        for i in range(len(frequency_list)):
-            if F_MAX >= frequency_list[i] >= F_MIN:
-                psds_in_band_power.append(samples[i])
-                requested_frequency_range.append(frequency_list[i])
-
-        band_power = scipy.integrate.trapz(psds_in_band_power, requested_frequency_range) if len(requested_frequency_range) > 0 else 0
-    # only Multitaper returns the already  desired frequency range
+    # Multitaper, Burg and the sliding DFT return the already desired frequency range
+    if not freq_range and used_filter in (PSD_METHOD.fft, PSD_METHOD.periodogram):
+        raise ValueError(f'The PSD of {used_filter.name} covers all frequencies, the band needs freq_range')
+    if freq_range and used_filter not in (PSD_METHOD.multitaper, PSD_METHOD.burg, PSD_METHOD.sliding_dft):
+        # trapezoid integration over the bins within the range as one dot product with cached weights
+        band_power = np.dot(samples, band_integrator.weights(frequency_list, (tuple(freq_range),))[0])
     else:
-        band_power = scipy.integrate.trapz(samples, frequency_list)
+        band_power = scipy.integrate.trapezoid(samples, frequency_list)
 
     return band_power
 
 
+def hcon_history_size(window_size=1.0, offset_in_percentage: float = 0.2):
+    """
+    amount of samples within 30 seconds = 30s / 1/250Hz
+    size of the hcon history = samples within 30s / (sliding_window_factor * 50)
+    :return: number of hcon values within 30 seconds
+    """
+    offset = window_size / (offset_in_percentage * 100.0)
+    return int(((30 - window_size) / offset) + 1)
+
+
+# replaced by CursorControlPipeline.manage_hcon_statistics, kept as the reference of cursor_control_algorithm_test
 def manage_ringbuffer(window_size=1.0, offset_in_percentage: float = 0.2):
     """
     Das ist ein Singleton :)
-    amount of samples within 30 seconds = 30s / 1/250Hz
-    size of Ringbuffer = samples within 30s / (sliding_window_factor * 50)
+    Ringbuffer for the hcon values of the last 30 seconds (see hcon_history_size)
     :return: Ringbuffer instance
     """
     global ringbuffer_hcon
     if ringbuffer_hcon is None:
-        offset = window_size / (offset_in_percentage * 100.0)
-        ringbuffer_hcon = RingBuffer(capacity=int(((30 - window_size) / offset) + 1))
+        ringbuffer_hcon = RingBuffer(capacity=hcon_history_size(window_size, offset_in_percentage))
     return ringbuffer_hcon
 
 
 def clear_ring_buffer():
-    global ringbuffer_hcon
+    """Discards the hcon history and the default pipeline with its normalization state"""
+    global ringbuffer_hcon, default_pipeline
     ringbuffer_hcon = None
+    default_pipeline = None
+
+
+def hcon_to_label(standardized_hcon: float, threshold: float):
+    """
+    Converts the standardized hcon to the corresponding label
+    :param standardized_hcon: standardized control signal
+    :param threshold: threshold of the control signal
+    :return: 0 for a left signal, 1 for a right signal and -1 for no signal
+    """
+    if standardized_hcon > threshold - 0.2:
+        # left signal
+        return 0
+    elif standardized_hcon < -threshold:
+        # right signal
+        return 1
+    return -1
+
+
+def hcon_to_labels(standardized_hcon: np.ndarray, threshold: float):
+    """
+    Converts the standardized hcon values of several windows to the corresponding labels, see hcon_to_label
+    :param standardized_hcon: standardized control signals
+    :param threshold: threshold of the control signal
+    :return: np.ndarray: labels (0 = left, 1 = right, -1 = no signal)
+    """
+    return np.where(standardized_hcon > threshold - 0.2, 0, np.where(standardized_hcon < -threshold, 1, -1))
+
+
+class CursorControlResult:
+    """
+    Result of the cursor control algorithm for one sliding window (for several windows the attributes are arrays)
+
+    Attribute:
+    ----------
+    label: int
+        calculated label (0 = left, 1 = right, -1 = no signal)
+    hcon: float
+        control signal, the weighted band power of C4a minus the band power of C3a
+    standardized_hcon: float
+        hcon standardized with the statistics of the previous windows
+    area_c3: float
+        band power of C3a
+    area_c4: float
+        band power of C4a
+    decision: float
+        decision value of the classifier stage, None if the label is derived from the standardized hcon
+    """
+
+    def __init__(self, label: int, hcon: float, standardized_hcon: float, area_c3: float, area_c4: float,
+                 decision: float = None):
+        self.label = label
+        self.hcon = hcon
+        self.standardized_hcon = standardized_hcon
+        self.area_c3 = area_c3
+        self.area_c4 = area_c4
+        self.decision = decision
+
 
+class CursorControlPipeline:
+    """
+    Cursor control algorithm with its own configuration and state.
+    A pipeline owns the spectral caches (tapers, AR kernels, sliding DFT bins) and the running statistics of hcon,
+    so several pipelines (e.g. for different subjects, boards or parameter sets) can run side by side in one process.
+    The state belongs to one stream of consecutive windows, a pipeline must not be shared by several threads.
+    """
 
-def perform_algorithm(sliding_window, used_ch_names, sample_rate, data_mdl, queue_manager: QueueManager = None, offset_in_percentage=0.2):
+    def __init__(self, method: PSD_METHOD = PSD_METHOD.multitaper, montage: MONTAGE = MONTAGE.laplacian,
+                 normalization: StatisticsMode = StatisticsMode.frozen, f_min: float = 8, f_max: float = 12,
+                 threshold: float = 1.5, weight: float = config.WEIGHT, burg_order: int = 10, spatial_patterns=None,
+                 classifier=None, dtype=np.float64, profiler=None):
+        """
+        Constructor method
+        :param PSD_METHOD method: method of the spectral analysis
+        :param MONTAGE montage: spatial filter which derives C3a and C4a
+        :param StatisticsMode normalization: adaptation of the hcon statistics after the calibration
+        :param float f_min: lowest frequency of the band power
+        :param float f_max: highest frequency of the band power
+        :param float threshold: threshold of the standardized hcon
+        :param float weight: weight of the band power of C4a in hcon
+        :param int burg_order: order of the AR model of PSD_METHOD.burg
+        :param CommonSpatialPatterns spatial_patterns: trained CSP filters which replace the montage, None for the
+                                                       montage
+        :param ClassifierStage classifier: trained classifier which decides the label instead of the threshold,
+                                           None for the threshold comparison of the standardized hcon
+        :param dtype: float type of the windows, spectra and band powers (np.float32 or np.float64), the band powers
+                      are converted to float64 for hcon and the classifier
+        :param StageProfiler profiler: timers of the stages of process and process_windows, None for no profiling
+        """
+        self.method = method
+        self.montage = montage
+        self.normalization = normalization
+        self.f_min = f_min
+        self.f_max = f_max
+        self.threshold = threshold
+        self.weight = weight
+        self.spatial_patterns = spatial_patterns
+        self.classifier = classifier
+        self.dtype = np.dtype(dtype)
+        self.profiler = profiler
+        self.multitaper_engine = MultitaperEngine()
+        self.burg_estimator = BurgEstimator(order=burg_order)
+        self.sliding_band_power = SlidingDFTBandPower()
+        self.band_integrator = BandIntegrator()
+        self.hcon_statistics = None
+
+    def spatial_filter(self, used_ch_names) -> np.ndarray:
+        """
+        Returns the spatial filter of hcon as matrix, the CSP projection if trained filters are set, otherwise
+        the matrix of the montage which derives C3a and C4a
+        :param used_ch_names: names of the channels of the sliding windows
+        :return: np.ndarray: matrix with the shape (components, channels)
+        """
+        if self.spatial_patterns is not None and self.spatial_patterns.is_fitted:
+            return self.spatial_patterns.projection_matrix(tuple(used_ch_names))
+        return spatial_filter_matrix(tuple(used_ch_names), self.montage)
+
+    def hcon_band_powers(self, band_powers: np.ndarray) -> np.ndarray:
+        """
+        Reduces the band powers of the components of the spatial filter to the two areas of hcon (C3a and C4a)
+        :param band_powers: band powers with the shape (..., components, n_bands)
+        :return: band powers with the shape (..., 2, n_bands)
+        """
+        if self.spatial_patterns is not None and self.spatial_patterns.is_fitted:
+            return self.spatial_patterns.class_band_powers(band_powers)
+        return band_powers
+
+    def reset(self):
+        """Discards the normalization state and the state of the sliding DFT, e.g. for a new session"""
+        self.hcon_statistics = None
+        self.sliding_band_power.reset()
+
+    def manage_hcon_statistics(self, window_size=1.0, offset_in_percentage: float = 0.2):
+        """
+        Returns the running statistics of hcon, the calibration covers the first 30 seconds (see hcon_history_size)
+        :return: RunningStatistics instance
+        """
+        if self.hcon_statistics is None:
+            self.hcon_statistics = RunningStatistics(hcon_history_size(window_size, offset_in_percentage),
+                                                     self.normalization)
+        return self.hcon_statistics
+
+    def spectral_analysis(self, samples: np.ndarray, sample_rate: float, f_min: float = None, f_max: float = None):
+        """
+        Converts the spatially filtered samples into the frequency domain with the configured method
+        The spectra of all channels (and of several windows) are calculated in one call. PSD_METHOD.sliding_dft is
+        calculated as fft here, which is what the sliding DFT is equal to.
+        :param samples: spatially filtered samples, e.g. of C3a and C4a, with the shape (..., channels, samples)
+        :param sample_rate: sample rate of the samples
+        :param f_min: lowest frequency calculated by the band limited methods (multitaper, burg), default is f_min
+               of the pipeline
+        :param f_max: highest frequency calculated by the band limited methods, default is f_max of the pipeline.
+               The bandwidth of the multitaper tapers is always the width of the band of the pipeline.
+        :return: psds with the shape (..., channels, n_freqs), the corresponding frequencies
+        """
+        f_min = self.f_min if f_min is None else f_min
+        f_max = self.f_max if f_max is None else f_max
+        if self.method in (PSD_METHOD.fft, PSD_METHOD.sliding_dft):
+            return perform_rfft(samples, sample_rate)
+        elif self.method == PSD_METHOD.periodogram:
+            freqs, psds = perform_periodogram(samples, sample_rate)
+            return psds, freqs
+        elif self.method == PSD_METHOD.burg:
+            return perform_burg(samples, sample_rate, f_min, f_max, self.burg_estimator)
+        elif self.method == PSD_METHOD.multitaper:
+            return perform_multitaper(samples, sample_rate, f_min, f_max, self.multitaper_engine,
+                                      self.f_max - self.f_min)
+        raise NotImplementedError(f'The specified method {self.method} is NOT supported!')
+
+    def calculate_band_powers(self, sliding_windows: np.ndarray, used_ch_names, sample_rate,
+                              bands: tuple = None) -> np.ndarray:
+        """
+        Steps (0) - (3) of the algorithm for independent windows: standardization, spatial filtering,
+        spectral analysis and band power calculation
+        :param sliding_windows: one sliding window with the shape (channels, samples) or several windows with the
+               shape (..., channels, samples)
+        :param used_ch_names: name of the used channel from the samples
+        :param sample_rate: sample rate of the samples
+        :param bands: tuple of (f_min, f_max) to integrate several bands of one spectrum
+        :return: band powers of C3a and C4a with the shape (..., 2), or (..., 2, n_bands) if bands are given
+        """
+        band_powers = self.hcon_band_powers(self.calculate_features(sliding_windows, used_ch_names, sample_rate,
+                                                                    bands))
+        return band_powers if bands else band_powers[..., 0]
+
+    def calculate_features(self, sliding_windows: np.ndarray, used_ch_names, sample_rate, bands: tuple = None,
+                           channels: tuple = None) -> np.ndarray:
+        """
+        Band powers of several bands on several spatially filtered channels, all of them are integrated from one
+        spectrum per window. The band limited methods (multitaper, burg) calculate the spectrum from the lowest to
+        the highest frequency of the bands.
+        :param sliding_windows: one sliding window with the shape (channels, samples) or several windows with the
+               shape (..., channels, samples)
+        :param used_ch_names: name of the used channel from the samples
+        :param sample_rate: sample rate of the samples
+        :param bands: tuple of (f_min, f_max), default is the band of the pipeline
+        :param channels: tuple of the names of the spatially filtered channels, default is the spatial filter of
+               hcon (C3a and C4a, or the CSP components, see spatial_filter)
+        :return: feature matrix with the shape (..., n_channels, n_bands)
+        """
+        # 0. mute outliers and 1. spatial filtering in one step: the standardization of each channel is folded into
+        # the spatial filter matrix, M @ ((x - mean) / std) = (M / std) @ x - (M / std) @ mean, so the standardized
+        # windows are never created (the sliding windows may also be read-only views)
+        profiler = self.profiler
+        sliding_windows = np.asarray(sliding_windows, dtype=self.dtype)
+        mean = np.mean(sliding_windows, axis=-1, keepdims=True)
+        std = np.std(sliding_windows, axis=-1, keepdims=True)
+        if channels:
+            matrix = channel_filter_matrix(tuple(used_ch_names), tuple(channels), self.montage)
+        else:
+            matrix = self.spatial_filter(used_ch_names)
+        matrix = matrix.astype(self.dtype, copy=False) / np.swapaxes(std, -1, -2)
+        samples = matrix @ sliding_windows - matrix @ mean
+        if profiler is not None:
+            profiler.lap('spatial_filter')
+
+        # 2. Spectral analysis, one spectrum covers all bands
+        bands = bands if bands else ((self.f_min, self.f_max),)
+        psds, freqs = self.spectral_analysis(samples, sample_rate, min(band[0] for band in bands),
+                                             max(band[1] for band in bands))
+        if profiler is not None:
+            profiler.lap('psd')
+
+        # 3. Band Power calculation of all channels and bands in one step
+        band_powers = self.band_powers(psds, freqs, bands).astype(np.float64, copy=False)
+        if profiler is not None:
+            profiler.lap('integration')
+        return band_powers
+
+    def classifier_features(self, sliding_windows: np.ndarray, used_ch_names, sample_rate):
+        """
+        Calculates the band powers of hcon and the features of the classifier stage. If the classifier uses the
+        spatial filter of hcon, both come from one spectral computation.
+        :param sliding_windows: one sliding window with the shape (channels, samples) or several windows with the
+               shape (..., channels, samples)
+        :param used_ch_names: name of the used channel from the samples
+        :param sample_rate: sample rate of the samples
+        :return: band powers of C3a and C4a with the shape (..., 2), features with the shape (..., n_features)
+        """
+        if self.classifier.channels:
+            areas = self.calculate_band_powers(sliding_windows, used_ch_names, sample_rate)
+            features = self.calculate_features(sliding_windows, used_ch_names, sample_rate, self.classifier.bands,
+                                               self.classifier.channels)
+        else:
+            bands = ((self.f_min, self.f_max),) + self.classifier.bands
+            band_powers = self.calculate_features(sliding_windows, used_ch_names, sample_rate, bands)
+            areas = self.hcon_band_powers(band_powers[..., :1])[..., 0]
+            features = band_powers[..., 1:]
+        return areas, features.reshape(features.shape[:-2] + (-1,))
+
+    def band_powers(self, psds: np.ndarray, freqs: np.ndarray, bands: tuple = None) -> np.ndarray:
+        """
+        Integrates the spectra over one or several bands with the cached integration weights
+        :param psds: spectra with the shape (channels, n_freqs)
+        :param freqs: the corresponding frequencies
+        :param bands: tuple of (f_min, f_max), default is the band of the pipeline
+        :return: band powers with the shape (channels, n_bands)
+        """
+        bands = bands if bands else ((self.f_min, self.f_max),)
+        return self.band_integrator.integrate(psds, freqs, bands)
+
+    def process(self, sliding_window, used_ch_names, sample_rate, offset_in_percentage=0.2) -> CursorControlResult:
+        """
+        Converts a sliding window into the corresponding horizontal movement
+        Contains following steps:
+            (1) Spatial filtering
+            (2) Spectral analysis
+            (3) Band Power calculation
+            (4) Derive normalized cursor control samples
+        :param sliding_window: A sliding window (SW) with n channels, n must contain C3 and C4
+               (SW(t) should be overlapping with SW(t+1))
+        :param used_ch_names: name of the used channel from the samples
+        :param sample_rate: sample rate of the samples
+        :param offset_in_percentage: offset between start of new window in percentage
+        :return: CursorControlResult with the label and the intermediate values
+        """
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.start()
+        features = None
+        if self.classifier is not None:
+            # (0.-3.) the features of the classifier are integrated from the same spectrum
+            (area_c3, area_c4), features = self.classifier_features(sliding_window, used_ch_names, sample_rate)
+        elif self.method == PSD_METHOD.sliding_dft:
+            # (0.-2.) the band bins are updated from the raw samples, standardization and spatial filtering are
+            # applied in the frequency domain
+            hop = int(round(offset_in_percentage * len(sliding_window[0])))
+            psds, freqs = self.sliding_band_power.update(np.asarray(sliding_window, dtype=float), hop, sample_rate,
+                                                         self.f_min, self.f_max, self.spatial_filter(used_ch_names))
+            if profiler is not None:
+                profiler.lap('psd')
+            # 3. Band Power calculation
+            area_c3, area_c4 = self.hcon_band_powers(self.band_powers(psds, freqs))[:, 0]
+            if profiler is not None:
+                profiler.lap('integration')
+        else:
+            # (0.-3.)
+            area_c3, area_c4 = self.calculate_band_powers(sliding_window, used_ch_names, sample_rate)
+
+        # 4. derivation of the control signal hcon from integrated PSD values of c3 and c4
+        hcon = (area_c4 * self.weight) - area_c3
+
+        # The current hcon is standardized with the mean and standard deviation of the previous hcon values.
+        # By default these are the values of the first 30 seconds, the statistics are updated in O(1) per window.
+        statistics = self.manage_hcon_statistics((len(sliding_window[0]) + 1) / sample_rate, offset_in_percentage)
+        statistics.update(hcon)
+        standardized_hcon = statistics.standardize(hcon)
+
+        if features is not None:
+            if profiler is not None:
+                profiler.lap('normalization')
+            # 5. the classifier decides with one dot product of the features
+            decision = self.classifier.decision_function(features)
+            result = CursorControlResult(self.classifier.decide(decision), hcon, standardized_hcon, area_c3,
+                                         area_c4, decision)
+            if profiler is not None:
+                profiler.lap('classification')
+        else:
+            result = CursorControlResult(hcon_to_label(standardized_hcon, self.threshold), hcon, standardized_hcon,
+                                         area_c3, area_c4)
+            if profiler is not None:
+                profiler.lap('normalization')
+        if profiler is not None:
+            profiler.stop()
+            profiler.count('windows')
+        return result
+
+    def process_windows(self, sliding_windows: np.ndarray, used_ch_names, sample_rate,
+                        offset_in_percentage=0.2) -> CursorControlResult:
+        """
+        Processes consecutive sliding windows at once, e.g. all windows of a recording for an offline evaluation
+        Steps (0) - (3) are calculated batched for all windows, the normalization (4) continues the running
+        statistics of the pipeline window by window. The result equals calling process for every window.
+        :param sliding_windows: consecutive sliding windows with the shape (windows, channels, samples),
+               e.g. a strided view of a recording
+        :param used_ch_names: name of the used channel from the samples
+        :param sample_rate: sample rate of the samples
+        :param offset_in_percentage: offset between start of new window in percentage
+        :return: CursorControlResult with arrays of the labels and the intermediate values of all windows
+        """
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.start()
+        features = None
+        if self.classifier is not None:
+            areas, features = self.classifier_features(sliding_windows, used_ch_names, sample_rate)
+        else:
+            areas = self.calculate_band_powers(sliding_windows, used_ch_names, sample_rate)
+        area_c3, area_c4 = areas[:, 0], areas[:, 1]
+        hcon = (area_c4 * self.weight) - area_c3
+
+        statistics = self.manage_hcon_statistics((sliding_windows.shape[-1] + 1) / sample_rate, offset_in_percentage)
+        standardized_hcon = statistics.update_and_standardize(hcon)
+
+        if features is not None:
+            if profiler is not None:
+                profiler.lap('normalization')
+            decision = self.classifier.decision_function(features)
+            result = CursorControlResult(self.classifier.decide(decision), hcon, standardized_hcon, area_c3,
+                                         area_c4, decision)
+            if profiler is not None:
+                profiler.lap('classification')
+        else:
+            result = CursorControlResult(hcon_to_labels(standardized_hcon, self.threshold), hcon, standardized_hcon,
+                                         area_c3, area_c4)
+            if profiler is not None:
+                profiler.lap('normalization')
+        if profiler is not None:
+            profiler.stop()
+            profiler.count('windows', len(hcon))
+        return result
+
+
+def get_default_pipeline():
+    """
+    Returns the pipeline of perform_algorithm, it is created with USED_METHOD, USED_MONTAGE and USED_NORMALIZATION
+    :return: CursorControlPipeline instance
     """
-    Converts a sliding window into the corresponding horizontal movement
-    Contains following steps:
-        (1) Spatial filtering
-        (2) Spectral analysis
-        (3) Band Power calculation
-        (4) Derive normalized cursor control samples
+    global default_pipeline
+    if default_pipeline is None:
+        default_pipeline = CursorControlPipeline(USED_METHOD, USED_MONTAGE, USED_NORMALIZATION,
+                                                 spatial_patterns=used_spatial_patterns,
+                                                 classifier=used_classifier, dtype=config.SIGNAL_DTYPE,
+                                                 profiler=used_profiler)
+    elif default_pipeline.spatial_patterns is not used_spatial_patterns:
+        # new filters of set_spatial_patterns, hcon changes its scale with the spatial filter
+        default_pipeline.spatial_patterns = used_spatial_patterns
+        default_pipeline.reset()
+    return default_pipeline
+
+
+def perform_algorithm(sliding_window, used_ch_names, sample_rate, data_mdl, queue_manager: 'QueueManager' = None, offset_in_percentage=0.2,
+                      trace: WindowTrace = None):
+    """
+    Converts a sliding window into the corresponding horizontal movement with the default pipeline
+    (see CursorControlPipeline.process) and passes the result to the game and the live plot
     :param data_mdl: reference of datamodel, where constants of cc_algorithm are stored
     :param queue_manager: reference of queue manager to pass data to liveplot in another thread
     :param sample_rate: sample rate of the samples
@@ -236,80 +752,61 @@ def perform_algorithm(sliding_window, used_ch_names, sample_rate, data_mdl, queu
     :param sliding_window: A sliding window (SW) with n channels, n must contain C3 and C4
            (SW(t) should be overlapping with SW(t+1))
     :param offset_in_percentage: offset between start of new window in percentage
+    :param WindowTrace trace: latency trace of the window, see latency_tracing
     :return: the normalized value representing horizontal movement
     """
+    pipeline = get_default_pipeline()
+    # the band and the threshold can be changed in the ui during a session
+    pipeline.f_min = data_mdl.f_min
+    pipeline.f_max = data_mdl.f_max
+    pipeline.threshold = data_mdl.threshold
 
-    # 0. mute outliers
-    for i in range(len(sliding_window)):
-        sliding_window[i] = standardize_data(sliding_window[i])
-
-    global SAMPLING_FREQ, F_MIN, F_MAX
-    SAMPLING_FREQ = sample_rate
-    F_MIN = data_mdl.f_min
-    F_MAX = data_mdl.f_max
-
-    # 1. Spatial filtering
-    samples_c3a, samples_c4a = calculate_spatial_filtering(sliding_window, used_ch_names)
-
-    # 2. Spectral analysis
-    if USED_METHOD == PSD_METHOD.fft:
-        psd_c3a, f_c3a = perform_rfft(samples_c3a)
-        psd_c4a, f_c4a = perform_rfft(samples_c4a)
-    elif USED_METHOD == PSD_METHOD.periodogram:
-        f_c3a, psd_c3a = perform_periodogram(samples_c3a)
-        f_c4a, psd_c4a = perform_periodogram(samples_c4a)
-    elif USED_METHOD == PSD_METHOD.burg:
-        f_c3a, psd_c3a = perform_burg(samples_c3a)
-        f_c4a, psd_c4a = perform_burg(samples_c4a)
-    elif USED_METHOD == PSD_METHOD.multitaper:
-        psd_c3a, f_c3a = perform_multitaper(samples_c3a)
-        psd_c4a, f_c4a = perform_multitaper(samples_c4a)
-    else:
-        raise NotImplementedError(f'The specified method {USED_METHOD} is NOT supported!')
-
-    # 3. Band Power calculation
-    area_c3 = integrate_psd_values(psd_c3a, f_c3a, USED_METHOD)
-    area_c4 = integrate_psd_values(psd_c4a, f_c4a, USED_METHOD)
-
-    # 4. derivation of the control signal hcon from integrated PSD values of c3 and c4
-    hcon = (area_c4 * config.WEIGHT) - area_c3
-
-    ringbuffer = manage_ringbuffer((len(sliding_window[0]) + 1) / sample_rate, offset_in_percentage)
-    # Conditional instruction is responsible for writing to the ring buffer only in the first 30 seconds.
-    if not ringbuffer.is_full:
-        ringbuffer.append(hcon)
-
-    # From the collected previous calculated hcon values from (the last) 30 seconds,
-    # a standard deviation and a mean value are determined.
-    # The current hcon is standardized with these values
-    values = np.array(ringbuffer)
-    mean = np.mean(values)
-    standard_deviation = np.std(values)
-    standardized_hcon = (hcon - mean) / standard_deviation if standard_deviation else 0
-
-    # converts the returned hcon to the corresponding label
-    if standardized_hcon > data_mdl.threshold - 0.2:
-        # left signal
-        calculated_label = 0
+    result = pipeline.process(sliding_window, used_ch_names, sample_rate, offset_in_percentage)
+    if trace is not None:
+        trace.stamp('processed')
+    return publish_result(result, data_mdl, queue_manager, trace)
+
+
+def publish_result(result: CursorControlResult, data_mdl, queue_manager: 'QueueManager' = None,
+                   trace: WindowTrace = None):
+    """
+    Passes the result of a sliding window to the game (move events) and the live plot
+    :param CursorControlResult result: result of the sliding window
+    :param data_mdl: reference of datamodel, says if the plot gets drawn
+    :param queue_manager: reference of queue manager to pass data to liveplot in another thread
+    :param WindowTrace trace: latency trace of the window, see latency_tracing
+    :return: the label of the window
+    """
+    calculated_label = result.label
+    profiler = used_profiler
+    if profiler is not None:
+        profiler.start()
+
+    if calculated_label == 0:
         # call move_left_direction event for the game to move left
         post_event("move_left_direction")
-    elif standardized_hcon < -data_mdl.threshold:
-        # right signal
-        calculated_label = 1
+    elif calculated_label == 1:
         # call move_right_direction event for the game to move right
         post_event("move_right_direction")
-    else:
-        calculated_label = -1
+    if profiler is not None:
+        profiler.lap('event_posting')
+    if trace is not None:
+        # the player has changed its direction, the movement is visible with the next frame of the game
+        trace.stamp('published')
+        tracer.finish(trace, calculated_label in (0, 1))
 
     # only fill queues if the plot gets drawn and queues are not full
     if data_mdl.draw_plot and queue_manager:
         if not queue_manager.queue_hcon.full():
-            queue_manager.queue_hcon_stand.put(standardized_hcon)
-            queue_manager.queue_hcon.put(hcon)
+            queue_manager.queue_hcon_stand.put(result.standardized_hcon)
+            queue_manager.queue_hcon.put(result.hcon)
         if not queue_manager.queue_c3_pow.full() and not queue_manager.queue_c4_pow.full():
-            queue_manager.queue_c3_pow.put(area_c3)
-            queue_manager.queue_c4_pow.put(area_c4)
+            queue_manager.queue_c3_pow.put(result.area_c3)
+            queue_manager.queue_c4_pow.put(result.area_c4)
         if not queue_manager.queue_clabel.full():
             queue_manager.queue_clabel.put(calculated_label, True)
+    if profiler is not None:
+        profiler.lap('queue_feeding')
+        profiler.stop()
 
     return calculated_label
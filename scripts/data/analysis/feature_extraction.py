@@ -0,0 +1,74 @@
+from typing import List
+
+import numpy as np
+
+from scripts.data.analysis.cursor_control_algorithm import CursorControlPipeline
+
+""" Feature stage of the cursor control algorithm: band powers of several bands on several spatially filtered channels """
+
+MU_BAND = (8, 12)
+BETA_BAND = (13, 30)
+
+
+class BandPowerFeatures:
+    """
+    Extracts a feature matrix of band powers from sliding windows.
+    All bands of all channels are integrated from one spectral computation per window, so additional bands or
+    channels only cost an additional row of the integration weights and of the spatial filter matrix.
+
+    Attribute:
+    ----------
+    bands: tuple
+        tuple of (f_min, f_max) of the integrated bands
+    channels: tuple
+        names of the channels which are spatially filtered, e.g. ('C3', 'C4') for C3a and C4a
+    pipeline: CursorControlPipeline
+        pipeline whose method, montage and spectral caches are used
+    """
+
+    def __init__(self, bands: tuple = (MU_BAND, BETA_BAND), channels: tuple = ('C3', 'C4'),
+                 pipeline: CursorControlPipeline = None):
+        """
+        Constructor method
+        :param tuple bands: tuple of (f_min, f_max) of the integrated bands
+        :param tuple channels: names of the spatially filtered channels
+        :param CursorControlPipeline pipeline: pipeline whose method, montage and spectral caches are used,
+                                               a new one is used by default
+        """
+        self.bands = tuple(tuple(band) for band in bands)
+        self.channels = tuple(channels)
+        self.pipeline = pipeline if pipeline else CursorControlPipeline()
+
+    @property
+    def feature_names(self) -> List[str]:
+        """
+        :return: names of the features in the order of transform, e.g. 'C3a 8-12 Hz'
+        """
+        return [f'{channel}a {f_min:g}-{f_max:g} Hz' for channel in self.channels for f_min, f_max in self.bands]
+
+    @property
+    def n_features(self) -> int:
+        """
+        :return: number of features of a window
+        """
+        return len(self.channels) * len(self.bands)
+
+    def band_powers(self, sliding_windows: np.ndarray, used_ch_names: List[str], sample_rate: float) -> np.ndarray:
+        """
+        Calculates the band powers of all channels and bands
+        :param sliding_windows: one sliding window with the shape (channels, samples) or several windows with the
+               shape (..., channels, samples)
+        :param used_ch_names: names of the channels of the windows
+        :param sample_rate: sample rate of the samples
+        :return: np.ndarray: band powers with the shape (..., n_channels, n_bands)
+        """
+        return self.pipeline.calculate_features(sliding_windows, used_ch_names, sample_rate, self.bands,
+                                                self.channels)
+
+    def transform(self, sliding_windows: np.ndarray, used_ch_names: List[str], sample_rate: float) -> np.ndarray:
+        """
+        Calculates the feature matrix of the windows, see band_powers
+        :return: np.ndarray: features with the shape (..., n_features) in the order of feature_names
+        """
+        band_powers = self.band_powers(sliding_windows, used_ch_names, sample_rate)
+        return band_powers.reshape(band_powers.shape[:-2] + (self.n_features,))
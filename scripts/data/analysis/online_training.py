@@ -0,0 +1,296 @@
+import queue
+import threading
+import time
+from typing import List
+
+import numpy as np
+
+from scripts.data.acquisition.channels import sort_channels
+from scripts.data.analysis import cursor_control_algorithm
+from scripts.data.analysis.batch_evaluation import recording_windows
+from scripts.data.analysis.classifiers import ClassifierStage, LinearDiscriminant, classifier_path, \
+    load_configured_classifier
+from scripts.data.analysis.cursor_control_algorithm import CursorControlPipeline
+from scripts.data.analysis.spatial_patterns import CommonSpatialPatterns
+from scripts.data.extraction import trial_handler
+from scripts.data.extraction.trial_handler import Labels
+from scripts.utils.event_listener import subscribe, unsubscribe
+
+"""
+Online training of the classifier stage during a game.
+Every trial which is marked by the trial_handler is handed over to a background thread, which extracts the windows
+of the trial, updates the classifier incrementally and swaps a copy of it into the live pipeline.
+The training continues the classifier of config.CLASSIFIER_FILE, the result is saved next to the session.
+"""
+
+# trainer of the running session, None if the online training is off
+online_trainer = None
+# trainer of the last session, its classifier is saved with the session (see save_trained_classifier)
+stopped_trainer = None
+
+
+class TrainingStatistics:
+    """
+    Instrumentation of the online training
+
+    Attribute:
+    ----------
+    retrain_times: list
+        time in s to extract the windows of a trial, calculate their features and update the classifier
+    swap_latencies: list
+        time in s from marking a trial until the updated classifier is used by the pipeline
+    skipped_trials: int
+        number of trials which did not lead to a new classifier (no left/right trial, too short or only one class)
+    """
+
+    def __init__(self):
+        self.retrain_times = list()
+        self.swap_latencies = list()
+        self.skipped_trials = 0
+
+    def record(self, retrain_time: float, swap_latency: float):
+        """
+        Records the times of a swapped classifier
+        :param float retrain_time: time to update the classifier in s
+        :param float swap_latency: time from marking the trial until the swap in s
+        """
+        self.retrain_times.append(retrain_time)
+        self.swap_latencies.append(swap_latency)
+
+    def summary(self) -> dict:
+        """
+        :return: dict with the number of swaps and skipped trials, mean and maximum of the times in ms
+        """
+        summary = {'swaps': len(self.retrain_times), 'skipped_trials': self.skipped_trials}
+        for name, times in (('retrain_time', self.retrain_times), ('swap_latency', self.swap_latencies)):
+            summary[f'{name}_mean_ms'] = float(np.mean(times) * 1000) if times else 0.0
+            summary[f'{name}_max_ms'] = float(np.max(times) * 1000) if times else 0.0
+        return summary
+
+
+class OnlineTrainer:
+    """
+    Background thread which retrains the classifier from newly marked trials.
+    The thread of the trial marking (the Tk loop) only puts the trial into a queue. The feature extraction runs
+    on its own pipeline, the live pipeline is only touched by replacing the reference to its classifier, so the
+    acquisition thread never waits and always sees a complete classifier.
+
+    Attribute:
+    ----------
+    classifier: ClassifierStage
+        classifier which is trained, the live pipeline gets copies of it
+    statistics: TrainingStatistics
+        retrain times and swap latencies
+    """
+
+    def __init__(self, channel_names: List[str], sample_rate: float, window_size: float = 1.0,
+                 window_offset: float = 0.05, classifier: ClassifierStage = None,
+                 pipeline: CursorControlPipeline = None, feature_pipeline: CursorControlPipeline = None):
+        """
+        Constructor method
+        :param list[str] channel_names: names of the channels of the raw data of the trial_handler
+        :param float sample_rate: sample rate of the raw data
+        :param float window_size: length of the training windows in s, should be the window size of the game
+        :param float window_offset: time between the starts of two training windows in s
+        :param ClassifierStage classifier: classifier which supports partial_fit, a LinearDiscriminant by default
+        :param CursorControlPipeline pipeline: live pipeline which gets the classifier, None for the default
+                                               pipeline of perform_algorithm (see set_classifier)
+        :param CursorControlPipeline feature_pipeline: pipeline which calculates the features in the background,
+                                                       it needs the method and spatial filter of the live pipeline
+        """
+        self.channel_order, self.used_ch_names = sort_channels(channel_names)
+        self.sample_rate = sample_rate
+        self.window_size = window_size
+        self.window_offset = window_offset
+        self.classifier = classifier if classifier else LinearDiscriminant()
+        self.pipeline = pipeline
+        if feature_pipeline is None and pipeline is not None:
+            feature_pipeline = CursorControlPipeline(pipeline.method, pipeline.montage, f_min=pipeline.f_min,
+                                                     f_max=pipeline.f_max, spatial_patterns=pipeline.spatial_patterns)
+        elif feature_pipeline is None:
+            feature_pipeline = CursorControlPipeline(cursor_control_algorithm.USED_METHOD,
+                                                     cursor_control_algorithm.USED_MONTAGE,
+                                                     spatial_patterns=cursor_control_algorithm.used_spatial_patterns)
+        self.feature_pipeline = feature_pipeline
+        self.statistics = TrainingStatistics()
+        self.__trials = queue.Queue()
+        self.__thread = None
+
+    def start(self):
+        """Starts the background thread and subscribes to the marked trials"""
+        if self.__thread is None:
+            self.__thread = threading.Thread(target=self.__run, name='OnlineTrainer', daemon=True)
+            self.__thread.start()
+            subscribe("trial_marked", self.on_trial_marked)
+
+    def stop(self, wait: bool = False):
+        """
+        Stops the background thread after the queued trials
+        :param bool wait: wait until the thread has finished, otherwise the caller is never blocked
+        """
+        unsubscribe("trial_marked", self.on_trial_marked)
+        if self.__thread is not None:
+            self.__trials.put(None)
+            if wait:
+                self.__thread.join()
+            self.__thread = None
+
+    def on_trial_marked(self, pos: int, duration: int, label: Labels):
+        """
+        Hands a marked trial over to the background thread, returns immediately
+        :param int pos: position of the trial in the raw data of the trial_handler
+        :param int duration: duration of the trial in samples
+        :param Labels label: label of the trial
+        """
+        self.__trials.put_nowait((time.perf_counter(), pos, duration, label))
+
+    def set_spatial_patterns(self, spatial_patterns: CommonSpatialPatterns):
+        """
+        Hands new CSP filters over to the background thread, returns immediately.
+        The features change with the spatial filter, so the classifier is trained again from the following trials.
+        Until then the live pipeline decides with the threshold.
+        :param CommonSpatialPatterns spatial_patterns: trained filters, None for the montage
+        """
+        self.__trials.put_nowait(('spatial_patterns', spatial_patterns))
+
+    def wait(self):
+        """Blocks until all queued trials are processed"""
+        self.__trials.join()
+
+    def __run(self):
+        """Loop of the background thread"""
+        while True:
+            trial = self.__trials.get()
+            try:
+                if trial is None:
+                    break
+                if trial[0] == 'spatial_patterns':
+                    self.change_spatial_patterns(trial[1])
+                else:
+                    self.train_trial(*trial)
+            except Exception as exception:
+                # a failed update must not end the training of the session
+                self.statistics.skipped_trials += 1
+                print("Online training failed: ", exception)
+            finally:
+                self.__trials.task_done()
+
+    def change_spatial_patterns(self, spatial_patterns: CommonSpatialPatterns):
+        """
+        Calculates the following features with new CSP filters and discards the training of the old features
+        :param CommonSpatialPatterns spatial_patterns: trained filters, None for the montage
+        """
+        self.feature_pipeline.spatial_patterns = spatial_patterns
+        self.classifier.reset()
+        if self.pipeline is not None:
+            self.pipeline.classifier = None
+        else:
+            cursor_control_algorithm.set_classifier(None)
+
+    def trial_samples(self, pos: int, duration: int) -> np.ndarray:
+        """
+        Copies the samples of a trial from the raw data of the trial_handler
+        :return: np.ndarray: samples of the channels of the algorithm with the shape (channels, samples)
+        """
+        raw_data = trial_handler.raw_data
+        start, end = max(pos, 0), max(pos + duration, 0)
+        channels = [raw_data[index][start:end] for index in self.channel_order]
+        # the acquisition thread may have extended only a part of the channels so far
+        n_samples = min(len(channel) for channel in channels) if channels else 0
+        return np.array([channel[:n_samples] for channel in channels], dtype=float)
+
+    def train_trial(self, marked_time: float, pos: int, duration: int, label: Labels) -> bool:
+        """
+        Updates the classifier with the windows of a trial and swaps a copy into the live pipeline
+        :param float marked_time: time.perf_counter() when the trial was marked
+        :param int pos: position of the trial in the raw data of the trial_handler
+        :param int duration: duration of the trial in samples
+        :param Labels label: label of the trial
+        :return: True if a new classifier was swapped in
+        """
+        start = time.perf_counter()
+        if label not in (Labels.LEFT, Labels.RIGHT):
+            self.statistics.skipped_trials += 1
+            return False
+        windows, _ = recording_windows(self.trial_samples(pos, duration), self.sample_rate, self.window_size,
+                                       self.window_offset)
+        if len(windows) == 0:
+            self.statistics.skipped_trials += 1
+            return False
+
+        features = self.feature_pipeline.calculate_features(windows, self.used_ch_names, self.sample_rate,
+                                                            self.classifier.bands, self.classifier.channels)
+        try:
+            self.classifier.partial_fit(features.reshape(len(windows), -1), np.full(len(windows), label.value))
+        except ValueError:
+            # the classifier needs trials of both classes
+            self.statistics.skipped_trials += 1
+            return False
+        model = self.classifier.snapshot()
+        retrain_time = time.perf_counter() - start
+
+        # atomic swap: the pipeline gets a reference to the complete new classifier
+        if self.pipeline is not None:
+            self.pipeline.classifier = model
+        else:
+            cursor_control_algorithm.set_classifier(model)
+        self.statistics.record(retrain_time, time.perf_counter() - marked_time)
+        return True
+
+
+def start_online_training(channel_names: List[str], sample_rate: float, window_size: float = 1.0,
+                          window_offset: float = 0.05, f_min: float = 8, f_max: float = 12):
+    """
+    Starts the online training of the classifier of perform_algorithm for a new session, it continues the classifier
+    of config.CLASSIFIER_FILE if the file has the sums of its windows (see ClassifierStage.can_update)
+    :param list[str] channel_names: names of the channels of the raw data of the trial_handler
+    :param float sample_rate: sample rate of the raw data
+    :param float window_size: window size of the game in s
+    :param float window_offset: window offset of the game in s
+    :param float f_min: lowest frequency of the band of hcon
+    :param float f_max: highest frequency of the band of hcon
+    :return: OnlineTrainer: the started trainer
+    """
+    global online_trainer, stopped_trainer
+    stop_online_training()
+    stopped_trainer = None
+    classifier = load_configured_classifier()
+    if classifier is not None and not classifier.can_update:
+        print("The classifier of config.CLASSIFIER_FILE can not be updated, the online training starts a new one")
+        classifier = None
+    feature_pipeline = CursorControlPipeline(cursor_control_algorithm.USED_METHOD,
+                                             cursor_control_algorithm.USED_MONTAGE, f_min=f_min, f_max=f_max,
+                                             spatial_patterns=cursor_control_algorithm.used_spatial_patterns)
+    online_trainer = OnlineTrainer(channel_names, sample_rate, window_size, window_offset, classifier,
+                                   feature_pipeline=feature_pipeline)
+    online_trainer.start()
+    return online_trainer
+
+
+def stop_online_training():
+    """Stops the online training of the running session and prints its instrumentation"""
+    global online_trainer, stopped_trainer
+    if online_trainer is not None:
+        online_trainer.stop()
+        print("Online training: ", online_trainer.statistics.summary())
+        stopped_trainer, online_trainer = online_trainer, None
+
+
+def save_trained_classifier(session_path: str):
+    """
+    Saves the classifier of the last online training next to a session, config.CLASSIFIER_FILE can continue it in
+    the next session
+    :param str session_path: path of the npz file of the session
+    :return: str: path of the saved classifier, None if no classifier was trained
+    """
+    global stopped_trainer
+    if stopped_trainer is None:
+        return None
+    # the background thread finishes the trials which were queued before the stop
+    stopped_trainer.wait()
+    classifier, stopped_trainer = stopped_trainer.classifier, None
+    if not classifier.is_fitted:
+        return None
+    path = classifier_path(session_path)
+    classifier.save(path)
+    return path
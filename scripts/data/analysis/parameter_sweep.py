@@ -0,0 +1,229 @@
+import argparse
+import csv
+import itertools
+from multiprocessing import Pool, shared_memory
+from typing import List
+
+import numpy as np
+
+from scripts.data.analysis.batch_evaluation import EvaluationResult, load_session, recording_band_powers, \
+    window_true_labels
+from scripts.data.analysis.cursor_control_algorithm import CursorControlPipeline, PSD_METHOD, hcon_to_labels
+
+"""
+Parameter sweep of the cursor control algorithm over recorded sessions.
+Every combination of f_min, f_max, window_size, window_offset and threshold is evaluated offline on every session,
+the results are ranked per session and written into a csv table.
+The sessions are loaded once into shared memory, the worker processes read them without copies.
+The band powers do not depend on the threshold, they are calculated once per setting and all thresholds are
+evaluated on them. For the fft based methods even all bands are integrated from one spectrum.
+Run with: python -m scripts.data.analysis.parameter_sweep session.npz [session.npz ...] --threshold 1 1.5 2
+"""
+
+RESULT_FIELDS = ['session', 'rank', 'method', 'f_min', 'f_max', 'window_size', 'window_offset', 'threshold',
+                 'trial_accuracy', 'window_accuracy', 'decided_accuracy', 'decided_share']
+# methods whose spectrum does not depend on the band, all bands are integrated from one spectrum
+BAND_INDEPENDENT_METHODS = (PSD_METHOD.fft, PSD_METHOD.periodogram, PSD_METHOD.sliding_dft)
+
+# recordings of the worker process: session index -> (chan_data, label_data, channel names, sample rate)
+_recordings = dict()
+# shared memory blocks of the worker process, they have to stay open as long as the recordings are used
+_shared_memory = list()
+
+
+def share_array(array: np.ndarray):
+    """
+    Copies an array into a new shared memory block
+    :return: shared memory block, descriptor (name, shape, dtype) to attach to the array in another process
+    """
+    memory = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=memory.buf)[...] = array
+    return memory, (memory.name, array.shape, array.dtype.str)
+
+
+def attach_array(descriptor):
+    """
+    Attaches to an array in shared memory
+    :param descriptor: (name, shape, dtype) of share_array
+    :return: shared memory block, read-only array
+    """
+    name, shape, dtype = descriptor
+    # the workers share the resource tracker of the creating process, which unlinks the block at the end
+    memory = shared_memory.SharedMemory(name=name)
+    array = np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+    array.flags.writeable = False
+    return memory, array
+
+
+def init_worker(session_descriptors: list):
+    """
+    Attaches a worker process to the shared sessions
+    :param list session_descriptors: per session (chan_data descriptor, label_data descriptor, names, sample rate)
+    """
+    for index, (data_descriptor, label_descriptor, used_ch_names, sample_rate) in enumerate(session_descriptors):
+        data_memory, chan_data = attach_array(data_descriptor)
+        label_memory, label_data = attach_array(label_descriptor)
+        _shared_memory.extend([data_memory, label_memory])
+        _recordings[index] = (chan_data, label_data, used_ch_names, sample_rate)
+
+
+def evaluate_setting(task):
+    """
+    Evaluates all bands and thresholds of a setting on one session
+    :param task: (session index, PSD_METHOD, window_size, window_offset, bands, thresholds)
+    :return: list of result rows (dicts with the RESULT_FIELDS without session and rank)
+    """
+    session, method, window_size, window_offset, bands, thresholds = task
+    chan_data, label_data, used_ch_names, sample_rate = _recordings[session]
+    pipeline = CursorControlPipeline(method)
+    if method in BAND_INDEPENDENT_METHODS:
+        band_powers, window_starts = recording_band_powers(chan_data, used_ch_names, sample_rate, window_size,
+                                                           window_offset, bands, pipeline=pipeline)
+    else:
+        # the spectrum of the band limited methods is calculated per band
+        band_powers = list()
+        for f_min, f_max in bands:
+            pipeline.f_min, pipeline.f_max = f_min, f_max
+            powers, window_starts = recording_band_powers(chan_data, used_ch_names, sample_rate, window_size,
+                                                          window_offset, pipeline=pipeline)
+            band_powers.append(powers)
+        band_powers = np.concatenate(band_powers, axis=-1)
+    true_labels = window_true_labels(label_data, window_starts, chan_data.shape[1])
+    in_trial = true_labels != -1
+
+    rows = list()
+    for band, (f_min, f_max) in enumerate(bands):
+        hcon = (band_powers[:, 1, band] * pipeline.weight) - band_powers[:, 0, band]
+        pipeline.reset()
+        statistics = pipeline.manage_hcon_statistics((int(window_size * sample_rate) + 1) / sample_rate,
+                                                     window_offset / window_size)
+        standardized_hcon = statistics.update_and_standardize(hcon)
+        for threshold in thresholds:
+            labels = hcon_to_labels(standardized_hcon, threshold)
+            result = EvaluationResult(window_starts / sample_rate, hcon, standardized_hcon, labels, true_labels)
+            rows.append({'method': method.name, 'f_min': f_min, 'f_max': f_max, 'window_size': window_size,
+                         'window_offset': window_offset, 'threshold': threshold,
+                         'trial_accuracy': result.trial_accuracy, 'window_accuracy': result.window_accuracy,
+                         'decided_accuracy': result.decided_accuracy,
+                         'decided_share': float(np.mean(labels[in_trial] != -1)) if in_trial.any() else 0.0})
+    return session, rows
+
+
+def create_tasks(n_sessions: int, methods: List[PSD_METHOD], f_mins: List[float], f_maxs: List[float],
+                 window_sizes: List[float], window_offsets: List[float], thresholds: List[float]):
+    """
+    Splits the parameter grid into tasks, a task contains everything which can share the band powers
+    :return: list of tasks for evaluate_setting
+    """
+    bands = tuple((f_min, f_max) for f_min, f_max in itertools.product(f_mins, f_maxs) if f_min < f_max)
+    tasks = list()
+    for session, method, window_size, window_offset in itertools.product(range(n_sessions), methods, window_sizes,
+                                                                         window_offsets):
+        if window_offset > window_size:
+            continue
+        task_bands = [bands] if method in BAND_INDEPENDENT_METHODS else [(band,) for band in bands]
+        for band_group in task_bands:
+            tasks.append((session, method, window_size, window_offset, band_group, tuple(thresholds)))
+    return tasks
+
+
+def rank_results(rows: list, metric: str = 'trial_accuracy'):
+    """
+    Sorts the results of every session by the metric and numbers them. Ties are broken by the decided accuracy and
+    then by the setting, so the ranking does not depend on the order in which the results arrive.
+    :return: list of the ranked rows
+    """
+    ranked = list()
+    for session in dict.fromkeys(row['session'] for row in rows):
+        session_rows = sorted((row for row in rows if row['session'] == session),
+                              key=lambda row: (-row[metric], -row['decided_accuracy'], row['method'], row['f_min'],
+                                               row['f_max'], row['window_size'], row['window_offset'],
+                                               row['threshold']))
+        for rank, row in enumerate(session_rows, start=1):
+            row['rank'] = rank
+            ranked.append(row)
+    return ranked
+
+
+def run_sweep(session_paths: List[str], f_mins: List[float] = (8,), f_maxs: List[float] = (12,),
+              window_sizes: List[float] = (1.0,), window_offsets: List[float] = (0.05,),
+              thresholds: List[float] = (1.5,), methods: List[PSD_METHOD] = (PSD_METHOD.multitaper,),
+              processes: int = None, metric: str = 'trial_accuracy', output_path: str = None):
+    """
+    Evaluates every combination of the parameters on every session
+    :param list[str] session_paths: paths of the npz files of the sessions
+    :param list[float] f_mins: values of f_min
+    :param list[float] f_maxs: values of f_max
+    :param list[float] window_sizes: values of the window size in s
+    :param list[float] window_offsets: values of the window offset in s
+    :param list[float] thresholds: values of the threshold
+    :param list[PSD_METHOD] methods: spectral estimation methods
+    :param int processes: number of worker processes, None for one per cpu, 1 to run in this process
+    :param str metric: column which is used for the ranking
+    :param str output_path: path of the csv table, None if no table should be written
+    :return: list of the ranked result rows
+    """
+    sessions = [load_session(path) for path in session_paths]
+    tasks = create_tasks(len(sessions), list(methods), list(f_mins), list(f_maxs), list(window_sizes),
+                         list(window_offsets), list(thresholds))
+
+    rows = list()
+    if processes == 1:
+        _recordings.update(enumerate(sessions))
+        results = map(evaluate_setting, tasks)
+        for session, session_rows in results:
+            rows.extend(dict(row, session=session_paths[session]) for row in session_rows)
+        _recordings.clear()
+    else:
+        blocks = list()
+        try:
+            descriptors = list()
+            for chan_data, label_data, used_ch_names, sample_rate in sessions:
+                data_memory, data_descriptor = share_array(chan_data)
+                label_memory, label_descriptor = share_array(np.asarray(label_data))
+                blocks.extend([data_memory, label_memory])
+                descriptors.append((data_descriptor, label_descriptor, used_ch_names, sample_rate))
+            with Pool(processes, initializer=init_worker, initargs=(descriptors,)) as pool:
+                for session, session_rows in pool.imap(evaluate_setting, tasks):
+                    rows.extend(dict(row, session=session_paths[session]) for row in session_rows)
+        finally:
+            for memory in blocks:
+                memory.close()
+                memory.unlink()
+
+    ranked = rank_results(rows, metric)
+    if output_path:
+        write_results(ranked, output_path)
+    return ranked
+
+
+def write_results(rows: list, output_path: str):
+    """
+    Writes the ranked results into a csv table
+    """
+    with open(output_path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Parameter sweep of the cursor control algorithm')
+    parser.add_argument('sessions', nargs='+', help='npz files of the sessions')
+    parser.add_argument('--f-min', type=float, nargs='+', default=[8])
+    parser.add_argument('--f-max', type=float, nargs='+', default=[12])
+    parser.add_argument('--window-size', type=float, nargs='+', default=[1.0])
+    parser.add_argument('--window-offset', type=float, nargs='+', default=[0.05])
+    parser.add_argument('--threshold', type=float, nargs='+', default=[1.5])
+    parser.add_argument('--method', nargs='+', default=['multitaper'], choices=[m.name for m in PSD_METHOD])
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--metric', default='trial_accuracy',
+                        choices=['trial_accuracy', 'window_accuracy', 'decided_accuracy'])
+    parser.add_argument('--output', default='parameter_sweep.csv')
+    args = parser.parse_args()
+
+    results = run_sweep(args.sessions, args.f_min, args.f_max, args.window_size, args.window_offset, args.threshold,
+                        [PSD_METHOD[name] for name in args.method], args.processes, args.metric, args.output)
+    for result in results:
+        if result['rank'] <= 5:
+            print(', '.join(f'{field}={result[field]}' for field in RESULT_FIELDS))
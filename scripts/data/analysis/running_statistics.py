@@ -0,0 +1,133 @@
+import enum
+
+import numpy as np
+
+""" Running mean and standard deviation of a stream of values, e.g. of the control signal hcon """
+
+
+class StatisticsMode(enum.Enum):
+    """
+    How the statistics follow the stream after the calibration (the first capacity values)
+    """
+    frozen = 1  # the statistics of the calibration are kept for the rest of the session
+    sliding = 2  # the statistics of the last capacity values
+    exponential = 3  # exponentially weighted statistics, the weight of a value halves every capacity * ln(2) values
+
+
+class RunningStatistics:
+    """
+    Mean and standard deviation of a stream of values with O(1) costs per value.
+    During the calibration (the first capacity values) all modes calculate the statistics of all values so far
+    with the algorithm of Welford, afterwards they behave as selected by the mode.
+
+    Attribute:
+    ----------
+    count: int
+        number of values which have been added so far
+    mean: float
+        current mean
+    """
+
+    def __init__(self, capacity: int, mode: StatisticsMode = StatisticsMode.frozen):
+        """
+        Constructor method
+        :param int capacity: number of values of the calibration, size of the window of StatisticsMode.sliding
+                             and time constant of StatisticsMode.exponential
+        :param StatisticsMode mode: behaviour after the calibration
+        """
+        if capacity < 1:
+            raise ValueError(f'Invalid capacity: {capacity}')
+        self.capacity = capacity
+        self.mode = mode
+        self.count = 0
+        self.mean = 0.0
+        self.__variance = 0.0
+        # values of the window for StatisticsMode.sliding
+        self.__values = np.zeros(capacity) if mode == StatisticsMode.sliding else None
+
+    @property
+    def is_calibrated(self) -> bool:
+        return self.count >= self.capacity
+
+    @property
+    def variance(self) -> float:
+        return max(self.__variance, 0.0)
+
+    @property
+    def std(self) -> float:
+        return np.sqrt(self.variance)
+
+    def update(self, value: float):
+        """
+        Adds a value to the statistics
+        :param float value: new value
+        """
+        if not self.is_calibrated:
+            if self.__values is not None:
+                self.__values[self.count] = value
+            self.count += 1
+            # Welford: var_n = (n - 1) / n * var_n-1 + (n - 1) / n^2 * (x - mean_n-1)^2
+            alpha = 1 / self.count
+            self.__add(value, alpha)
+            return
+
+        if self.mode == StatisticsMode.frozen:
+            self.count += 1
+        elif self.mode == StatisticsMode.exponential:
+            self.count += 1
+            self.__add(value, 1 / self.capacity)
+        elif self.mode == StatisticsMode.sliding:
+            index = self.count % self.capacity
+            removed = self.__values[index]
+            self.__values[index] = value
+            self.count += 1
+            if index == self.capacity - 1:
+                # once per window the statistics are recalculated, so rounding errors do not accumulate
+                self.mean = float(np.mean(self.__values))
+                self.__variance = float(np.var(self.__values))
+            else:
+                old_mean = self.mean
+                self.mean += (value - removed) / self.capacity
+                self.__variance += (value - removed) * (value - self.mean + removed - old_mean) / self.capacity
+        else:
+            raise NotImplementedError(f'The specified mode {self.mode} is NOT supported!')
+
+    def standardize(self, value: float) -> float:
+        """
+        Standardizes a value with the current statistics
+        :param float value: value
+        :return: float: standardized value, 0 if the standard deviation is 0
+        """
+        std = self.std
+        return (value - self.mean) / std if std else 0
+
+    def update_and_standardize(self, values: np.ndarray) -> np.ndarray:
+        """
+        Adds consecutive values one after another and standardizes each of them with the statistics which include it,
+        like update and standardize per value do
+        :param np.ndarray values: new values
+        :return: np.ndarray: standardized values
+        """
+        standardized = np.empty(len(values))
+        for i, value in enumerate(values):
+            self.update(value)
+            standardized[i] = self.standardize(value)
+        return standardized
+
+    def reset(self):
+        """Removes all values"""
+        self.count = 0
+        self.mean = 0.0
+        self.__variance = 0.0
+
+    def __add(self, value: float, alpha: float):
+        """
+        Exponentially weighted update of mean and variance, with alpha = 1 / n it equals the update of Welford
+        :param float value: new value
+        :param float alpha: weight of the new value
+        """
+        diff = value - self.mean
+        increment = alpha * diff
+        self.mean += increment
+        self.__variance = (1 - alpha) * (self.__variance + diff * increment)
+
@@ -0,0 +1,326 @@
+import threading
+from typing import List
+
+import numpy as np
+import scipy.linalg
+
+import scripts.config as config
+from scripts.data.acquisition.channels import sort_channels
+from scripts.data.analysis import cursor_control_algorithm
+from scripts.data.analysis.batch_evaluation import recording_windows
+from scripts.data.analysis.spectral_estimation import trapezoid_weights
+from scripts.data.extraction import trial_handler
+from scripts.data.extraction.trial_handler import Labels
+from scripts.utils.event_listener import subscribe, unsubscribe
+
+"""
+Common Spatial Patterns (CSP) as optional spatial filter of the cursor control algorithm.
+The filters are trained offline from recorded trials or from the first trials of a session (config.CSP_TRAINING)
+and applied online as precomputed projection matrix, which replaces the laplacian/car matrix of C3a and C4a, so the
+spectral analysis only runs on a few components.
+"""
+
+# trainer of the running session, None if the CSP training is off
+spatial_patterns_trainer = None
+
+
+class CommonSpatialPatterns:
+    """
+    CSP filters which maximize the band power of one class (left or right trials) relative to the other class.
+    The covariance matrices are calculated in the band of the cursor control algorithm (from the cross spectra of
+    the windows), so the filters optimize exactly the band power which is integrated online. The windows are
+    standardized per channel like CursorControlPipeline.calculate_band_powers does.
+    The rows of the filters follow the convention of C3a and C4a: hcon = P(row 1) - P(row 0) is high for left trials.
+
+    Attribute:
+    ----------
+    n_pairs: int
+        number of components per class
+    f_min: float
+        lowest frequency of the band
+    f_max: float
+        highest frequency of the band
+    regularization: float
+        shrinkage of the class covariances towards a multiple of the identity (0..1)
+    channels: tuple
+        names of the channels the filters were trained on, None before the training
+    filters: np.ndarray
+        filters with the shape (2 * n_pairs, channels), first the components of right trials (strongest first),
+        then the components of left trials (strongest first)
+    eigenvalues: np.ndarray
+        share of the left trials in the band power of each component
+    """
+
+    def __init__(self, n_pairs: int = 1, f_min: float = 8, f_max: float = 12, regularization: float = 0.05):
+        """
+        Constructor method
+        :param int n_pairs: number of components per class
+        :param float f_min: lowest frequency of the band
+        :param float f_max: highest frequency of the band
+        :param float regularization: shrinkage of the class covariances (0..1)
+        """
+        self.n_pairs = n_pairs
+        self.f_min = f_min
+        self.f_max = f_max
+        self.regularization = regularization
+        self.channels = None
+        self.filters = None
+        self.eigenvalues = None
+        self.__projections = dict()
+
+    @property
+    def is_fitted(self) -> bool:
+        """
+        :return: True if the filters are trained
+        """
+        return self.filters is not None
+
+    def band_covariances(self, sliding_windows: np.ndarray, sample_rate: float) -> np.ndarray:
+        """
+        Calculates the covariance matrix of every window in the band, normalized by its trace
+        :param np.ndarray sliding_windows: windows with the shape (windows, channels, samples)
+        :param float sample_rate: sample rate of the samples
+        :return: np.ndarray: covariances with the shape (windows, channels, channels)
+        """
+        sliding_windows = np.asarray(sliding_windows, dtype=float)
+        std = np.std(sliding_windows, axis=-1, keepdims=True)
+        spectra = np.fft.rfft(sliding_windows / np.where(std == 0, 1, std))
+        freqs = np.fft.rfftfreq(sliding_windows.shape[-1], d=1 / sample_rate)
+        in_band = np.flatnonzero((freqs >= self.f_min) & (freqs <= self.f_max))
+        weights = trapezoid_weights(freqs[in_band])
+        if len(in_band) == 1:
+            weights[0] = 1
+        spectra = spectra[..., in_band]
+        covariances = np.einsum('wcf,wdf->wcd', spectra * weights, spectra.conj()).real
+        traces = np.trace(covariances, axis1=-2, axis2=-1)[:, np.newaxis, np.newaxis]
+        return covariances / np.where(traces == 0, 1, traces)
+
+    def fit(self, sliding_windows: np.ndarray, labels: np.ndarray, channels: List[str], sample_rate: float):
+        """
+        Trains the filters from labelled windows
+        :param np.ndarray sliding_windows: windows with the shape (windows, channels, samples)
+        :param np.ndarray labels: label of every window (0 = left, 1 = right, other windows are ignored)
+        :param list[str] channels: names of the channels of the windows
+        :param float sample_rate: sample rate of the samples
+        :return: CommonSpatialPatterns: self
+        """
+        labels = np.asarray(labels)
+        if not np.any(labels == Labels.LEFT.value) or not np.any(labels == Labels.RIGHT.value):
+            raise ValueError('CSP needs windows of left and right trials')
+        if 2 * self.n_pairs > len(channels):
+            raise ValueError(f'{2 * self.n_pairs} components need at least as many channels')
+
+        covariances = self.band_covariances(sliding_windows, sample_rate)
+        class_covariances = list()
+        for label in (Labels.LEFT, Labels.RIGHT):
+            covariance = np.mean(covariances[labels == label.value], axis=0)
+            identity = np.trace(covariance) / len(channels) * np.eye(len(channels))
+            class_covariances.append((1 - self.regularization) * covariance + self.regularization * identity)
+        covariance_left, covariance_right = class_covariances
+
+        # generalized eigenvalue problem: the eigenvalue is the share of the left trials in the band power
+        eigenvalues, eigenvectors = scipy.linalg.eigh(covariance_left, covariance_left + covariance_right)
+        order = np.concatenate([np.arange(self.n_pairs), np.arange(len(eigenvalues) - 1,
+                                                                   len(eigenvalues) - 1 - self.n_pairs, -1)])
+        self.filters = eigenvectors[:, order].T
+        self.eigenvalues = eigenvalues[order]
+        self.channels = tuple(channels)
+        self.__projections.clear()
+        return self
+
+    def projection_matrix(self, used_ch_names: tuple) -> np.ndarray:
+        """
+        Returns the filters for the channel order of the sliding windows, the matrix is cached per channel map
+        :param tuple used_ch_names: names of the channels of the sliding windows
+        :return: np.ndarray: read-only matrix with the shape (2 * n_pairs, len(used_ch_names))
+        """
+        matrix = self.__projections.get(used_ch_names)
+        if matrix is None:
+            missing = [name for name in self.channels if name not in used_ch_names]
+            if missing:
+                raise ValueError(f'The CSP filters need the channels {missing}')
+            matrix = np.zeros((len(self.filters), len(used_ch_names)))
+            matrix[:, [used_ch_names.index(name) for name in self.channels]] = self.filters
+            matrix.flags.writeable = False
+            self.__projections[used_ch_names] = matrix
+        return matrix
+
+    def class_band_powers(self, band_powers: np.ndarray) -> np.ndarray:
+        """
+        Sums the band powers of the components of each class, the result takes the place of C3a and C4a
+        :param np.ndarray band_powers: band powers of the components with the shape (..., 2 * n_pairs, n_bands)
+        :return: np.ndarray: band powers with the shape (..., 2, n_bands)
+        """
+        if self.n_pairs == 1:
+            return band_powers
+        shape = band_powers.shape
+        return band_powers.reshape(shape[:-2] + (2, self.n_pairs, shape[-1])).sum(axis=-2)
+
+
+def labelled_windows(chan_data: np.ndarray, label_data: np.ndarray, sample_rate: float, window_size: float = 1.0,
+                     window_offset: float = 0.05):
+    """
+    Creates the sliding windows which lie completely within a left or right trial
+    :param np.ndarray chan_data: recording with the shape (channels, samples)
+    :param np.ndarray label_data: label of every sample like get_channel_rawdata returns it
+    :param float sample_rate: sample rate of the recording
+    :param float window_size: length of a sliding window in s
+    :param float window_offset: time between the starts of two windows in s
+    :return: windows with the shape (windows, channels, samples), label of every window
+    """
+    windows, window_starts = recording_windows(chan_data, sample_rate, window_size, window_offset)
+    label_data = np.asarray(label_data)
+    start_labels = label_data[window_starts]
+    end_labels = label_data[window_starts + windows.shape[-1] - 1]
+    in_trial = (start_labels == end_labels) & np.isin(start_labels, (Labels.LEFT.value, Labels.RIGHT.value))
+    return windows[in_trial], start_labels[in_trial]
+
+
+def fit_recording(chan_data: np.ndarray, label_data: np.ndarray, channels: List[str], sample_rate: float,
+                  window_size: float = 1.0, window_offset: float = 0.05,
+                  spatial_patterns: CommonSpatialPatterns = None) -> CommonSpatialPatterns:
+    """
+    Trains CSP filters from the trials of a recording, e.g. of a stored MindPong session
+    :param np.ndarray chan_data: recording with the shape (channels, samples)
+    :param np.ndarray label_data: label of every sample like get_channel_rawdata returns it
+    :param list[str] channels: names of the channels of the recording
+    :param float sample_rate: sample rate of the recording
+    :param float window_size: length of the training windows in s, should be the window size of the game
+    :param float window_offset: time between the starts of two training windows in s
+    :param CommonSpatialPatterns spatial_patterns: configured instance, a new one with one pair by default
+    :return: CommonSpatialPatterns: trained filters
+    """
+    spatial_patterns = spatial_patterns if spatial_patterns else CommonSpatialPatterns()
+    windows, labels = labelled_windows(chan_data, label_data, sample_rate, window_size, window_offset)
+    return spatial_patterns.fit(windows, labels, channels, sample_rate)
+
+
+def fit_trial_handler(sample_rate: float, window_size: float = 1.0, window_offset: float = 0.05,
+                      spatial_patterns: CommonSpatialPatterns = None) -> CommonSpatialPatterns:
+    """
+    Trains CSP filters from the raw data and trials of the running session stored by the trial_handler.
+    Only the channels used by the algorithm (see sort_channels) are used.
+    :return: CommonSpatialPatterns: trained filters
+    """
+    indices, used_ch_names = sort_channels(config.BCI_CHANNELS)
+    raw_data = trial_handler.raw_data
+    # the acquisition thread may have extended only a part of the channels so far
+    n_samples = min(len(raw_data[index]) for index in indices)
+    chan_data = np.array([raw_data[index][:n_samples] for index in indices], dtype=float)
+    label_data = trial_handler.create_label_array(n_samples)
+    return fit_recording(chan_data, label_data, used_ch_names, sample_rate, window_size, window_offset,
+                         spatial_patterns)
+
+
+class SpatialPatternsTrainer:
+    """
+    Trains the CSP filters of the running session as soon as enough left and right trials are marked and replaces
+    the montage of perform_algorithm by them. The thread of the trial marking (the Tk loop) only counts the trials,
+    the filters are trained once in a background thread.
+
+    Attribute:
+    ----------
+    n_trials: int
+        number of left and of right trials which are needed for the training
+    spatial_patterns: CommonSpatialPatterns
+        filters which are trained
+    """
+
+    def __init__(self, sample_rate: float, window_size: float = 1.0, window_offset: float = 0.05,
+                 n_trials: int = None, spatial_patterns: CommonSpatialPatterns = None):
+        """
+        Constructor method
+        :param float sample_rate: sample rate of the raw data of the trial_handler
+        :param float window_size: length of the training windows in s, should be the window size of the game
+        :param float window_offset: time between the starts of two training windows in s
+        :param int n_trials: number of left and of right trials, config.CSP_TRAINING_TRIALS by default
+        :param CommonSpatialPatterns spatial_patterns: configured instance, a new one with one pair by default
+        """
+        self.sample_rate = sample_rate
+        self.window_size = window_size
+        self.window_offset = window_offset
+        self.n_trials = config.CSP_TRAINING_TRIALS if n_trials is None else n_trials
+        self.spatial_patterns = spatial_patterns if spatial_patterns else CommonSpatialPatterns()
+        self.__counts = {Labels.LEFT: 0, Labels.RIGHT: 0}
+        self.__thread = None
+
+    def start(self):
+        """Subscribes to the marked trials"""
+        subscribe("trial_marked", self.on_trial_marked)
+
+    def stop(self, wait: bool = False):
+        """
+        Stops counting the trials
+        :param bool wait: wait until a running training has finished, otherwise the caller is never blocked
+        """
+        unsubscribe("trial_marked", self.on_trial_marked)
+        if wait:
+            self.wait()
+
+    def on_trial_marked(self, pos: int, duration: int, label: Labels):
+        """
+        Counts a marked trial and starts the training once enough trials of both classes are marked
+        :param int pos: position of the trial in the raw data of the trial_handler
+        :param int duration: duration of the trial in samples
+        :param Labels label: label of the trial
+        """
+        if label in self.__counts:
+            self.__counts[label] += 1
+        if self.__thread is None and min(self.__counts.values()) >= self.n_trials:
+            unsubscribe("trial_marked", self.on_trial_marked)
+            self.__thread = threading.Thread(target=self.train, name='SpatialPatternsTrainer', daemon=True)
+            self.__thread.start()
+
+    def wait(self):
+        """Blocks until a started training has finished"""
+        if self.__thread is not None:
+            self.__thread.join()
+
+    def train(self) -> bool:
+        """
+        Trains the filters from the trials recorded so far and hands them over to the algorithm
+        :return: True if the filters are used by the algorithm
+        """
+        try:
+            fit_trial_handler(self.sample_rate, self.window_size, self.window_offset, self.spatial_patterns)
+        except ValueError as exception:
+            print("CSP training failed: ", exception)
+            return False
+        cursor_control_algorithm.set_spatial_patterns(self.spatial_patterns)
+        from scripts.data.analysis import online_training
+        if online_training.online_trainer is not None:
+            online_training.online_trainer.set_spatial_patterns(self.spatial_patterns)
+        elif cursor_control_algorithm.used_classifier is not None and \
+                cursor_control_algorithm.used_classifier.channels is None:
+            # the features of the classifier were calculated with the montage
+            cursor_control_algorithm.set_classifier(None)
+        print("CSP filters trained, eigenvalues: ", self.spatial_patterns.eigenvalues)
+        return True
+
+
+def start_spatial_patterns_training(sample_rate: float, window_size: float = 1.0, window_offset: float = 0.05,
+                                    f_min: float = 8, f_max: float = 12):
+    """
+    Starts the CSP training of a new session, the algorithm uses the montage until the filters are trained
+    :param float sample_rate: sample rate of the raw data
+    :param float window_size: window size of the game in s
+    :param float window_offset: window offset of the game in s
+    :param float f_min: lowest frequency of the band of hcon
+    :param float f_max: highest frequency of the band of hcon
+    :return: SpatialPatternsTrainer: the started trainer
+    """
+    global spatial_patterns_trainer
+    stop_spatial_patterns_training()
+    cursor_control_algorithm.set_spatial_patterns(None)
+    spatial_patterns_trainer = SpatialPatternsTrainer(sample_rate, window_size, window_offset,
+                                                      spatial_patterns=CommonSpatialPatterns(f_min=f_min, f_max=f_max))
+    spatial_patterns_trainer.start()
+    return spatial_patterns_trainer
+
+
+def stop_spatial_patterns_training():
+    """Stops the CSP training of the running session"""
+    global spatial_patterns_trainer
+    if spatial_patterns_trainer is not None:
+        spatial_patterns_trainer.stop()
+        spatial_patterns_trainer = None
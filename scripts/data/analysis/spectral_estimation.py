@@ -0,0 +1,434 @@
+from functools import lru_cache
+
+import numpy as np
+import scipy.fft
+from scipy.signal.windows import dpss
+
+""" Spectral estimators for the cursor control algorithm, which cache everything that does not change per window """
+
+# up to this amount of requested frequency bins the spectrum is calculated with a cached DFT matrix instead of a FFT
+MAX_DFT_MATRIX_BINS = 64
+# distance of the frequencies in Hz at which the AR spectrum of the Burg method is evaluated
+AR_FREQ_RESOLUTION = 0.25
+
+
+def working_dtype(samples: np.ndarray):
+    """
+    Returns the float type in which the samples are processed, float32 samples stay float32, everything else is
+    processed as float64
+    :param np.ndarray samples: samples of the spectral estimation
+    :return: np.float32 or np.float64
+    """
+    return np.float32 if np.asarray(samples).dtype == np.float32 else np.float64
+
+
+@lru_cache(maxsize=32)
+def dpss_tapers(n_times: int, sampling_rate: float, bandwidth: float, low_bias: bool = True):
+    """
+    Calculates the DPSS tapers of a multitaper estimation like mne.time_frequency.psd_array_multitaper does.
+    The result is cached per window length, sample rate and bandwidth.
+    :param n_times: number of samples of a window
+    :param sampling_rate: sample rate of the samples
+    :param bandwidth: frequency bandwidth of the tapers in Hz
+    :param low_bias: only keep tapers with an eigenvalue (spectral concentration) > 0.9
+    :return: tapers: np.ndarray with the shape (n_tapers, n_times)
+             eigvals: eigenvalues of the tapers
+    """
+    half_nbw = float(bandwidth) * n_times / (2.0 * sampling_rate)
+    if half_nbw < 0.5:
+        raise ValueError(f'Invalid bandwidth: {bandwidth}, use a value of at least {sampling_rate / n_times}')
+    tapers, eigvals = dpss(n_times, half_nbw, int(2 * half_nbw), sym=False, return_ratios=True)
+    if low_bias:
+        keep = eigvals > 0.9
+        if not keep.any():
+            keep = [np.argmax(eigvals)]
+        tapers, eigvals = tapers[keep], eigvals[keep]
+    tapers.flags.writeable = False
+    eigvals.flags.writeable = False
+    return tapers, eigvals
+
+
+class MultitaperPlan:
+    """
+    Everything a multitaper estimation of one window configuration needs, calculated once:
+    the tapers, the taper weights, the requested frequency bins and (for narrow bands) a DFT matrix
+    which combines tapering and transformation of the requested bins into one matrix multiplication.
+    The tapers and the matrix are stored in the float type of the samples (float32 or float64).
+    """
+
+    def __init__(self, n_times: int, sampling_rate: float, bandwidth: float, f_min: float, f_max: float,
+                 low_bias: bool = True, dtype=np.float64):
+        """
+        Constructor method
+        :param int n_times: number of samples of a window
+        :param float sampling_rate: sample rate of the samples
+        :param float bandwidth: frequency bandwidth of the tapers in Hz
+        :param float f_min: lowest frequency of the output
+        :param float f_max: highest frequency of the output
+        :param bool low_bias: only keep tapers with an eigenvalue > 0.9
+        :param dtype: float type of the samples, np.float32 or np.float64
+        """
+        tapers, eigvals = dpss_tapers(n_times, sampling_rate, bandwidth, low_bias)
+        self.tapers = tapers.astype(dtype, copy=False)
+        self.n_times = n_times
+        # psd = 2 * sum(eigval * |X_taper|^2) / sum(eigval)
+        self.weights = (eigvals * 2 / eigvals.sum()).astype(dtype)
+
+        freqs = np.fft.rfftfreq(n_times, 1.0 / sampling_rate)
+        self.bins = np.flatnonzero((freqs >= f_min) & (freqs <= f_max))
+        self.freqs = freqs[self.bins]
+        # the DC and the Nyquist bin of the one-sided spectrum only count half
+        self.bin_scale = np.ones(len(self.bins), dtype=dtype)
+        self.bin_scale[self.bins == 0] = 0.5
+        if n_times % 2 == 0:
+            self.bin_scale[self.bins == n_times // 2] = 0.5
+
+        self.dft_matrix = None
+        if len(self.bins) <= MAX_DFT_MATRIX_BINS:
+            exponent = np.exp(-2j * np.pi * np.outer(self.bins, np.arange(n_times)) / n_times)
+            # shape (n_times, n_tapers * n_bins)
+            self.dft_matrix = (tapers[:, np.newaxis, :] * exponent[np.newaxis, :, :]).reshape(-1, n_times).T
+            self.dft_matrix = self.dft_matrix.astype(np.result_type(dtype, np.complex64))
+
+    def psd(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Calculates the power spectral density of the requested bins
+        :param np.ndarray samples: samples with the shape (..., n_times)
+        :return: np.ndarray: psd with the shape (..., n_bins)
+        """
+        samples = samples - np.mean(samples, axis=-1, keepdims=True)
+        n_tapers = len(self.tapers)
+        if self.dft_matrix is not None:
+            spectra = (samples @ self.dft_matrix).reshape(samples.shape[:-1] + (n_tapers, len(self.bins)))
+        else:
+            spectra = scipy.fft.rfft(samples[..., np.newaxis, :] * self.tapers, axis=-1)[..., self.bins]
+        power = spectra.real ** 2 + spectra.imag ** 2
+        return np.tensordot(power, self.weights, axes=([-2], [0])) * self.bin_scale
+
+
+class MultitaperEngine:
+    """
+    Multitaper power spectral density estimation without per-call setup costs.
+    The plans (tapers, weights, frequency bins, DFT matrices) are cached per window length, sample rate,
+    bandwidth and frequency range. The result matches mne.time_frequency.psd_array_multitaper with its default
+    parameters (no adaptive weighting, low bias, length normalization, DC removal).
+    """
+
+    def __init__(self, low_bias: bool = True, max_plans: int = 16):
+        """
+        Constructor method
+        :param bool low_bias: only keep tapers with an eigenvalue > 0.9
+        :param int max_plans: maximal number of cached plans
+        """
+        self.low_bias = low_bias
+        self.max_plans = max_plans
+        self.__plans = dict()
+
+    def plan(self, n_times: int, sampling_rate: float, bandwidth: float, f_min: float = 0.0,
+             f_max: float = np.inf, dtype=np.float64) -> MultitaperPlan:
+        """
+        Returns the cached plan of the configuration, a new plan is created if necessary
+        :return: MultitaperPlan: plan of the configuration
+        """
+        key = (n_times, sampling_rate, bandwidth, f_min, f_max, np.dtype(dtype).str)
+        plan = self.__plans.get(key)
+        if plan is None:
+            if len(self.__plans) >= self.max_plans:
+                self.__plans.pop(next(iter(self.__plans)))
+            plan = MultitaperPlan(n_times, sampling_rate, bandwidth, f_min, f_max, self.low_bias, dtype)
+            self.__plans[key] = plan
+        return plan
+
+    def psd(self, samples: np.ndarray, sampling_rate: float, bandwidth: float, f_min: float = 0.0,
+            f_max: float = np.inf):
+        """
+        Calculates the power spectral density of all rows of samples at once
+        :param np.ndarray samples: samples with the shape (..., n_times), e.g. C3a and C4a stacked,
+                                   float32 samples are processed in float32
+        :param float sampling_rate: sample rate of the samples
+        :param float bandwidth: frequency bandwidth of the tapers in Hz
+        :param float f_min: lowest frequency of the output
+        :param float f_max: highest frequency of the output
+        :return: psds: power spectral density with the shape (..., n_freqs)
+                 freqs: the corresponding frequencies
+        """
+        plan = self.plan(samples.shape[-1], sampling_rate, bandwidth, f_min, f_max, working_dtype(samples))
+        return plan.psd(samples), plan.freqs
+
+    def clear(self):
+        """Removes all cached plans"""
+        self.__plans.clear()
+
+
+def trapezoid_weights(freqs: np.ndarray) -> np.ndarray:
+    """
+    Calculates the weights w with sum(w * y) == scipy.integrate.trapezoid(y, freqs)
+    :param np.ndarray freqs: sample points of the integral
+    :return: np.ndarray: weight of every sample point
+    """
+    weights = np.zeros(len(freqs))
+    if len(freqs) > 1:
+        half_steps = np.diff(freqs) / 2
+        weights[:-1] += half_steps
+        weights[1:] += half_steps
+    return weights
+
+
+class BandIntegrator:
+    """
+    Band power integration as one dot product with cached weights.
+    The weights are the trapezoid weights of the bins within each band (0 for all other bins). They depend only on
+    the frequency grid (for an FFT: on n_fft and the sample rate) and the bands, so they are cached per grid and
+    bands. The grid is identified by its length, its first and its last frequency, which is unique for the equally
+    spaced grids of the spectral estimators. The weights are cached in the float type of the spectra.
+    """
+
+    def __init__(self, max_entries: int = 32):
+        """
+        Constructor method
+        :param int max_entries: maximal number of cached weight matrices
+        """
+        self.max_entries = max_entries
+        self.__weights = dict()
+
+    def weights(self, freqs: np.ndarray, bands: tuple, dtype=np.float64) -> np.ndarray:
+        """
+        Returns the cached weights of the bands, they are calculated if necessary
+        :param np.ndarray freqs: equally spaced frequency grid of the spectrum
+        :param tuple bands: frequency bands as tuple of (f_min, f_max)
+        :param dtype: float type of the weights
+        :return: np.ndarray: read-only weights with the shape (n_bands, n_freqs)
+        """
+        dtype = np.dtype(dtype).str
+        key = (len(freqs), float(freqs[0]), float(freqs[-1]), bands, dtype) if len(freqs) else (0, bands, dtype)
+        weights = self.__weights.get(key)
+        if weights is None:
+            freqs = np.asarray(freqs, dtype=float)
+            weights = np.zeros((len(bands), len(freqs)))
+            for row, (f_min, f_max) in enumerate(bands):
+                in_band = np.flatnonzero((freqs >= f_min) & (freqs <= f_max))
+                weights[row, in_band] = trapezoid_weights(freqs[in_band])
+            weights = weights.astype(dtype, copy=False)
+            weights.flags.writeable = False
+            if len(self.__weights) >= self.max_entries:
+                self.__weights.pop(next(iter(self.__weights)))
+            self.__weights[key] = weights
+        return weights
+
+    def integrate(self, psds: np.ndarray, freqs: np.ndarray, bands: tuple) -> np.ndarray:
+        """
+        Integrates the spectra over several bands at once
+        :param np.ndarray psds: spectra with the shape (..., n_freqs)
+        :param np.ndarray freqs: equally spaced frequency grid of the spectra
+        :param tuple bands: frequency bands as tuple of (f_min, f_max)
+        :return: np.ndarray: band powers with the shape (..., n_bands)
+        """
+        return psds @ self.weights(freqs, bands, working_dtype(psds)).T
+
+    def clear(self):
+        """Removes all cached weights"""
+        self.__weights.clear()
+
+
+class SlidingDFTBandPower:
+    """
+    Spectrum of the frequency band of consecutive, overlapping windows, updated with a sliding DFT.
+    Only the DFT bins between f_min and f_max of every raw channel are kept. When the window moves by hop samples,
+    the bins are updated with the hop samples which left and entered the window:
+        X_k(t + hop) = e^(j2pi k hop / N) * (X_k(t) + sum_m (x_in[m] - x_out[m]) * e^(-j2pi k m / N))
+    so the cost of a window depends on hop and on the number of bins instead of the window length.
+    The sums of the samples and of the squared samples are updated the same way, so the per-window standardization
+    and the spatial filtering can be applied in the frequency domain afterwards. The result equals the magnitude
+    spectrum of perform_rfft for the standardized, spatially filtered window.
+    If the new window does not continue the previous one, or every resync_interval windows (to avoid the accumulation
+    of rounding errors), the bins are calculated from the whole window.
+    """
+
+    def __init__(self, resync_interval: int = 250):
+        """
+        Constructor method
+        :param int resync_interval: number of incremental updates after which the bins are recalculated
+        """
+        self.resync_interval = resync_interval
+        self.updates_since_resync = 0
+        self.__key = None
+        self.__bins = None
+        self.__freqs = None
+        self.__full_kernel = None
+        self.__hop_kernel = None
+        self.__phase_shift = None
+        self.__spectra = None  # band bins of every raw channel, shape (channels, n_bins)
+        self.__sum = None
+        self.__sum_squares = None
+        self.__outgoing = None  # first hop samples of the current window, they leave the window next
+        self.__continuation = None  # sample hop of the current window, it will be the first sample of the next window
+
+    def reset(self):
+        """Discards the state, the next window is calculated from scratch"""
+        self.__key = None
+
+    def update(self, window: np.ndarray, hop: int, sampling_rate: float, f_min: float, f_max: float,
+               spatial_filter: np.ndarray = None):
+        """
+        Calculates the magnitude spectrum of the band for the next window
+        :param np.ndarray window: raw samples with the shape (channels, n_times), not standardized
+        :param int hop: number of samples between the start of the previous and of this window
+        :param float sampling_rate: sample rate of the samples
+        :param float f_min: lowest frequency of the band
+        :param float f_max: highest frequency of the band
+        :param np.ndarray spatial_filter: matrix with the shape (n_outputs, channels), None to return every channel
+        :return: spectra: magnitude spectrum of the standardized (and spatially filtered) channels, shape (..., n_bins)
+                 freqs: the corresponding frequencies
+        """
+        n_channels, n_times = window.shape
+        key = (n_channels, n_times, hop, sampling_rate, f_min, f_max)
+        if key != self.__key:
+            self.__prepare(key)
+            self.__recalculate(window)
+        elif self.updates_since_resync >= self.resync_interval or not self.__continues(window):
+            self.__recalculate(window)
+        else:
+            incoming = window[:, n_times - hop:]
+            delta = incoming - self.__outgoing
+            self.__spectra = (self.__spectra + delta @ self.__hop_kernel) * self.__phase_shift
+            self.__sum += delta.sum(axis=1)
+            self.__sum_squares += (incoming * incoming).sum(axis=1) - (self.__outgoing * self.__outgoing).sum(axis=1)
+            self.updates_since_resync += 1
+        self.__remember(window, hop)
+
+        # standardization: only the scaling by the standard deviation affects the bins (the mean only the DC bin)
+        mean = self.__sum / n_times
+        std = np.sqrt(np.maximum(self.__sum_squares / n_times - mean * mean, 0))
+        spectra = self.__spectra / std[:, np.newaxis]
+        spectra[:, self.__bins == 0] = 0
+        if spatial_filter is not None:
+            spectra = spatial_filter @ spectra
+        return np.abs(spectra), self.__freqs
+
+    def __prepare(self, key):
+        """Calculates the kernels of a new window configuration"""
+        n_channels, n_times, hop, sampling_rate, f_min, f_max = key
+        freqs = np.fft.rfftfreq(n_times, 1.0 / sampling_rate)
+        self.__bins = np.flatnonzero((freqs >= f_min) & (freqs <= f_max))
+        self.__freqs = freqs[self.__bins]
+        self.__full_kernel = np.exp(-2j * np.pi * np.outer(np.arange(n_times), self.__bins) / n_times)
+        self.__hop_kernel = self.__full_kernel[:hop]
+        self.__phase_shift = np.exp(2j * np.pi * self.__bins * hop / n_times)
+        self.__key = key
+
+    def __recalculate(self, window: np.ndarray):
+        """Calculates the bins and sums from the whole window"""
+        self.__spectra = window @ self.__full_kernel
+        self.__sum = window.sum(axis=1)
+        self.__sum_squares = (window * window).sum(axis=1)
+        self.updates_since_resync = 0
+
+    def __continues(self, window: np.ndarray):
+        """Checks if the window is the previous window moved by hop samples"""
+        return self.__continuation is not None and np.array_equal(window[:, 0], self.__continuation)
+
+    def __remember(self, window: np.ndarray, hop: int):
+        """Copies the samples which are needed for the next update"""
+        self.__outgoing = window[:, :hop].copy()
+        self.__continuation = window[:, hop].copy() if hop < window.shape[1] else None
+
+
+def burg_ar(samples: np.ndarray, order: int):
+    """
+    Estimates the coefficients of an autoregressive model with the Burg method, vectorized over all rows.
+    The model is x[n] + a[1] * x[n - 1] + ... + a[order] * x[n - order] = e[n], the coefficients and the noise
+    variance equal those of spectrum.arburg.
+    :param np.ndarray samples: samples with the shape (..., n_times)
+    :param int order: order of the AR model
+    :return: ar: coefficients a[1..order] with the shape (..., order)
+             noise_variance: variance of e with the shape (...)
+    """
+    samples = np.asarray(samples, dtype=float)
+    n_times = samples.shape[-1]
+    if not 0 < order < n_times:
+        raise ValueError(f'Invalid order: {order}, use a value between 1 and {n_times - 1}')
+
+    batch_shape = samples.shape[:-1]
+    # polynomial 1 + a[1] z^-1 + ... + a[order] z^-order
+    polynomial = np.zeros(batch_shape + (order + 1,))
+    polynomial[..., 0] = 1
+    reflection = np.empty(batch_shape + (order,))
+    # forward and backward prediction errors, paired so that forward[n] belongs to backward[n - 1]
+    forward = samples[..., 1:]
+    backward = samples[..., :-1]
+    for m in range(order):
+        denominator = np.einsum('...i,...i->...', forward, forward) + np.einsum('...i,...i->...', backward, backward)
+        # all-zero rows have no prediction errors at all, their coefficients stay 0
+        denominator = np.where(denominator == 0, np.inf, denominator)
+        k = -2 * np.einsum('...i,...i->...', forward, backward) / denominator
+        reflection[..., m] = k
+
+        # Levinson recursion: a_new[i] = a[i] + k * a[m + 1 - i]
+        k = k[..., np.newaxis]
+        polynomial[..., :m + 2] += k * polynomial[..., m + 1::-1]
+        forward, backward = (forward + k * backward)[..., 1:], (backward + k * forward)[..., :-1]
+
+    noise_variance = np.einsum('...i,...i->...', samples, samples) / n_times * np.prod(1 - reflection ** 2, axis=-1)
+    ar = polynomial[..., 1:]
+    return ar, noise_variance
+
+
+@lru_cache(maxsize=32)
+def ar_frequency_kernel(order: int, sampling_rate: float, f_min: float, f_max: float,
+                        resolution: float = AR_FREQ_RESOLUTION):
+    """
+    Calculates the frequencies between f_min and f_max at which an AR spectrum is evaluated and the matrix
+    e^(-j2pi f k / sampling_rate) for k = 1..order, which maps the AR coefficients to the frequencies.
+    The result is cached per configuration.
+    :param int order: order of the AR model
+    :param float sampling_rate: sample rate of the samples
+    :param float f_min: lowest frequency
+    :param float f_max: highest frequency (limited to the Nyquist frequency)
+    :param float resolution: distance of the frequencies in Hz
+    :return: kernel: np.ndarray with the shape (order, n_freqs)
+             freqs: the frequencies
+    """
+    f_max = min(f_max, sampling_rate / 2)
+    freqs = np.arange(max(f_min, 0), f_max + resolution / 2, resolution)
+    kernel = np.exp(-2j * np.pi * np.outer(np.arange(1, order + 1), freqs) / sampling_rate)
+    freqs.flags.writeable = False
+    kernel.flags.writeable = False
+    return kernel, freqs
+
+
+class BurgEstimator:
+    """
+    Power spectral density estimation with an autoregressive model fitted by the Burg method.
+    It needs much shorter windows than the FFT based methods for a smooth spectrum and is therefore recommended
+    for small window sizes. The AR spectrum is only evaluated at the requested frequencies (f_min..f_max),
+    several channels (e.g. C3a and C4a stacked) are estimated in one call.
+    """
+
+    def __init__(self, order: int = 10, resolution: float = AR_FREQ_RESOLUTION):
+        """
+        Constructor method
+        :param int order: order of the AR model
+        :param float resolution: distance of the frequencies of the output in Hz
+        """
+        self.order = order
+        self.resolution = resolution
+
+    def psd(self, samples: np.ndarray, sampling_rate: float, f_min: float = 0.0, f_max: float = np.inf):
+        """
+        Calculates the one-sided power spectral density of all rows of samples at once
+        :param np.ndarray samples: samples with the shape (..., n_times)
+        :param float sampling_rate: sample rate of the samples
+        :param float f_min: lowest frequency of the output
+        :param float f_max: highest frequency of the output
+        :return: psds: power spectral density with the shape (..., n_freqs), float32 for float32 samples
+                 freqs: the corresponding frequencies
+        """
+        # the recursion always runs in float64, 1 - k^2 of sharp spectral peaks needs its precision
+        dtype = working_dtype(samples)
+        samples = samples - np.mean(samples, axis=-1, keepdims=True, dtype=np.float64)
+        ar, noise_variance = burg_ar(samples, self.order)
+        kernel, freqs = ar_frequency_kernel(self.order, sampling_rate, f_min, f_max, self.resolution)
+        # psd(f) = 2 * sigma^2 / (fs * |1 + sum_k a[k] e^(-j2pi f k / fs)|^2)
+        response = 1 + ar @ kernel
+        power = response.real ** 2 + response.imag ** 2
+        return (2 * noise_variance[..., np.newaxis] / (sampling_rate * power)).astype(dtype, copy=False), freqs
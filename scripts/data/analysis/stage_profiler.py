@@ -0,0 +1,79 @@
+import time
+
+from scripts.utils.latency_tracing import LatencyHistogram
+
+"""
+Timers and counters of the stages of the cursor control algorithm.
+A pipeline without profiler only checks for None at every stage. With a profiler, the stage timer runs from lap to
+lap: start() at the beginning of a window, lap(stage) at the end of every stage and stop() at the end of the window,
+so a stage costs one time.perf_counter() and one histogram entry.
+"""
+
+
+class StageProfiler:
+    """
+    Collects the time of every stage of the algorithm in a histogram and counts events
+
+    Attribute:
+    ----------
+    stages: dict
+        LatencyHistogram of the duration of every stage, in the order in which the stages were seen first
+    counters: dict
+        number of events by their name, e.g. processed windows
+    """
+
+    def __init__(self):
+        """Constructor method"""
+        self.stages = dict()
+        self.counters = dict()
+        self.__last = None
+
+    def reset(self):
+        """Discards the timings and the counters"""
+        self.stages.clear()
+        self.counters.clear()
+        self.__last = None
+
+    def start(self):
+        """Starts the stage timer, e.g. at the beginning of a window"""
+        self.__last = time.perf_counter()
+
+    def lap(self, stage: str):
+        """
+        Records the time since start() or the previous lap as the duration of a stage
+        :param str stage: name of the stage which has just ended
+        """
+        if self.__last is None:
+            # the stage runs outside of a profiled window, e.g. a training calls calculate_features
+            return
+        now = time.perf_counter()
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = LatencyHistogram(min_latency=1e-7)
+        histogram.add(now - self.__last)
+        self.__last = now
+
+    def stop(self):
+        """Stops the stage timer, e.g. at the end of a window"""
+        self.__last = None
+
+    def count(self, counter: str, n: int = 1):
+        """
+        Counts an event
+        :param str counter: name of the event
+        :param int n: number of events
+        """
+        self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def summary(self) -> dict:
+        """
+        :return: dict with the summary (count, mean, p50, p95, p99, maximum in ms) and the share of the total time
+                 per stage, and the counters
+        """
+        total = sum(histogram.total for histogram in self.stages.values())
+        summary = dict()
+        for stage, histogram in self.stages.items():
+            summary[stage] = histogram.summary()
+            summary[stage]['share'] = histogram.total / total if total else 0.0
+        summary.update(self.counters)
+        return summary
@@ -5,6 +5,9 @@ import brainflow
 import numpy as np
 from brainflow import BoardShim
 
+from scripts.utils.event_listener import post_event
+from scripts.utils.latency_tracing import latency_path, tracer
+
 """Skript for buffering the raw data and the trials; and saving them as an npz file"""
 
 
@@ -34,15 +37,15 @@ def send_raw_data(data, start: time.time() = None):
     """
     Start time of the session is passed only at the first data transfer of the session
     (1) If start is not None the time stamp of the start of session get saved in start_time
-    (2) Sent data get saved in raw_data
-    :param data[] data: raw data from the data acquisition
+    (2) Sent data get saved in raw_data, a chunk may contain several samples per channel
+    :param data[] data: raw data from the data acquisition with the shape (channels, samples)
     :param time.time() start: time stamp of the start of the session
     """
     if start is not None:
         global start_time
         start_time = start
     for i in range(len(raw_data)):
-        raw_data[i].append(data[i][0])
+        raw_data[i].extend(data[i])
 
 
 def mark_trial(start: float, end: float, label: Labels):
@@ -52,6 +55,7 @@ def mark_trial(start: float, end: float, label: Labels):
     (3) Saves the duration of the trial in event_duration
     (4) Saves the label of the trial in event_type
     (5) Saves the trial position in event_pos
+    (6) Posts the event trial_marked with the position, the duration and the label of the trial
     :param time.time() start: time stamp of the start of the trial
     :param time.time() end: time stamp of the end of the trial
     :param Labels label: event_type of the trial
@@ -67,6 +71,7 @@ def mark_trial(start: float, end: float, label: Labels):
     count_trials += 1
     print("Start-Time: ", start, "End-Time: ", end, "Label: ", label.name)
     print("Finished storing")
+    post_event("trial_marked", pos, duration, label)
 
 
 def create_raw_data_array() -> np.ndarray:
@@ -109,18 +114,37 @@ def create_duration_array() -> np.ndarray:
     return duration
 
 
+def create_label_array(n_samples: int = None) -> np.ndarray:
+    """
+    Converts the buffers of the events to the label of every sample of raw_data
+    :param int n_samples: number of samples, default is the length of raw_data
+    :return: np.ndarray labels: value of the event type of every sample, -1 for samples without an event
+    """
+    n_samples = len(raw_data[0]) if n_samples is None else n_samples
+    labels = np.full(n_samples, -1, dtype=int)
+    for pos, duration, label in zip(event_pos, event_duration, event_type):
+        labels[max(pos, 0):max(pos + duration, 0)] = label.value
+    return labels
+
+
 def save_session(metadata: np.ndarray, npz_name: str):
     """
     Save the metadata, the raw data, the event types, the position and the duration
-    of the events of one session in a npz-file
+    of the events of one session in a npz-file, the latencies of the algorithm are saved next to it
     :param np.ndarray metadata: metadata of the session in a np.ndarray
     :param str npz_name: name of the npz-file, not the path name!
+    :return: str: path of the saved npz-file
     """
     from os.path import dirname, abspath, join
     file_path = join(dirname(dirname(abspath(__file__))), "session", npz_name)
+    if not file_path.endswith(".npz"):
+        file_path += ".npz"
     np.savez(file_path, meta=metadata, raw_data=create_raw_data_array(), event_type=create_event_type_array(),
              event_pos=create_position_array(), event_duration=create_duration_array())
+    if tracer.enabled:
+        tracer.save(latency_path(file_path))
     reset_data()
+    return file_path
 
 
 def reset_data():
@@ -36,6 +36,18 @@ def to_idxs_of_list_str(elements: List[str], list: List[str]):
     return [list_upper.index(el.upper()) for el in elements]
 
 
+def get_session_info(session_path: str):
+    """
+    loads the recording parameters of a npz file
+    :param session_path: path of the npz file
+    :return:
+        samplerate: sample rate of the recording
+        channels: names of the recorded channels
+    """
+    meta = np.load(session_path, allow_pickle=True)['meta']
+    return meta[5][1], list(meta[6][1])
+
+
 def get_channel_rawdata(session_path: str, ch_names: List[str] = None):
     """
     loads the npz file and transforms the data for the ML-BCI framework
@@ -69,7 +81,7 @@ def get_channel_rawdata(session_path: str, ch_names: List[str] = None):
     if NOTCH_FILTER:
         chan_data = bp_notch_filtering(chan_data, samplerate)  # Optional bandpass and notch filtering
 
-    chan_label = np.full(chan_data.shape[0], -1, dtype=int)
+    chan_label = np.full(chan_data.shape[1], -1, dtype=int)
     for pos, dur, e_type in zip(event_pos, event_dur, event_type):
         chan_label[pos:pos + dur] = e_type.value
         # Left hand          0
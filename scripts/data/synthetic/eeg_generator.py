@@ -0,0 +1,180 @@
+from typing import List, Tuple
+
+import numpy as np
+
+import scripts.config as config
+from scripts.data.extraction.trial_handler import Labels
+
+""" Generator for synthetic EEG data with scripted left/right mu-rhythm desynchronization """
+
+
+class SyntheticEEG:
+    """
+    Generates EEG like data for a channel layout, vectorized over all channels and samples.
+    The data consists of
+        - 1/f^noise_exponent background noise per channel plus a common part shared by all channels
+        - line noise with line_noise_freq
+        - a mu rhythm over each hemisphere, which is desynchronized (reduced) during the trials
+    Trials with a random label (LEFT or RIGHT) alternate with rest periods, the ground truth label of every sample
+    is returned like get_channel_rawdata does (-1 = no trial, 0 = left, 1 = right).
+    By default a LEFT trial desynchronizes the mu rhythm over C3 and a RIGHT trial over C4, which is the label
+    convention of perform_algorithm (hcon = P(C4) - P(C3) above the threshold is a left signal).
+
+    Channels are assigned to the hemispheres like split_laplacian_areas does: odd numbers belong to C3,
+    even numbers to C4 and channels without a number (e.g. Cz) to both.
+    """
+
+    def __init__(self, channel_names: List[str] = None, sampling_rate: float = 125, noise_amplitude: float = 10.0,
+                 noise_exponent: float = 1.0, common_noise_ratio: float = 0.5, line_noise_freq: float = 50.0,
+                 line_noise_amplitude: float = 5.0, mu_freq: float = 10.0, mu_amplitude: float = 10.0,
+                 mu_spread: float = 0.2, desynchronization: float = 0.7, trial_duration: float = 4.0,
+                 rest_duration: float = 2.0, erd_channels: dict = None, segment_duration: float = 60.0,
+                 seed: int = None):
+        """
+        Constructor method
+        :param list[str] channel_names: channel layout, default is config.BCI_CHANNELS
+        :param float sampling_rate: sample rate in Hz
+        :param float noise_amplitude: standard deviation of the background noise (in µV)
+        :param float noise_exponent: exponent alpha of the 1/f^alpha background noise (0 = white noise)
+        :param float common_noise_ratio: part of the background noise which is shared by all channels
+        :param float line_noise_freq: frequency of the line noise, None disables the line noise
+        :param float line_noise_amplitude: amplitude of the line noise (in µV)
+        :param float mu_freq: frequency of the mu rhythm in Hz
+        :param float mu_amplitude: amplitude of the mu rhythm at C3 and C4 (in µV)
+        :param float mu_spread: part of the mu rhythm which reaches the other channels of the same hemisphere
+        :param float desynchronization: relative reduction of the mu amplitude during a trial (0..1)
+        :param float trial_duration: duration of a trial in s
+        :param float rest_duration: duration of the rest between two trials in s
+        :param dict erd_channels: channel which is desynchronized per label, default {LEFT: 'C3', RIGHT: 'C4'}
+        :param float segment_duration: length of the blocks in which the 1/f noise is shaped in s
+        :param int seed: seed of the random generator
+        """
+        self.channel_names = list(channel_names) if channel_names else list(config.BCI_CHANNELS)
+        self.sampling_rate = sampling_rate
+        self.noise_amplitude = noise_amplitude
+        self.noise_exponent = noise_exponent
+        self.common_noise_ratio = common_noise_ratio
+        self.line_noise_freq = line_noise_freq if line_noise_freq and line_noise_freq < sampling_rate / 2 else None
+        self.line_noise_amplitude = line_noise_amplitude
+        self.mu_freq = mu_freq
+        self.mu_amplitude = mu_amplitude
+        self.desynchronization = desynchronization
+        self.trial_samples = int(trial_duration * sampling_rate)
+        self.rest_samples = int(rest_duration * sampling_rate)
+        self.erd_channels = erd_channels if erd_channels else {Labels.LEFT: 'C3', Labels.RIGHT: 'C4'}
+        self.segment_samples = max(int(segment_duration * sampling_rate), 1)
+        self.samples_generated = 0
+
+        self.__rng = np.random.default_rng(seed)
+        n_channels = len(self.channel_names)
+        # mixing of the two mu sources (C3 and C4) into the channels
+        self.__mu_mixing = np.zeros((n_channels, 2))
+        for i, name in enumerate(self.channel_names):
+            for source, centre in enumerate(['C3', 'C4']):
+                if name.upper() == centre:
+                    self.__mu_mixing[i, source] = 1.0
+                elif not name[-1].isnumeric():
+                    self.__mu_mixing[i, source] = mu_spread / 2
+                elif int(name[-1]) % 2 == source:
+                    self.__mu_mixing[i, source] = 0.0
+                else:
+                    self.__mu_mixing[i, source] = mu_spread
+        self.__mu_phase = self.__rng.uniform(0, 2 * np.pi, 2)
+        self.__line_phase = self.__rng.uniform(0, 2 * np.pi)
+        self.__line_gain = self.__rng.uniform(0.5, 1.5, (n_channels, 1))
+        self.__noise = np.empty((n_channels + 1, 0))
+        self.__trials = list()  # scheduled trials as (start, end, label)
+        self.__schedule_end = 0
+
+    def generate(self, duration: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Continues the stream for the given duration
+        :param float duration: duration in s
+        :return: chan_data: data with the shape (channels, samples)
+                 chan_label: ground truth label of every sample
+        """
+        return self.next_block(int(round(duration * self.sampling_rate)))
+
+    def next_block(self, n_samples: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Continues the stream with the next n_samples samples
+        :param int n_samples: number of samples
+        :return: chan_data: data with the shape (channels, samples)
+                 chan_label: ground truth label of every sample
+        """
+        start = self.samples_generated
+        t = np.arange(start, start + n_samples) / self.sampling_rate
+        labels = self.__labels(start, n_samples)
+
+        # background noise, a part of it is common to all channels (volume conduction)
+        noise = self.__take_noise(n_samples)
+        data = np.sqrt(1 - self.common_noise_ratio) * noise[1:] + np.sqrt(self.common_noise_ratio) * noise[0]
+        data *= self.noise_amplitude
+
+        # mu rhythm of both hemispheres with the desynchronization during the trials
+        mu = np.sin(2 * np.pi * self.mu_freq * t + self.__mu_phase[:, np.newaxis]) * self.mu_amplitude
+        for label, channel in self.erd_channels.items():
+            source = ['C3', 'C4'].index(channel.upper())
+            mu[source, labels == label.value] *= 1 - self.desynchronization
+        data += self.__mu_mixing @ mu
+
+        if self.line_noise_freq:
+            line = np.sin(2 * np.pi * self.line_noise_freq * t + self.__line_phase) * self.line_noise_amplitude
+            data += self.__line_gain * line
+
+        self.samples_generated += n_samples
+        return data, labels
+
+    def __labels(self, start: int, n_samples: int) -> np.ndarray:
+        """
+        Returns the ground truth labels of the requested samples, new trials are scheduled as needed
+        :param int start: index of the first sample
+        :param int n_samples: number of samples
+        :return: np.ndarray: label of every sample
+        """
+        end = start + n_samples
+        while self.__schedule_end < end:
+            trial_start = self.__schedule_end + self.rest_samples
+            label = Labels.LEFT if self.__rng.random() < 0.5 else Labels.RIGHT
+            self.__trials.append((trial_start, trial_start + self.trial_samples, label))
+            self.__schedule_end = trial_start + self.trial_samples
+        # trials which ended before this block are not needed anymore
+        while self.__trials and self.__trials[0][1] <= start:
+            self.__trials.pop(0)
+
+        labels = np.full(n_samples, -1, dtype=int)
+        for trial_start, trial_end, label in self.__trials:
+            if trial_start >= end:
+                break
+            labels[max(trial_start - start, 0):max(trial_end - start, 0)] = label.value
+        return labels
+
+    def __take_noise(self, n_samples: int) -> np.ndarray:
+        """
+        Takes the next samples of the 1/f noise, which is shaped in segments of segment_samples samples
+        :param int n_samples: number of samples
+        :return: np.ndarray: noise with unit variance with the shape (channels + 1, samples), row 0 is the common noise
+        """
+        while self.__noise.shape[1] < n_samples:
+            self.__noise = np.hstack([self.__noise, self.__shape_noise(max(self.segment_samples, n_samples))])
+        noise = self.__noise[:, :n_samples]
+        self.__noise = self.__noise[:, n_samples:]
+        return noise
+
+    def __shape_noise(self, n_samples: int) -> np.ndarray:
+        """
+        Creates 1/f^noise_exponent noise by shaping the spectrum of white noise
+        :param int n_samples: number of samples
+        :return: np.ndarray: noise with unit variance with the shape (channels + 1, samples)
+        """
+        white = self.__rng.standard_normal((len(self.channel_names) + 1, n_samples))
+        if self.noise_exponent == 0 or n_samples < 2:
+            return white
+        spectrum = np.fft.rfft(white, axis=-1)
+        freqs = np.fft.rfftfreq(n_samples, d=1 / self.sampling_rate)
+        freqs[0] = freqs[1]
+        spectrum *= freqs ** (-self.noise_exponent / 2)
+        noise = np.fft.irfft(spectrum, n=n_samples, axis=-1)
+        noise -= noise.mean(axis=-1, keepdims=True)
+        noise /= noise.std(axis=-1, keepdims=True)
+        return noise
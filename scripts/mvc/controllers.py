@@ -3,8 +3,9 @@ from abc import ABC, abstractmethod
 from datetime import datetime
 from tkinter.messagebox import askyesno, showinfo
 
-from scripts.config import CALIBRATION_TIME, BCI_CHANNELS
-from scripts.data.acquisition.read_data import live_Data
+from scripts.config import CALIBRATION_TIME, BCI_CHANNELS, STAGE_PROFILING, ONLINE_TRAINING
+from scripts.data.acquisition.read_data import is_live
+from scripts.data.analysis.stage_profiler import StageProfiler
 from scripts.data.extraction import trial_handler
 from scripts.data.extraction.trial_handler import save_session
 from scripts.data.visualisation.liveplot_matlab import start_live_plot, perform_live_plot
@@ -46,6 +47,7 @@ class ConfigController(Controller):
         self.view.buttons["Abort"].configure(command=self.__abort_calibration)
         self.view.check_buttons["Trial Recording"].configure(command=self.__set_trial_recording)
         self.view.check_buttons["Plot"].configure(command=self.__toggle_plot)
+        self.view.check_buttons["Profiling"].configure(command=self.__toggle_profiling)
 
     def __init_config_view_values(self):
         """Initially configures the view with the model data"""
@@ -60,6 +62,7 @@ class ConfigController(Controller):
         self.view.spin_boxes["window_offset"].set(self.data.window_offset)
         self.view.spin_boxes["trial_min_duration"].set(self.data.trial_min_duration)
         self.view.check_button_vars["Trial Recording"].set(self.data.trial_recording)
+        self.view.check_button_vars["Profiling"].set(STAGE_PROFILING)
 
     def update(self):
         self.__update_calibration()
@@ -110,8 +113,10 @@ class ConfigController(Controller):
             self.__discard_session()
 
     def __connect_board(self):
-        """ Creates the connection to the board"""
-        from scripts.data.acquisition.read_data import init_board
+        """ Creates the source of the session (config.DATA_SOURCE) and the connection to the board"""
+        from scripts.data.acquisition.read_data import init_board, set_source, create_default_source
+        set_source(create_default_source())
+        self.view.show_trial_recording_check_button()
         if init_board():
             self.view.hide_button("Connect Board")
             self.view.show_button("Start Session")
@@ -131,7 +136,7 @@ class ConfigController(Controller):
             self.__start_liveplot()
             self.root.create_game_window()
 
-            if live_Data:
+            if is_live():
                 self.__start_calibration()
             else:
                 self.view.show_button("Stop Session")
@@ -148,7 +153,7 @@ class ConfigController(Controller):
             from scripts.data.acquisition.read_data import stop_stream
             stop_stream()
             # Only allow saving if trial recording is turned on
-            if self.data.trial_recording and live_Data:
+            if self.data.trial_recording and is_live():
                 from scripts.data.extraction.trial_handler import count_trials
                 if count_trials > 0:
                     self.view.show_button("Discard Session")
@@ -157,7 +162,7 @@ class ConfigController(Controller):
                 else:
                     showinfo("Information", "There are no trials to save.")
                     self.__discard_session()
-            elif not live_Data:
+            elif not is_live():
                 showinfo("Information", "A session replay cannot be saved.")
                 self.__discard_session()
             else:
@@ -178,7 +183,10 @@ class ConfigController(Controller):
         print(meta_data.__str__())
         file_name = "session-%s-%s" % (self.data.subject_id, self.session_start_time.strftime("%d%m%Y-%H%M%S"))
 
-        save_session(meta_data.turn_into_np_array(), file_name)
+        session_path = save_session(meta_data.turn_into_np_array(), file_name)
+        if ONLINE_TRAINING:
+            from scripts.data.analysis.online_training import save_trained_classifier
+            save_trained_classifier(session_path)
         showinfo("Information", "Successfully saved the session.")
         self.root.destroy_game_window()
         self.view.reset_view()
@@ -207,6 +215,11 @@ class ConfigController(Controller):
             self.view.show_plot(False)
             self.data.draw_plot = False
 
+    def __toggle_profiling(self):
+        """Switches the timers of the algorithm stages on or off, they are printed when the session stops"""
+        from scripts.data.analysis.cursor_control_algorithm import set_profiler
+        set_profiler(StageProfiler() if self.view.check_button_vars["Profiling"].get() else None)
+
     def validate_form(self):
         """Validates the whole form by calling all the individual validation methods
 
@@ -81,8 +81,8 @@ class ConfigView(View):
         self.show_trial_recording_check_button()
 
     def show_trial_recording_check_button(self):
-        from scripts.data.acquisition.read_data import live_Data
-        if live_Data:
+        from scripts.data.acquisition.read_data import is_live
+        if is_live():
             self.check_buttons["Trial Recording"].grid(row=1, column=0)
         else:
             self.check_buttons["Trial Recording"].grid_forget()
@@ -214,6 +214,8 @@ class ConfigView(View):
         self.__create_checkbutton(checkbutton_frame, "Plot", row=0, column=0)
         # Checkbutton to toggle the recording of trials
         self.__create_checkbutton(checkbutton_frame, "Trial Recording", row=1, column=0)
+        # Checkbutton to toggle the timers of the algorithm stages
+        self.__create_checkbutton(checkbutton_frame, "Profiling", row=2, column=0)
         checkbutton_frame.grid(padx=10, pady=5, row=row, column=column, rowspan=4, sticky='nsew')
 
     # Third Column Sections
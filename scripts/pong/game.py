@@ -5,6 +5,7 @@ from tkinter import *
 import scripts.config as config
 import scripts.pong.player as player
 import scripts.pong.target as target
+from scripts.utils.latency_tracing import tracer
 
 
 class GameState(object):
@@ -195,6 +196,8 @@ class Game(tk.Frame):
             self.target.update(delta_time=delta)
             # Draw
             self.player.draw()
+            # the latest movement of the algorithm is on the canvas now
+            tracer.drawn()
 
         elif curr_state is Hit.name:
             if self.curr_restart_time == 0:
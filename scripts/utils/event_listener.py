@@ -8,7 +8,12 @@ def subscribe(event_type, fn):
     subscribers[event_type].append(fn)
 
 
-def post_event(event_type):
+def unsubscribe(event_type, fn):
+    if fn in subscribers[event_type]:
+        subscribers[event_type].remove(fn)
+
+
+def post_event(event_type, *args):
     if event_type in subscribers:
         for fn in subscribers[event_type]:
-            fn()
+            fn(*args)
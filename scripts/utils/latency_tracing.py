@@ -0,0 +1,217 @@
+import math
+import os
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+import scripts.config as config
+
+"""
+Latency tracing of the sliding windows from the arrival of their samples to the movement of the player.
+Every window gets a trace with time.perf_counter() stamps of its stages:
+    arrival    the chunk with the last sample of the window was read from the source (or written into the shared ring)
+    window     the sliding window was handed over to the algorithm
+    processed  the algorithm has calculated the label
+    published  the move event was posted, the player has changed its direction
+    drawn      the game loop has drawn the player after the movement
+The delays between consecutive stages are collected in histograms with logarithmic bins, recording a window costs
+a few additions, no allocation grows with the session. time.perf_counter() is system wide on the supported platforms,
+so the stamps of the acquisition process can be compared with the stamps of the GUI process.
+"""
+
+STAGES = ('arrival', 'window', 'processed', 'published', 'drawn')
+# file name suffix of the latencies saved next to a session, session-1.npz -> session-1.latency.npz
+LATENCY_SUFFIX = '.latency.npz'
+
+
+class LatencyHistogram:
+    """
+    Histogram of latencies with logarithmic bins, percentiles are accurate to the width of a bin (about 12 %)
+
+    Attribute:
+    ----------
+    edges: np.ndarray
+        edges of the bins in s, the first bin also counts smaller and the last bin larger latencies
+    counts: np.ndarray
+        number of latencies per bin
+    count: int
+        number of latencies
+    maximum: float
+        largest latency in s
+    """
+
+    def __init__(self, min_latency: float = 1e-5, max_latency: float = 10.0, bins_per_decade: int = 20):
+        """
+        Constructor method
+        :param float min_latency: lower edge of the first bin in s
+        :param float max_latency: upper edge of the last bin in s
+        :param int bins_per_decade: number of bins per factor 10
+        """
+        self.__log_min = math.log10(min_latency)
+        self.__bins_per_decade = bins_per_decade
+        n_bins = int(round((math.log10(max_latency) - self.__log_min) * bins_per_decade))
+        self.edges = np.logspace(self.__log_min, math.log10(max_latency), n_bins + 1)
+        self.counts = np.zeros(n_bins, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, latency: float):
+        """
+        Counts a latency
+        :param float latency: latency in s
+        """
+        index = int((math.log10(latency) - self.__log_min) * self.__bins_per_decade) if latency > 0 else 0
+        self.counts[min(max(index, 0), len(self.counts) - 1)] += 1
+        self.count += 1
+        self.total += latency
+        self.maximum = max(self.maximum, latency)
+
+    def percentile(self, q: float) -> float:
+        """
+        :param float q: percentile between 0 and 100
+        :return: float: upper edge of the bin which contains the percentile in s (the maximum for the last bin),
+                 0 without latencies
+        """
+        if self.count == 0:
+            return 0.0
+        index = min(int(np.searchsorted(np.cumsum(self.counts), q / 100 * self.count)), len(self.counts) - 1)
+        if index == len(self.counts) - 1:
+            return self.maximum
+        return float(min(self.edges[index + 1], self.maximum))
+
+    def summary(self) -> dict:
+        """
+        :return: dict with the count, the mean, p50, p95, p99 and the maximum in ms
+        """
+        return {'count': self.count, 'mean_ms': self.total / self.count * 1000 if self.count else 0.0,
+                'p50_ms': self.percentile(50) * 1000, 'p95_ms': self.percentile(95) * 1000,
+                'p99_ms': self.percentile(99) * 1000, 'max_ms': self.maximum * 1000}
+
+
+class WindowTrace:
+    """Stamps of the stages of one sliding window"""
+
+    __slots__ = ('times',)
+
+    def __init__(self):
+        self.times = [None] * len(STAGES)
+
+    def stamp(self, stage: str, now: float = None):
+        """
+        Stamps a stage of the window
+        :param str stage: one of STAGES
+        :param float now: time.perf_counter() of the stage, default is now
+        """
+        self.times[STAGES.index(stage)] = time.perf_counter() if now is None else now
+
+
+class LatencyTracer:
+    """
+    Collects the traces of the windows of a session.
+    A trace which moved the player is kept until the game loop has drawn the movement, a newer movement replaces it.
+
+    Attribute:
+    ----------
+    enabled: bool
+        no traces are created if the tracing is disabled
+    histograms: dict
+        LatencyHistogram per stage (delay from the previous stage) and of end_to_end (arrival to drawn)
+    """
+
+    def __init__(self, enabled: bool = True):
+        """
+        Constructor method
+        :param bool enabled: create traces for the windows
+        """
+        self.enabled = enabled
+        self.histograms = dict()
+        self.__lock = threading.Lock()
+        self.__moved = None
+        self.reset()
+
+    def reset(self):
+        """Discards the latencies, e.g. for a new session"""
+        with self.__lock:
+            self.histograms = {stage: LatencyHistogram() for stage in STAGES[1:] + ('end_to_end',)}
+            self.__moved = None
+
+    def begin(self, arrival_time: float = None) -> Optional[WindowTrace]:
+        """
+        Creates the trace of a new sliding window
+        :param float arrival_time: time.perf_counter() when the last sample of the window arrived, default is now
+        :return: WindowTrace with the stamps of arrival and window, None if the tracing is disabled
+        """
+        if not self.enabled:
+            return None
+        trace = WindowTrace()
+        now = time.perf_counter()
+        trace.stamp('arrival', now if arrival_time is None else arrival_time)
+        trace.stamp('window', now)
+        return trace
+
+    def finish(self, trace: WindowTrace, moved: bool):
+        """
+        Records a published trace, a trace which moved the player waits for the next drawing of the game
+        :param WindowTrace trace: trace of the window, nothing happens for None
+        :param bool moved: True if the window posted a move event
+        """
+        if trace is None:
+            return
+        with self.__lock:
+            if moved:
+                trace, self.__moved = self.__moved, trace
+            if trace is not None:
+                self.__record(trace)
+
+    def drawn(self):
+        """Records the pending movement, must be called by the game loop after the player is drawn"""
+        if self.__moved is None:
+            return
+        with self.__lock:
+            trace, self.__moved = self.__moved, None
+            if trace is not None:
+                trace.stamp('drawn')
+                self.__record(trace)
+
+    def __record(self, trace: WindowTrace):
+        """Adds the delays between the stamped stages to the histograms"""
+        times = trace.times
+        for index in range(1, len(STAGES)):
+            if times[index] is not None and times[index - 1] is not None:
+                self.histograms[STAGES[index]].add(times[index] - times[index - 1])
+        if times[0] is not None and times[-1] is not None:
+            self.histograms['end_to_end'].add(times[-1] - times[0])
+
+    def summary(self) -> dict:
+        """
+        :return: dict with the summary (count, mean, p50, p95, p99, maximum in ms) per stage
+        """
+        return {name: histogram.summary() for name, histogram in self.histograms.items()}
+
+    def save(self, path: str):
+        """
+        Saves the histograms and their percentiles as npz file
+        :param str path: path of the file
+        """
+        names = list(self.histograms)
+        histograms = [self.histograms[name] for name in names]
+        np.savez(path, stages=np.asarray(names), edges=histograms[0].edges,
+                 counts=np.array([histogram.counts for histogram in histograms]),
+                 percentiles=np.array([[histogram.percentile(q) for q in (50, 95, 99)] for histogram in histograms]),
+                 maximum=np.array([histogram.maximum for histogram in histograms]))
+
+
+def latency_path(session_path: str) -> str:
+    """
+    :param str session_path: path of the npz file of a session (with or without the extension)
+    :return: path of the latencies which are saved next to the session
+    """
+    root, extension = os.path.splitext(session_path)
+    return (root if extension == '.npz' else session_path) + LATENCY_SUFFIX
+
+
+# tracer of the running session
+tracer = LatencyTracer(config.LATENCY_TRACING)
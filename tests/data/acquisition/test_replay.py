@@ -0,0 +1,41 @@
+import time
+import unittest
+
+import numpy as np
+
+from scripts.data.acquisition.replay import ReplayMode, SessionReplay
+
+
+class TestSessionReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.chan_data = np.arange(10 * 103, dtype=float).reshape(10, 103)
+
+    def test_blocks_cover_recording(self):
+        replay = SessionReplay(self.chan_data, 125, block_size=25, mode=ReplayMode.as_fast_as_possible)
+        blocks = list(replay)
+        self.assertEqual(len(replay), len(blocks))
+        self.assertEqual([25, 25, 25, 25, 3], [block.shape[1] for block in blocks])
+        np.testing.assert_array_equal(np.hstack(blocks), self.chan_data)
+        self.assertTrue(np.shares_memory(blocks[0], self.chan_data))  # blocks are slices, not copies
+        self.assertAlmostEqual(103 / 125, replay.virtual_time)
+
+    def test_scaled_replay_follows_virtual_clock(self):
+        # 103 samples at 125 Hz last 0.824 s, replayed 8 times faster
+        replay = SessionReplay(self.chan_data, 125, block_size=5, mode=ReplayMode.scaled, speed=8)
+        start = time.perf_counter()
+        for _ in replay:
+            pass
+        duration = time.perf_counter() - start
+        self.assertGreaterEqual(duration, 0.824 / 8 - 0.01)
+        self.assertLess(duration, 0.824 / 2)
+
+    def test_invalid_parameters(self):
+        with self.assertRaises(ValueError):
+            SessionReplay(self.chan_data, 125, block_size=0)
+        with self.assertRaises(ValueError):
+            SessionReplay(self.chan_data, 125, block_size=5, mode=ReplayMode.scaled, speed=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+import multiprocessing
+import threading
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from scripts.data.acquisition.acquisition_process import AcquisitionProcess
+from scripts.data.acquisition.replay import ReplayMode
+from scripts.data.acquisition.shared_ring import SharedSampleRing
+from scripts.data.acquisition.sources import SyntheticSource
+from scripts.data.acquisition.stream_filter import StreamFilter
+
+
+def write_sequence_numbers(descriptor: tuple, n_samples: int, block_size: int):
+    """Writes blocks in which every sample holds its own sequence number"""
+    ring = SharedSampleRing.attach(descriptor)
+    try:
+        for start in range(0, n_samples, block_size):
+            ring.write(np.broadcast_to(np.arange(start, start + block_size, dtype=float), (ring.n_channels, block_size)))
+        ring.mark_closed()
+    finally:
+        ring.close()
+
+
+class TestSharedSampleRing(unittest.TestCase):
+
+    def setUp(self):
+        self.ring = SharedSampleRing(3, 10)
+        self.samples = np.arange(3 * 25, dtype=float).reshape(3, 25)
+
+    def tearDown(self):
+        self.ring.close()
+
+    def test_read_over_the_border(self):
+        self.ring.write(self.samples[:, :7])
+        self.ring.write(self.samples[:, 7:12])
+        self.assertEqual(12, self.ring.sequence)
+        np.testing.assert_array_equal(self.samples[:, 5:12], self.ring.read(5, 7))
+        self.assertIsNone(self.ring.read(1, 3))
+        with self.assertRaises(ValueError):
+            self.ring.read(10, 3)
+
+    def test_block_larger_than_capacity(self):
+        self.ring.write(self.samples)
+        self.assertEqual(25, self.ring.sequence)
+        np.testing.assert_array_equal(self.samples[:, 15:], self.ring.read(15, 10))
+
+    def test_attach(self):
+        attached = SharedSampleRing.attach(self.ring.descriptor)
+        try:
+            self.ring.write(self.samples[:, :4])
+            self.assertEqual(4, attached.sequence)
+            np.testing.assert_array_equal(self.samples[:, :4], attached.read(0, 4))
+            self.assertFalse(attached.is_closed)
+            self.ring.mark_closed()
+            self.assertTrue(attached.is_closed)
+            self.assertEqual(4, attached.wait(100))
+        finally:
+            attached.close()
+
+    def test_concurrent_read_at_lap_boundary(self):
+        """
+        A read of the oldest samples which overlaps a write either returns intact samples or None
+        """
+        ring = SharedSampleRing(64, 100)
+        writer = multiprocessing.get_context('spawn').Process(target=write_sequence_numbers,
+                                                              args=(ring.descriptor, 500000, 40))
+        try:
+            writer.start()
+            reads = 0
+            while not ring.is_closed:
+                sequence, write_time = ring.timestamp()
+                start = max(sequence - ring.capacity, 0)
+                window = ring.read(start, min(60, sequence - start))
+                if window is None:
+                    continue
+                reads += 1
+                np.testing.assert_array_equal(np.arange(start, start + window.shape[1]), window[0])
+                np.testing.assert_array_equal(window[0], window[-1])
+            writer.join(30)
+            self.assertGreater(reads, 0)
+        finally:
+            if writer.is_alive():
+                writer.terminate()
+            ring.close()
+
+    def test_wait_timeout(self):
+        start = time.perf_counter()
+        self.assertEqual(0, self.ring.wait(1, timeout=0.05))
+        self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+
+    def test_wait_backs_off(self):
+        intervals = list()
+        with mock.patch('scripts.data.acquisition.shared_ring.time.sleep', side_effect=intervals.append):
+            self.ring.wait(1, timeout=0.01, poll_interval=0.001, max_poll_interval=0.004)
+        self.assertEqual([0.001, 0.002, 0.004, 0.004], intervals[:4])
+
+    def test_timestamp_of_unfinished_write(self):
+        self.ring.write(self.samples[:, :4])
+        sequence, write_time = self.ring.timestamp()
+        # the writer fails after it announced the next block, the last complete write stays readable
+        block = mock.MagicMock(shape=(3, 4))
+        block.__getitem__.side_effect = RuntimeError
+        with self.assertRaises(RuntimeError):
+            self.ring.write(block)
+        self.assertEqual((4, write_time), self.ring.timestamp())
+        self.assertEqual(4, self.ring.sequence)
+
+class TestAcquisitionProcess(unittest.TestCase):
+
+    def test_samples(self):
+        """
+        The process writes the same filtered samples into the ring as a filter in this process calculates
+        """
+        source = SyntheticSource(sampling_rate=250, block_size=10, duration=2, seed=4,
+                                 mode=ReplayMode.as_fast_as_possible)
+        stream_filter = StreamFilter(len(source.channel_names), 250, passband=(1, 40))
+        acquisition = AcquisitionProcess(source, stream_filter, capacity=1000)
+        try:
+            self.assertTrue(acquisition.start())
+            acquisition.ring.wait(500, timeout=30)
+            self.assertTrue(acquisition.ring.is_closed)
+            self.assertEqual(500, acquisition.ring.sequence)
+            expected = SyntheticSource(sampling_rate=250, block_size=10, duration=2, seed=4,
+                                       mode=ReplayMode.as_fast_as_possible)
+            expected.start()
+            blocks = [stream_filter.process(expected.read_block()) for _ in range(50)]
+            np.testing.assert_allclose(np.hstack(blocks), acquisition.ring.read(0, 500))
+        finally:
+            acquisition.close()
+
+    def test_latency_under_load(self):
+        """
+        A thread which holds the GIL of this process does not delay the acquisition
+        """
+        source = SyntheticSource(sampling_rate=250, block_size=5, duration=3, seed=2)
+        acquisition = AcquisitionProcess(source, capacity=1000)
+        running = True
+
+        def busy():
+            # a pure python loop like a slow plot redraw
+            while running:
+                sum(i * i for i in range(100000))
+
+        load = threading.Thread(target=busy)
+        try:
+            self.assertTrue(acquisition.start())
+            load.start()
+            ring = acquisition.ring
+            start_sequence, start_time = ring.wait(1, timeout=30), time.time()
+            latencies = list()
+            while not ring.is_closed:
+                sequence, write_time = ring.timestamp()
+                latencies.append(time.time() - write_time)
+                time.sleep(0.01)
+            running = False
+            # the samples are written in real time, the delay of a block is about its duration (20 ms)
+            self.assertLess(np.percentile(latencies, 95), 0.1)
+            self.assertEqual(750, ring.sequence)
+            self.assertGreater(time.time() - start_time, (750 - start_sequence) / 250 - 0.1)
+        finally:
+            running = False
+            if load.is_alive():
+                load.join()
+            acquisition.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
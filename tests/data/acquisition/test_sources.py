@@ -0,0 +1,72 @@
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from scripts import config
+from scripts.data.acquisition.replay import ReplayMode
+from scripts.data.acquisition import read_data
+from scripts.data.acquisition.sources import BoardSource, ReplaySource, SyntheticSource
+
+SESSION_PATH = str(Path(__file__).resolve().parents[3] / 'scripts' / 'data' / 'session' / 'test_loader.npz')
+
+
+def read_all_blocks(source):
+    blocks = list()
+    block = source.read_block()
+    while block is not None:
+        blocks.append(block)
+        block = source.read_block()
+    return blocks
+
+
+class TestSyntheticSource(unittest.TestCase):
+
+    def test_channel_map(self):
+        source = SyntheticSource(sampling_rate=1000, n_channels=32, mode=ReplayMode.as_fast_as_possible)
+        self.assertEqual(1000, source.sampling_rate)
+        self.assertEqual(32, len(source.channel_names))
+        self.assertEqual(config.BCI_CHANNELS, source.channel_names[:len(config.BCI_CHANNELS)])
+        self.assertEqual('Ch32', source.channel_names[-1])
+
+    def test_duration(self):
+        source = SyntheticSource(sampling_rate=250, block_size=40, duration=1, mode=ReplayMode.as_fast_as_possible)
+        source.start()
+        blocks = read_all_blocks(source)
+        self.assertEqual(250, sum(block.shape[1] for block in blocks))
+        self.assertEqual(len(config.BCI_CHANNELS), blocks[0].shape[0])
+        self.assertTrue(all(block.shape[1] <= 40 for block in blocks))
+
+
+class TestReplaySource(unittest.TestCase):
+
+    def test_replay(self):
+        source = ReplaySource(SESSION_PATH, ['C3', 'C4'], block_size=3, mode=ReplayMode.as_fast_as_possible)
+        self.assertTrue(source.prefiltered)
+        self.assertFalse(source.is_live)
+        source.start()
+        blocks = read_all_blocks(source)
+        self.assertEqual([3, 1], [block.shape[1] for block in blocks])
+        np.testing.assert_array_equal(blocks[0][0], blocks[0][1])
+
+
+class TestDefaultSource(unittest.TestCase):
+
+    def setUp(self):
+        self.data_source = config.DATA_SOURCE
+
+    def tearDown(self):
+        config.DATA_SOURCE = self.data_source
+
+    def test_config_selects_source(self):
+        for data_source, source_type in (('board', BoardSource), ('replay', ReplaySource),
+                                         ('synthetic', SyntheticSource)):
+            config.DATA_SOURCE = data_source
+            self.assertIsInstance(read_data.create_default_source(), source_type)
+        config.DATA_SOURCE = 'headset'
+        with self.assertRaises(ValueError):
+            read_data.create_default_source()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+
+import numpy as np
+
+import scripts.config as config
+from scripts.data.acquisition.stream_filter import StreamFilter
+
+
+class TestStreamFilter(unittest.TestCase):
+
+    def setUp(self):
+        self.sampling_rate = 125
+        t = np.arange(10 * self.sampling_rate) / self.sampling_rate
+        alpha = np.sin(2 * np.pi * 10 * t)
+        powerline = np.sin(2 * np.pi * 50 * t)
+        self.data = np.vstack([alpha + powerline for _ in range(16)])
+        self.alpha = alpha
+
+    def test_chunks_equal_whole_stream(self):
+        whole = StreamFilter(16, self.sampling_rate, passband=(1, 30)).process(self.data)
+        stream_filter = StreamFilter(16, self.sampling_rate, passband=(1, 30))
+        chunks = [stream_filter.process(chunk) for chunk in np.array_split(self.data, 97, axis=1)]
+        np.testing.assert_array_almost_equal(np.hstack(chunks), whole, decimal=10)
+
+    def test_notch_removes_powerline(self):
+        stream_filter = StreamFilter(16, self.sampling_rate, notch_freq=50, passband=None)
+        filtered = np.hstack([stream_filter.process(chunk) for chunk in np.array_split(self.data, 50, axis=1)])
+        # after the settling time only the 10 Hz component should be left
+        settled = slice(5 * self.sampling_rate, None)
+        np.testing.assert_array_almost_equal(filtered[3, settled], self.alpha[settled], decimal=1)
+
+    def test_notch_follows_config(self):
+        stream_notch_filter = config.STREAM_NOTCH_FILTER
+        try:
+            config.STREAM_NOTCH_FILTER = True
+            self.assertEqual(config.NOTCH_FILTER_FREQ, StreamFilter(16, self.sampling_rate, passband=None).notch_freq)
+            config.STREAM_NOTCH_FILTER = False
+            self.assertIsNone(StreamFilter(16, self.sampling_rate, passband=None).notch_freq)
+        finally:
+            config.STREAM_NOTCH_FILTER = stream_notch_filter
+
+    def test_without_filter(self):
+        stream_filter = StreamFilter(16, self.sampling_rate, notch_freq=None, passband=None)
+        self.assertEqual(0, len(stream_filter.sos))
+        np.testing.assert_array_equal(stream_filter.process(self.data), self.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+
+import numpy as np
+
+from scripts.data.acquisition.window_buffer import WindowRingBuffer
+
+
+class TestWindowRingBuffer(unittest.TestCase):
+
+    def test_view_contains_latest_samples(self):
+        buffer = WindowRingBuffer(n_channels=3, capacity=10)
+        data = np.vstack([np.arange(37) + 100 * channel for channel in range(3)])
+        for chunk in np.array_split(data, 11, axis=1):
+            buffer.extend(chunk)
+            expected = data[:, max(0, chunk[0, -1] + 1 - 10):chunk[0, -1] + 1]
+            np.testing.assert_array_equal(buffer.view(), expected)
+        self.assertTrue(buffer.is_full)
+
+    def test_view_is_not_a_copy(self):
+        buffer = WindowRingBuffer(n_channels=2, capacity=4)
+        buffer.extend(np.ones((2, 6)))
+        view = buffer.view()
+        self.assertTrue(view.flags['C_CONTIGUOUS'] or view[0].flags['C_CONTIGUOUS'])
+        self.assertFalse(view.flags.writeable)
+        buffer.extend(np.full((2, 1), 2.0))
+        np.testing.assert_array_equal(buffer.view()[:, -1], [2.0, 2.0])
+
+    def test_chunk_larger_than_capacity(self):
+        buffer = WindowRingBuffer(n_channels=1, capacity=5)
+        buffer.extend(np.arange(12).reshape(1, 12))
+        np.testing.assert_array_equal(buffer.view(), [[7, 8, 9, 10, 11]])
+
+
+if __name__ == '__main__':
+    unittest.main()
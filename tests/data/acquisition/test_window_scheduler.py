@@ -0,0 +1,53 @@
+import unittest
+
+from scripts.data.acquisition.window_scheduler import SchedulingPolicy, WindowScheduler
+
+
+class TestWindowScheduler(unittest.TestCase):
+
+    def schedule(self, policy: SchedulingPolicy, release_times: list, now: float):
+        scheduler = WindowScheduler(policy, deadline=0.05)
+        admitted = [scheduler.admit(release_time, index < len(release_times) - 1, now)
+                    for index, release_time in enumerate(release_times)]
+        return scheduler, admitted
+
+    def test_on_time(self):
+        """
+        Windows within their deadline are processed with every policy
+        """
+        for policy in [SchedulingPolicy.all, SchedulingPolicy.drop_late]:
+            scheduler, admitted = self.schedule(policy, [1.0, 1.01, 1.02], now=1.04)
+            self.assertEqual([True, True, True], admitted)
+            self.assertEqual(0, scheduler.late_windows)
+
+    def test_drop_late(self):
+        scheduler, admitted = self.schedule(SchedulingPolicy.drop_late, [1.0, 1.06, 1.09], now=1.1)
+        self.assertEqual([False, True, True], admitted)
+        self.assertEqual(1, scheduler.dropped_windows)
+        self.assertEqual(2, scheduler.processed_windows)
+
+    def test_newest_window_is_processed(self):
+        """
+        Even a late window is processed if no newer window is pending
+        """
+        for policy in [SchedulingPolicy.drop_late, SchedulingPolicy.latest]:
+            scheduler, admitted = self.schedule(policy, [1.0, 1.05, 1.1], now=2.0)
+            self.assertEqual([False, False, True], admitted)
+            self.assertEqual(1, scheduler.late_windows)
+        # latest drops older windows even within their deadline, all keeps the late ones
+        self.assertEqual([False, False, True], self.schedule(SchedulingPolicy.latest, [1.0, 1.05, 1.1], 1.1)[1])
+        self.assertEqual([True, True, True], self.schedule(SchedulingPolicy.all, [1.0, 1.05, 1.1], 2.0)[1])
+
+    def test_summary(self):
+        scheduler, _ = self.schedule(SchedulingPolicy.drop_late, [1.0, 1.06, 1.09], now=1.1)
+        summary = scheduler.summary()
+        self.assertEqual(1, summary['dropped_windows'])
+        self.assertEqual(0, summary['late_windows'])
+        self.assertAlmostEqual(40, summary['delay_max_ms'])
+        self.assertAlmostEqual(25, summary['delay_mean_ms'])
+        # the delays are counted in a histogram, its size does not grow with the session
+        self.assertEqual(2, scheduler.delays.count)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -236,5 +236,87 @@ class TestCursorControlAlgorithm(unittest.TestCase):
         self.assertEqual(id(r2), id(r1))  # ringbuffer r1 should be the same as ringbuffer r2
 
 
+class TestSpatialFilterMatrix(unittest.TestCase):
+    def setUp(self) -> None:
+        self.used_ch_names = ['C3', 'C4', 'FC3', 'FC1', 'FC2', 'FC4', 'CP3', 'CP1', 'CP2', 'CPz']
+        self.samples = np.random.default_rng(0).standard_normal((len(self.used_ch_names), 250))
+
+    def test_laplacian_matrix(self) -> None:
+        """
+        Tests spatial_filter_matrix() for the laplacian
+        Expected result:
+            - C3a = C3 - mean(FC3, FC1, CP3, CP1, CPz)
+            - C4a = C4 - mean(FC2, FC4, CP2, CPz)
+        """
+        from scripts.data.analysis.cursor_control_algorithm import spatial_filter_matrix, MONTAGE
+        c3a, c4a = spatial_filter_matrix(tuple(self.used_ch_names), MONTAGE.laplacian) @ self.samples
+        np.testing.assert_almost_equal(c3a, self.samples[0] - np.mean(self.samples[[2, 3, 6, 7, 9]], axis=0))
+        np.testing.assert_almost_equal(c4a, self.samples[1] - np.mean(self.samples[[4, 5, 8, 9]], axis=0))
+
+    def test_car_matrix(self) -> None:
+        """
+        Tests spatial_filter_matrix() for the common average reference
+        Expected result:
+            - C3a = C3 - mean(all channels)
+        """
+        from scripts.data.analysis.cursor_control_algorithm import spatial_filter_matrix, MONTAGE
+        c3a, c4a = spatial_filter_matrix(tuple(self.used_ch_names), MONTAGE.car) @ self.samples
+        np.testing.assert_almost_equal(c3a, self.samples[0] - np.mean(self.samples, axis=0))
+        np.testing.assert_almost_equal(c4a, self.samples[1] - np.mean(self.samples, axis=0))
+
+    def test_matrix_is_cached(self) -> None:
+        """
+        Tests that the matrix is only built once per channel map
+        """
+        from scripts.data.analysis.cursor_control_algorithm import spatial_filter_matrix, MONTAGE
+        m1 = spatial_filter_matrix(tuple(self.used_ch_names), MONTAGE.laplacian)
+        m2 = spatial_filter_matrix(tuple(self.used_ch_names), MONTAGE.laplacian)
+        self.assertEqual(id(m1), id(m2))
+
+
+class TestCursorControlPipeline(unittest.TestCase):
+    def setUp(self) -> None:
+        rng = np.random.default_rng(4)
+        self.used_ch_names = ['C3', 'C4', 'FC5', 'FC1', 'FC2', 'FC6', 'CP5', 'CP1', 'CP2', 'CP6']
+        self.samples = rng.standard_normal((10, 125 * 10)).cumsum(axis=1) * 0.1 + rng.standard_normal((10, 125 * 10))
+        self.windows = [self.samples[:, start:start + 125] for start in range(0, self.samples.shape[1] - 125, 25)]
+
+    def run_pipeline(self, pipeline):
+        return [pipeline.process(window, self.used_ch_names, 125).hcon for window in self.windows]
+
+    def test_pipelines_are_independent(self) -> None:
+        """
+        Tests that interleaved pipelines with different configurations do not affect each other
+        Expected result:
+            - each pipeline calculates the same values as if it ran alone
+        """
+        from scripts.data.analysis.cursor_control_algorithm import CursorControlPipeline, PSD_METHOD
+        fft_alone = self.run_pipeline(CursorControlPipeline(PSD_METHOD.fft))
+        multitaper_alone = self.run_pipeline(CursorControlPipeline(PSD_METHOD.multitaper, f_min=10, f_max=14))
+
+        fft_pipeline = CursorControlPipeline(PSD_METHOD.fft)
+        multitaper_pipeline = CursorControlPipeline(PSD_METHOD.multitaper, f_min=10, f_max=14)
+        for i, window in enumerate(self.windows):
+            result = multitaper_pipeline.process(window, self.used_ch_names, 125)
+            self.assertEqual(multitaper_alone[i], result.hcon)
+            result = fft_pipeline.process(window, self.used_ch_names, 125)
+            self.assertEqual(fft_alone[i], result.hcon)
+
+    def test_perform_algorithm_uses_default_pipeline(self) -> None:
+        """
+        Tests that perform_algorithm calculates the labels of a pipeline with the configuration of the data model
+        """
+        from scripts.data.analysis import cursor_control_algorithm as cca
+        data_mdl = ConfigData()
+        data_mdl.draw_plot = False
+        cca.clear_ring_buffer()
+        pipeline = cca.CursorControlPipeline(cca.USED_METHOD, cca.USED_MONTAGE, cca.USED_NORMALIZATION,
+                                             f_min=data_mdl.f_min, f_max=data_mdl.f_max, threshold=data_mdl.threshold)
+        for window in self.windows:
+            label = cca.perform_algorithm(window, self.used_ch_names, 125, data_mdl)
+            self.assertEqual(pipeline.process(window, self.used_ch_names, 125).label, label)
+        cca.clear_ring_buffer()
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,119 @@
+import subprocess
+import sys
+import time
+import types
+import unittest
+from pathlib import Path
+
+import scripts.config as config
+from scripts.data.acquisition.channels import sort_channels
+from scripts.data.acquisition.shared_ring import SharedSampleRing
+from scripts.data.acquisition.window_scheduler import SchedulingPolicy, WindowScheduler
+from scripts.data.analysis.algorithm_worker import AlgorithmWorker
+from scripts.data.analysis.classifiers import LinearDiscriminant
+from scripts.data.analysis.cursor_control_algorithm import CursorControlPipeline, PSD_METHOD
+from scripts.data.analysis.spatial_patterns import labelled_windows
+from scripts.data.synthetic.eeg_generator import SyntheticEEG
+from scripts.utils.event_listener import post_event
+
+ROOT = Path(__file__).resolve().parents[3]
+
+
+class TestAlgorithmWorker(unittest.TestCase):
+
+    def setUp(self):
+        self.data, self.labels = SyntheticEEG(config.BCI_CHANNELS, 125, seed=9).generate(30)
+        self.channel_order, self.used_ch_names = sort_channels(config.BCI_CHANNELS)
+        self.ring = SharedSampleRing(len(config.BCI_CHANNELS), self.data.shape[1])
+        self.ring.write(self.data)
+        self.data_model = types.SimpleNamespace(f_min=8, f_max=12, threshold=1.5, draw_plot=False)
+        self.results = list()
+
+    def tearDown(self):
+        self.ring.close()
+
+    def create_worker(self, pipeline, policy: SchedulingPolicy = SchedulingPolicy.all):
+        return AlgorithmWorker(self.ring.descriptor, self.channel_order, self.used_ch_names, 125, self.data_model,
+                               pipeline=pipeline, callback=lambda start, result: self.results.append((start, result)),
+                               scheduler=WindowScheduler(policy, 0.2))
+
+    def test_equals_pipeline(self):
+        """
+        The worker calculates the same results as the pipeline in this process, in the order of the windows
+        """
+        worker = self.create_worker(CursorControlPipeline(PSD_METHOD.multitaper))
+        starts = range(0, self.data.shape[1] - 124, 25)
+        worker.start()
+        try:
+            submit_start = time.perf_counter()
+            for start in starts:
+                worker.submit(start, 125)
+            # the windows are only handed over, the acquisition does not wait for the spectral analysis
+            self.assertLess(time.perf_counter() - submit_start, 0.1)
+        finally:
+            worker.stop(timeout=60)
+
+        self.assertEqual(len(starts), worker.processed_windows)
+        self.assertEqual(list(starts), [start for start, _ in self.results])
+        pipeline = CursorControlPipeline(PSD_METHOD.multitaper)
+        for start, result in self.results:
+            expected = pipeline.process(self.data[self.channel_order, start:start + 125], self.used_ch_names, 125)
+            self.assertAlmostEqual(expected.hcon, result.hcon)
+            self.assertEqual(expected.label, result.label)
+
+    def test_pipeline_changed(self):
+        pipeline = CursorControlPipeline(PSD_METHOD.fft)
+        classifier = LinearDiscriminant()
+        windows, labels = labelled_windows(self.data[self.channel_order], self.labels, 125, 1.0, 0.2)
+        classifier.fit(pipeline.calculate_features(windows, self.used_ch_names, 125, classifier.bands)
+                       .reshape(len(windows), -1), labels)
+        worker = self.create_worker(pipeline)
+        worker.start()
+        try:
+            worker.submit(0, 125)
+            post_event("pipeline_changed", "classifier", classifier)
+            worker.submit(25, 125)
+        finally:
+            worker.stop(timeout=60)
+        self.assertIsNone(self.results[0][1].decision)
+        self.assertIsNotNone(self.results[1][1].decision)
+
+    def test_late_windows_are_dropped(self):
+        """
+        The worker skips the backlog of late windows and continues with the newest one
+        """
+        worker = self.create_worker(CursorControlPipeline(PSD_METHOD.fft), SchedulingPolicy.drop_late)
+        starts = list(range(0, 500, 25))
+        for start in starts:
+            worker.submit(start, 125, release_time=time.time() - 1)
+        worker.start()
+        worker.stop(timeout=60)
+        self.assertEqual(len(starts), worker.processed_windows + worker.skipped_windows)
+        self.assertGreater(worker.skipped_windows, 0)
+        self.assertEqual(starts[-1], self.results[-1][0])
+
+    def test_worker_imports(self):
+        """
+        The worker process loads neither the live plot (Tk) nor the acquisition of the GUI process
+        """
+        modules = ("matplotlib", "tkinter", "scripts.data.acquisition.read_data")
+        code = (f'import sys; import scripts.data.analysis.algorithm_worker; '
+                f'print([m for m in {modules} if m in sys.modules])')
+        output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+        self.assertEqual('[]', output.stdout.strip())
+
+    def test_overwritten_window(self):
+        worker = self.create_worker(CursorControlPipeline(PSD_METHOD.fft))
+        self.ring.write(self.data[:, :200])
+        worker.start()
+        try:
+            worker.submit(0, 125)
+            worker.submit(self.ring.sequence - 125, 125)
+        finally:
+            worker.stop(timeout=60)
+        self.assertEqual(1, worker.skipped_windows)
+        self.assertEqual([self.ring.sequence - 125], [start for start, _ in self.results])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from scripts.data.analysis.batch_evaluation import EvaluationResult, evaluate_recording, sliding_windows
+from scripts.data.analysis.cursor_control_algorithm import CursorControlPipeline, PSD_METHOD
+from scripts.data.synthetic.eeg_generator import SyntheticEEG
+
+ROOT = Path(__file__).resolve().parents[3]
+CHANNELS = ['C3', 'C4', 'FC5', 'FC1', 'FC2', 'FC6', 'CP5', 'CP1', 'CP2', 'CP6']
+
+
+class TestBatchEvaluation(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.chan_data, cls.label_data = SyntheticEEG(CHANNELS, 125, seed=6).generate(120)
+
+    def test_offline_imports(self):
+        """
+        The offline evaluation (also in the pool workers of the parameter sweep) does not load the live acquisition
+        """
+        modules = ("matplotlib", "tkinter", "scripts.data.acquisition.read_data")
+        code = (f'import sys; import scripts.data.analysis.parameter_sweep, scripts.data.analysis.online_training; '
+                f'print([m for m in {modules} if m in sys.modules])')
+        output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+        self.assertEqual('[]', output.stdout.strip())
+
+    def test_sliding_windows(self):
+        windows = sliding_windows(self.chan_data, 125, 25)
+        self.assertEqual((len(range(0, self.chan_data.shape[1] - 124, 25)), len(CHANNELS), 125), windows.shape)
+        np.testing.assert_array_equal(self.chan_data[:, 50:175], windows[2])
+        self.assertTrue(np.shares_memory(windows, self.chan_data))
+
+    def test_equals_window_by_window(self):
+        """
+        The batched evaluation should calculate the same values as the pipeline for every single window
+        """
+        for method in [PSD_METHOD.fft, PSD_METHOD.multitaper, PSD_METHOD.sliding_dft]:
+            result = evaluate_recording(self.chan_data, self.label_data, CHANNELS, 125, 1.0, 0.2,
+                                        pipeline=CursorControlPipeline(method), chunk_size=100)
+            pipeline = CursorControlPipeline(method)
+            expected = [pipeline.process(self.chan_data[:, start:start + 125], CHANNELS, 125, 0.2)
+                        for start in range(0, self.chan_data.shape[1] - 124, 25)]
+            np.testing.assert_allclose(result.hcon, [r.hcon for r in expected], rtol=1e-9, atol=1e-12)
+            np.testing.assert_array_equal(result.labels, [r.label for r in expected])
+            np.testing.assert_array_equal(result.true_labels, self.label_data[::25][:len(expected)])
+
+    def test_float32_equals_float64(self):
+        """
+        The float32 path from the windows to the band powers should reproduce the float64 results
+        """
+        windows = sliding_windows(self.chan_data, 125, 25)
+        for method in [PSD_METHOD.fft, PSD_METHOD.periodogram, PSD_METHOD.multitaper, PSD_METHOD.burg]:
+            expected = CursorControlPipeline(method).calculate_features(windows, CHANNELS, 125)
+            single = CursorControlPipeline(method, dtype=np.float32)
+            band_powers = single.calculate_features(windows.astype(np.float32), CHANNELS, 125)
+            self.assertEqual(np.float64, band_powers.dtype)
+            np.testing.assert_allclose(expected, band_powers, rtol=1e-3)
+
+            result = evaluate_recording(self.chan_data, self.label_data, CHANNELS, 125, 1.0, 0.2,
+                                        pipeline=CursorControlPipeline(method))
+            single_result = evaluate_recording(self.chan_data.astype(np.float32), self.label_data, CHANNELS, 125,
+                                               1.0, 0.2, pipeline=CursorControlPipeline(method, dtype=np.float32))
+            self.assertGreater(np.mean(result.labels == single_result.labels), 0.99)
+
+    def test_accuracy_on_synthetic_data(self):
+        result = evaluate_recording(self.chan_data, self.label_data, CHANNELS, 125, 1.0, 0.2, t_min=10,
+                                    pipeline=CursorControlPipeline(PSD_METHOD.fft))
+        self.assertAlmostEqual(10, result.times[0])
+        self.assertGreater(result.decided_accuracy, 0.8)
+
+    def test_accuracies(self):
+        true_labels = np.array([-1, 0, 0, 0, -1, 1, 1, -1, 0, 0])
+        labels = np.array([0, -1, 1, 0, 1, 0, -1, -1, 0, 0])
+        result = EvaluationResult(np.arange(10), np.zeros(10), np.zeros(10), labels, true_labels)
+        np.testing.assert_array_equal([0, 0, 0, 1, 0, 0, 0, 0, 1, 1], result.correct)
+        self.assertAlmostEqual(3 / 7, result.window_accuracy)
+        self.assertAlmostEqual(3 / 5, result.decided_accuracy)
+        self.assertAlmostEqual(2 / 3, result.trial_accuracy)
+
+
+if __name__ == '__main__':
+    unittest.main()
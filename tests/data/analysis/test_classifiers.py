@@ -0,0 +1,156 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from scripts.data.analysis.batch_evaluation import sliding_windows
+import scripts.config as config
+from scripts.data.analysis.classifiers import LinearDiscriminant, classifier_path, load_classifier, \
+    load_configured_classifier, train_classifier
+from scripts.data.analysis.cursor_control_algorithm import CursorControlPipeline, PSD_METHOD
+from scripts.data.analysis.spatial_patterns import labelled_windows
+from scripts.data.synthetic.eeg_generator import SyntheticEEG
+
+SESSION_PATH = str(Path(__file__).resolve().parents[3] / 'scripts' / 'data' / 'session' /
+                   'session-1-05052022-154258.npz')
+CHANNELS = ['C3', 'C4', 'FC5', 'FC1', 'FC2', 'FC6', 'CP5', 'CP1', 'CP2', 'CP6']
+
+
+class TestLinearDiscriminant(unittest.TestCase):
+
+    def test_gaussian_classes(self):
+        rng = np.random.default_rng(0)
+        covariance = np.array([[1.0, 0.8], [0.8, 1.0]])
+        left = rng.multivariate_normal([1, 0], covariance, 500)
+        right = rng.multivariate_normal([-1, 0], covariance, 500)
+        lda = LinearDiscriminant(log_features=False, shrinkage=0).fit(np.vstack([left, right]),
+                                                                      np.repeat([0, 1], 500))
+        # the optimal direction of correlated classes is not the difference of the means
+        expected = np.linalg.solve(covariance, [2, 0])
+        np.testing.assert_allclose(expected / np.linalg.norm(expected), lda.weights / np.linalg.norm(lda.weights),
+                                   atol=0.05)
+        self.assertGreater(np.mean(lda.predict(left) == 0), 0.9)
+        self.assertGreater(np.mean(lda.predict(right) == 1), 0.9)
+        self.assertEqual(0, lda.predict(np.array([1.0, 0.0])))
+
+    def test_margin(self):
+        lda = LinearDiscriminant(margin=1.0, log_features=False)
+        lda.weights, lda.bias = np.array([1.0]), 0.0
+        np.testing.assert_array_equal([0, -1, -1, 1], lda.predict(np.array([[2.0], [0.5], [-1.0], [-3.0]])))
+
+    def test_needs_both_classes(self):
+        with self.assertRaises(ValueError):
+            LinearDiscriminant().fit(np.ones((10, 4)), np.zeros(10))
+
+    def test_update_after_loading(self):
+        """
+        A loaded classifier continues with the windows of the saved one
+        """
+        rng = np.random.default_rng(2)
+        features = np.vstack([rng.normal(2, 0.5, (100, 3)), rng.normal(1, 0.5, (100, 3))])
+        labels = np.tile(np.repeat([0, 1], 50), 2)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'session-1.classifier.npz')
+            first = LinearDiscriminant().fit(features[:100], labels[:100])
+            first.save(path)
+            loaded = load_classifier(path)
+            self.assertTrue(loaded.can_update)
+            loaded.partial_fit(features[100:], labels[100:])
+
+            expected = LinearDiscriminant().fit(features, labels)
+            np.testing.assert_allclose(expected.weights, loaded.weights)
+            self.assertAlmostEqual(expected.bias, loaded.bias)
+
+            # a file without the sums of the windows can not be updated
+            with np.load(path) as data:
+                arrays = {name: data[name] for name in data.files if name not in ('counts', 'sums', 'products')}
+            np.savez(path, **arrays)
+            old = load_classifier(path)
+            np.testing.assert_array_equal(first.weights, old.weights)
+            self.assertFalse(old.can_update)
+            with self.assertRaises(ValueError):
+                old.partial_fit(features, labels)
+
+    def test_configured_classifier(self):
+        classifier_file = config.CLASSIFIER_FILE
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                classifier = LinearDiscriminant(log_features=False).fit(np.arange(8.0).reshape(4, 2), [0, 0, 1, 1])
+                classifier.save(os.path.join(directory, 'session-1.classifier.npz'))
+                config.CLASSIFIER_FILE = os.path.join(directory, 'session-1.npz')
+                np.testing.assert_array_equal(classifier.weights, load_configured_classifier().weights)
+                config.CLASSIFIER_FILE = os.path.join(directory, 'session-2.npz')
+                self.assertIsNone(load_configured_classifier())
+            config.CLASSIFIER_FILE = None
+            self.assertIsNone(load_configured_classifier())
+        finally:
+            config.CLASSIFIER_FILE = classifier_file
+
+
+class TestClassifierStage(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        generator = SyntheticEEG(CHANNELS, 125, seed=8)
+        cls.train_data, cls.train_labels = generator.generate(120)
+        cls.test_data, cls.test_labels = generator.generate(60)
+
+    def fit(self, pipeline):
+        classifier = LinearDiscriminant()
+        windows, labels = labelled_windows(self.train_data, self.train_labels, 125, 1.0, 0.2)
+        features = pipeline.calculate_features(windows, CHANNELS, 125, classifier.bands, classifier.channels)
+        return classifier.fit(features.reshape(len(windows), -1), labels)
+
+    def test_pipeline_with_classifier(self):
+        """
+        The classifier decides the labels, hcon is calculated from the same spectrum as without classifier
+        """
+        pipeline = CursorControlPipeline(PSD_METHOD.fft)
+        classifier = self.fit(pipeline)
+        pipeline.classifier = classifier
+        windows, labels = labelled_windows(self.test_data, self.test_labels, 125, 1.0, 0.2)
+        result = pipeline.process_windows(windows, CHANNELS, 125)
+        self.assertGreater(np.mean(result.label == labels), 0.9)
+
+        threshold_pipeline = CursorControlPipeline(PSD_METHOD.fft)
+        single_pipeline = CursorControlPipeline(PSD_METHOD.fft, classifier=classifier)
+        for i, window in enumerate(windows[:20]):
+            single = single_pipeline.process(window, CHANNELS, 125)
+            self.assertEqual(result.label[i], single.label)
+            self.assertAlmostEqual(result.decision[i], single.decision)
+            self.assertAlmostEqual(threshold_pipeline.process(window, CHANNELS, 125).hcon, single.hcon)
+
+    def test_latency(self):
+        """
+        With the classifier a window is still processed well within the window offset of 50 ms
+        """
+        pipeline = CursorControlPipeline(PSD_METHOD.multitaper)
+        pipeline.classifier = self.fit(pipeline)
+        windows = sliding_windows(self.test_data, 125, 6)[:200]
+        pipeline.process(windows[0], CHANNELS, 125, 0.05)
+        start = time.perf_counter()
+        for window in windows:
+            pipeline.process(window, CHANNELS, 125, 0.05)
+        self.assertLess((time.perf_counter() - start) / len(windows), 0.01)
+
+    def test_train_from_session(self):
+        with tempfile.TemporaryDirectory() as directory:
+            session_path = os.path.join(directory, os.path.basename(SESSION_PATH))
+            shutil.copy(SESSION_PATH, session_path)
+            classifier = train_classifier([session_path], pipeline=CursorControlPipeline(PSD_METHOD.fft))
+            self.assertTrue(os.path.exists(classifier_path(session_path)))
+            loaded = load_classifier(session_path)
+
+        self.assertIsInstance(loaded, LinearDiscriminant)
+        self.assertEqual(classifier.bands, loaded.bands)
+        self.assertIsNone(loaded.channels)
+        np.testing.assert_array_equal(classifier.weights, loaded.weights)
+        self.assertEqual(classifier.bias, loaded.bias)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+
+import numpy as np
+
+from scripts.data.analysis.batch_evaluation import sliding_windows
+from scripts.data.analysis.cursor_control_algorithm import CursorControlPipeline, MONTAGE, PSD_METHOD, \
+    channel_filter_matrix, spatial_filter_matrix
+from scripts.data.analysis.feature_extraction import BETA_BAND, BandPowerFeatures, MU_BAND
+from scripts.data.synthetic.eeg_generator import SyntheticEEG
+
+CHANNELS = ['C3', 'C4', 'FC5', 'FC1', 'FC2', 'FC6', 'CP5', 'CP1', 'CP2', 'CP6', 'Cz']
+
+
+class TestChannelFilterMatrix(unittest.TestCase):
+
+    def test_equals_spatial_filter_matrix(self):
+        for montage in MONTAGE:
+            np.testing.assert_array_equal(spatial_filter_matrix(tuple(CHANNELS), montage),
+                                          channel_filter_matrix(tuple(CHANNELS), ('C3', 'C4'), montage))
+
+    def test_laplacian_of_other_channels(self):
+        """
+        CP5 is referenced to the other channels of the left area, Cz to all other channels
+        """
+        matrix = channel_filter_matrix(tuple(CHANNELS), ('CP5', 'Cz'), MONTAGE.laplacian)
+        expected_cp5 = np.zeros(len(CHANNELS))
+        expected_cp5[6] = 1
+        expected_cp5[[0, 2, 3, 7, 10]] = -1 / 5
+        np.testing.assert_almost_equal(expected_cp5, matrix[0])
+        np.testing.assert_almost_equal(np.append(np.full(10, -1 / 10), 1), matrix[1])
+
+
+class TestBandPowerFeatures(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        chan_data, _ = SyntheticEEG(CHANNELS, 125, seed=2).generate(20)
+        cls.windows = sliding_windows(chan_data, 125, 25)
+
+    def test_feature_matrix(self):
+        features = BandPowerFeatures((MU_BAND, BETA_BAND), ('C3', 'C4', 'CP5', 'CP6'),
+                                     CursorControlPipeline(PSD_METHOD.fft))
+        self.assertEqual((len(self.windows), 4, 2), features.band_powers(self.windows, CHANNELS, 125).shape)
+        self.assertEqual((len(self.windows), 8), features.transform(self.windows, CHANNELS, 125).shape)
+        self.assertEqual((8,), features.transform(self.windows[0], CHANNELS, 125).shape)
+        self.assertEqual(['C3a 8-12 Hz', 'C3a 13-30 Hz', 'C4a 8-12 Hz'], features.feature_names[:3])
+
+    def test_equals_band_powers_of_the_pipeline(self):
+        """
+        The features of C3a and C4a in the band of the pipeline are the band powers of hcon
+        """
+        for method in [PSD_METHOD.fft, PSD_METHOD.periodogram, PSD_METHOD.multitaper, PSD_METHOD.burg]:
+            pipeline = CursorControlPipeline(method)
+            features = BandPowerFeatures((MU_BAND, BETA_BAND), ('C3', 'C4'), pipeline)
+            expected = pipeline.calculate_band_powers(self.windows, CHANNELS, 125)
+            np.testing.assert_allclose(expected, features.band_powers(self.windows, CHANNELS, 125)[..., 0],
+                                       rtol=1e-9)
+
+    def test_bands_of_one_spectrum(self):
+        pipeline = CursorControlPipeline(PSD_METHOD.fft)
+        band_powers = BandPowerFeatures((MU_BAND, BETA_BAND), pipeline=pipeline).band_powers(self.windows,
+                                                                                            CHANNELS, 125)
+        pipeline.f_min, pipeline.f_max = BETA_BAND
+        np.testing.assert_allclose(pipeline.calculate_band_powers(self.windows, CHANNELS, 125),
+                                   band_powers[..., 1], rtol=1e-12)
+
+
+if __name__ == '__main__':
+    unittest.main()
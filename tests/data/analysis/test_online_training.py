@@ -0,0 +1,154 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import scripts.config as config
+from scripts.data.acquisition.channels import sort_channels
+from scripts.data.analysis.batch_evaluation import recording_windows
+from scripts.data.analysis import online_training
+from scripts.data.analysis.classifiers import LinearDiscriminant, load_classifier
+from scripts.data.analysis.cursor_control_algorithm import CursorControlPipeline, PSD_METHOD
+from scripts.data.analysis.online_training import OnlineTrainer
+from scripts.data.analysis.spatial_patterns import fit_recording
+from scripts.data.extraction import trial_handler
+from scripts.data.synthetic.eeg_generator import SyntheticEEG
+
+
+class TestOnlineTrainer(unittest.TestCase):
+
+    def setUp(self):
+        self.data, self.labels = SyntheticEEG(config.BCI_CHANNELS, 125, seed=3).generate(60)
+        changes = np.flatnonzero(np.diff(self.labels, prepend=-2, append=-2))
+        self.trials = [(start, end - start) for start, end in zip(changes[:-1], changes[1:])
+                       if self.labels[start] != -1]
+        trial_handler.reset_data()
+        trial_handler.send_raw_data(self.data)
+        self.pipeline = CursorControlPipeline(PSD_METHOD.fft)
+        self.trainer = OnlineTrainer(config.BCI_CHANNELS, 125, 1.0, 0.2, pipeline=self.pipeline)
+
+    def tearDown(self):
+        self.trainer.stop(wait=True)
+        trial_handler.reset_data()
+
+    def mark_trial(self, pos, duration):
+        trial_handler.mark_trial(trial_handler.start_time + pos * trial_handler.TIME_FOR_ONE_SAMPLE,
+                                 trial_handler.start_time + (pos + duration) * trial_handler.TIME_FOR_ONE_SAMPLE,
+                                 trial_handler.Labels(self.labels[pos]))
+
+    def test_retraining(self):
+        """
+        The classifier is swapped in as soon as both classes were marked and equals a classifier trained at once
+        """
+        self.trainer.start()
+        self.mark_trial(*self.trials[0])
+        self.trainer.wait()
+        self.assertIsNone(self.pipeline.classifier)
+        for trial in self.trials[1:]:
+            self.mark_trial(*trial)
+        self.trainer.wait()
+
+        classifier = self.pipeline.classifier
+        self.assertIsInstance(classifier, LinearDiscriminant)
+        self.assertIsNot(self.trainer.classifier, classifier)
+        summary = self.trainer.statistics.summary()
+        self.assertEqual(len(self.trials), summary['swaps'] + summary['skipped_trials'])
+        self.assertGreater(summary['swaps'], 0)
+        self.assertGreaterEqual(summary['swap_latency_max_ms'], summary['retrain_time_max_ms'])
+
+        indices, used_ch_names = sort_channels(config.BCI_CHANNELS)
+        features, labels = list(), list()
+        for pos, duration in self.trials:
+            windows, _ = recording_windows(self.data[indices, pos:pos + duration], 125, 1.0, 0.2)
+            features.append(CursorControlPipeline(PSD_METHOD.fft).calculate_features(
+                windows, used_ch_names, 125, classifier.bands).reshape(len(windows), -1))
+            labels.append(np.full(len(windows), self.labels[pos]))
+        expected = LinearDiscriminant().fit(np.concatenate(features), np.concatenate(labels))
+        np.testing.assert_allclose(expected.weights, classifier.weights, rtol=1e-8)
+        self.assertAlmostEqual(expected.bias, classifier.bias)
+
+    def test_spatial_patterns_restart_the_training(self):
+        """
+        New CSP filters discard the classifier, the next trials train it with the CSP features
+        """
+        self.trainer.start()
+        for trial in self.trials:
+            self.mark_trial(*trial)
+        self.trainer.wait()
+        self.assertIsNotNone(self.pipeline.classifier)
+
+        indices, used_ch_names = sort_channels(config.BCI_CHANNELS)
+        spatial_patterns = fit_recording(self.data[indices], self.labels, used_ch_names, 125)
+        self.trainer.set_spatial_patterns(spatial_patterns)
+        self.trainer.wait()
+        self.assertIsNone(self.pipeline.classifier)
+        self.assertFalse(self.trainer.classifier.is_fitted)
+        self.assertIs(spatial_patterns, self.trainer.feature_pipeline.spatial_patterns)
+        for trial in self.trials:
+            self.mark_trial(*trial)
+        self.trainer.wait()
+        # the classifier is trained from the CSP features only
+        features, labels = list(), list()
+        for pos, duration in self.trials:
+            windows, _ = recording_windows(self.data[indices, pos:pos + duration], 125, 1.0, 0.2)
+            features.append(CursorControlPipeline(PSD_METHOD.fft, spatial_patterns=spatial_patterns).calculate_features(
+                windows, used_ch_names, 125, self.trainer.classifier.bands).reshape(len(windows), -1))
+            labels.append(np.full(len(windows), self.labels[pos]))
+        expected = LinearDiscriminant().fit(np.concatenate(features), np.concatenate(labels))
+        np.testing.assert_allclose(expected.weights, self.pipeline.classifier.weights, rtol=1e-8)
+
+    def test_marking_does_not_train(self):
+        """
+        A marked trial is only queued, it is trained by the background thread
+        """
+        for pos, duration in self.trials[:2]:
+            self.trainer.on_trial_marked(pos, duration, trial_handler.Labels(self.labels[pos]))
+        statistics = self.trainer.statistics
+        self.assertEqual(0, len(statistics.retrain_times) + statistics.skipped_trials)
+        self.trainer.start()
+        self.trainer.wait()
+        self.assertEqual(2, len(statistics.retrain_times) + statistics.skipped_trials)
+
+
+class TestOnlineTrainingSession(unittest.TestCase):
+
+    def setUp(self):
+        self.classifier_file = config.CLASSIFIER_FILE
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        online_training.stop_online_training()
+        online_training.stopped_trainer = None
+        config.CLASSIFIER_FILE = self.classifier_file
+        self.directory.cleanup()
+
+    def test_continue_and_save(self):
+        """
+        The training continues the classifier of config.CLASSIFIER_FILE and its result is saved next to the session
+        """
+        rng = np.random.default_rng(4)
+        saved = LinearDiscriminant().fit(rng.uniform(1, 2, (20, 4)), np.repeat([0, 1], 10))
+        saved.save(os.path.join(self.directory.name, 'session-1.classifier.npz'))
+        config.CLASSIFIER_FILE = os.path.join(self.directory.name, 'session-1.npz')
+
+        trainer = online_training.start_online_training(config.BCI_CHANNELS, 125)
+        np.testing.assert_array_equal(saved.weights, trainer.classifier.weights)
+        self.assertTrue(trainer.classifier.can_update)
+        online_training.stop_online_training()
+
+        path = online_training.save_trained_classifier(os.path.join(self.directory.name, 'session-2.npz'))
+        self.assertEqual(os.path.join(self.directory.name, 'session-2.classifier.npz'), path)
+        np.testing.assert_array_equal(saved.weights, load_classifier(path).weights)
+        self.assertIsNone(online_training.save_trained_classifier(os.path.join(self.directory.name, 'session-3.npz')))
+
+    def test_nothing_to_save(self):
+        config.CLASSIFIER_FILE = None
+        online_training.start_online_training(config.BCI_CHANNELS, 125)
+        online_training.stop_online_training()
+        self.assertIsNone(online_training.save_trained_classifier(os.path.join(self.directory.name, 'session-1.npz')))
+        self.assertEqual([], os.listdir(self.directory.name))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import csv
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from scripts.data.analysis.cursor_control_algorithm import PSD_METHOD
+from scripts.data.analysis.parameter_sweep import RESULT_FIELDS, create_tasks, rank_results, run_sweep
+
+SESSION_PATH = str(Path(__file__).resolve().parents[3] / 'scripts' / 'data' / 'session' /
+                   'session-1-05052022-154258.npz')
+
+
+class TestParameterSweep(unittest.TestCase):
+
+    def test_tasks_share_band_powers(self):
+        """
+        Thresholds are never split into tasks, bands only for the band limited methods
+        """
+        tasks = create_tasks(2, [PSD_METHOD.fft, PSD_METHOD.multitaper], [6, 8], [12, 14], [1.0, 2.0], [0.1],
+                             [1, 1.5])
+        fft_tasks = [task for task in tasks if task[1] == PSD_METHOD.fft]
+        multitaper_tasks = [task for task in tasks if task[1] == PSD_METHOD.multitaper]
+        self.assertEqual(2 * 2, len(fft_tasks))
+        self.assertEqual(2 * 2 * 4, len(multitaper_tasks))
+        self.assertEqual(((6, 12), (6, 14), (8, 12), (8, 14)), fft_tasks[0][4])
+        self.assertEqual((1, 1.5), fft_tasks[0][5])
+
+    def test_ranking_of_ties(self):
+        """
+        Settings with the same accuracies get the same ranks in every order of arrival
+        """
+        rows = [{'session': 's', 'method': 'fft', 'f_min': f_min, 'f_max': 12, 'window_size': 1.0,
+                 'window_offset': 0.1, 'threshold': threshold, 'trial_accuracy': 0.5, 'decided_accuracy': 0.5}
+                for f_min in (6, 8) for threshold in (1, 2)]
+        ranked = [(row['f_min'], row['threshold'], row['rank']) for row in rank_results([dict(row) for row in rows])]
+        reversed_ranked = [(row['f_min'], row['threshold'], row['rank'])
+                           for row in rank_results([dict(row) for row in reversed(rows)])]
+        self.assertEqual(ranked, reversed_ranked)
+
+    def test_sweep(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output_path = os.path.join(directory, 'sweep.csv')
+            results = run_sweep([SESSION_PATH], [6, 8], [12, 30], [1.0], [0.1, 0.2], [1, 2], [PSD_METHOD.fft],
+                                processes=2, output_path=output_path)
+            with open(output_path, newline='') as file:
+                table = list(csv.DictReader(file))
+
+        self.assertEqual(4 * 2 * 2, len(results))
+        self.assertEqual(list(range(1, len(results) + 1)), [row['rank'] for row in results])
+        accuracies = [row['trial_accuracy'] for row in results]
+        self.assertEqual(sorted(accuracies, reverse=True), accuracies)
+        self.assertEqual(RESULT_FIELDS, list(table[0].keys()))
+        self.assertEqual(len(results), len(table))
+
+        serial_results = run_sweep([SESSION_PATH], [6, 8], [12, 30], [1.0], [0.1, 0.2], [1, 2], [PSD_METHOD.fft],
+                                   processes=1)
+        self.assertEqual(results, serial_results)
+
+
+if __name__ == '__main__':
+    unittest.main()
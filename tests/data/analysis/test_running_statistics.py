@@ -0,0 +1,67 @@
+import unittest
+
+import numpy as np
+
+from scripts.data.analysis.running_statistics import RunningStatistics, StatisticsMode
+
+
+class TestRunningStatistics(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        # the level and the spread of the stream change after the calibration
+        self.values = np.concatenate([rng.normal(5, 2, 50), rng.normal(-3, 0.5, 300)])
+        self.capacity = 50
+
+    def test_calibration_equals_welford(self):
+        for mode in StatisticsMode:
+            statistics = RunningStatistics(self.capacity, mode)
+            for i, value in enumerate(self.values[:self.capacity]):
+                statistics.update(value)
+                self.assertAlmostEqual(np.mean(self.values[:i + 1]), statistics.mean)
+                self.assertAlmostEqual(np.std(self.values[:i + 1]), statistics.std)
+            self.assertTrue(statistics.is_calibrated)
+
+    def test_frozen(self):
+        statistics = RunningStatistics(self.capacity, StatisticsMode.frozen)
+        for value in self.values:
+            statistics.update(value)
+        self.assertAlmostEqual(np.mean(self.values[:self.capacity]), statistics.mean)
+        self.assertAlmostEqual(np.std(self.values[:self.capacity]), statistics.std)
+        self.assertEqual(len(self.values), statistics.count)
+
+    def test_sliding(self):
+        statistics = RunningStatistics(self.capacity, StatisticsMode.sliding)
+        for i, value in enumerate(self.values):
+            statistics.update(value)
+            window = self.values[max(i + 1 - self.capacity, 0):i + 1]
+            self.assertAlmostEqual(np.mean(window), statistics.mean)
+            self.assertAlmostEqual(np.std(window), statistics.std)
+
+    def test_exponential(self):
+        statistics = RunningStatistics(self.capacity, StatisticsMode.exponential)
+        for value in self.values:
+            statistics.update(value)
+        # weights of the values: the calibration counts as one block, afterwards every value decays by 1 - 1/capacity
+        alpha = 1 / self.capacity
+        n_adapted = len(self.values) - self.capacity
+        weights = np.concatenate([np.full(self.capacity, (1 - alpha) ** n_adapted / self.capacity),
+                                  alpha * (1 - alpha) ** np.arange(n_adapted - 1, -1, -1)])
+        mean = np.sum(weights * self.values)
+        self.assertAlmostEqual(mean, statistics.mean)
+        self.assertAlmostEqual(np.sqrt(np.sum(weights * (self.values - mean) ** 2)), statistics.std)
+        # the statistics have adapted to the new level of the stream
+        self.assertLess(abs(statistics.mean + 3), 0.5)
+
+    def test_standardize(self):
+        statistics = RunningStatistics(self.capacity)
+        statistics.update(1.0)
+        self.assertEqual(0, statistics.standardize(2.0))
+        statistics.update(3.0)
+        self.assertAlmostEqual(1.0, statistics.standardize(3.0))
+        statistics.reset()
+        self.assertEqual(0, statistics.count)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import unittest
+
+import numpy as np
+
+import scripts.config as config
+from scripts.data.acquisition.channels import sort_channels
+from scripts.data.analysis.batch_evaluation import evaluate_recording
+from scripts.data.analysis import cursor_control_algorithm
+from scripts.data.analysis.cursor_control_algorithm import CursorControlPipeline, PSD_METHOD
+from scripts.data.analysis.spatial_patterns import CommonSpatialPatterns, SpatialPatternsTrainer, fit_recording, \
+    fit_trial_handler, labelled_windows
+from scripts.data.analysis.spectral_estimation import trapezoid_weights
+from scripts.data.extraction import trial_handler
+from scripts.data.synthetic.eeg_generator import SyntheticEEG
+
+
+class TestCommonSpatialPatterns(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        indices, cls.channels = sort_channels(config.BCI_CHANNELS)
+        generator = SyntheticEEG(cls.channels, 125, common_noise_ratio=0.8, seed=11)
+        cls.train_data, cls.train_labels = generator.generate(120)
+        cls.test_data, cls.test_labels = generator.generate(120)
+
+    def test_labelled_windows(self):
+        windows, labels = labelled_windows(self.train_data, self.train_labels, 125, 1.0, 0.2)
+        self.assertEqual(len(windows), len(labels))
+        self.assertTrue(set(np.unique(labels)) <= {0, 1})
+        self.assertEqual((len(self.channels), 125), windows.shape[1:])
+
+    def test_band_covariance(self):
+        """
+        w^T C w is the band power of the spatially filtered standardized window
+        """
+        window = self.train_data[:, :125]
+        spatial_patterns = CommonSpatialPatterns()
+        covariance = spatial_patterns.band_covariances(window[np.newaxis], 125)[0]
+        w = np.random.default_rng(1).standard_normal(len(self.channels))
+        standardized = (window - window.mean(axis=1, keepdims=True)) / window.std(axis=1, keepdims=True)
+        spectrum = np.abs(np.fft.rfft(w @ standardized)) ** 2
+        freqs = np.fft.rfftfreq(125, 1 / 125)
+        in_band = (freqs >= 8) & (freqs <= 12)
+        band_power = np.sum(spectrum[in_band] * trapezoid_weights(freqs[in_band]))
+        trace = np.sum(np.abs(np.fft.rfft(standardized)[:, in_band]) ** 2 * trapezoid_weights(freqs[in_band]))
+        self.assertAlmostEqual(band_power / trace, w @ covariance @ w)
+
+    def test_row_convention(self):
+        spatial_patterns = fit_recording(self.train_data, self.train_labels, self.channels, 125,
+                                         spatial_patterns=CommonSpatialPatterns(n_pairs=2))
+        self.assertEqual((4, len(self.channels)), spatial_patterns.filters.shape)
+        # first the components of the right trials, then of the left trials
+        self.assertTrue(np.all(spatial_patterns.eigenvalues[:2] < 0.5))
+        self.assertTrue(np.all(spatial_patterns.eigenvalues[2:] > 0.5))
+        self.assertEqual(spatial_patterns.eigenvalues[0], spatial_patterns.eigenvalues.min())
+        self.assertEqual(spatial_patterns.eigenvalues[2], spatial_patterns.eigenvalues.max())
+
+    def test_projection_matrix(self):
+        spatial_patterns = fit_recording(self.train_data, self.train_labels, self.channels, 125)
+        reordered = tuple(reversed(self.channels)) + ('X1',)
+        matrix = spatial_patterns.projection_matrix(reordered)
+        np.testing.assert_array_equal(spatial_patterns.filters[:, ::-1], matrix[:, :-1])
+        np.testing.assert_array_equal(0, matrix[:, -1])
+        self.assertIs(matrix, spatial_patterns.projection_matrix(reordered))
+        with self.assertRaises(ValueError):
+            spatial_patterns.projection_matrix(tuple(self.channels[1:]))
+
+    def test_pipeline_with_csp(self):
+        """
+        The CSP components replace C3a and C4a
+        """
+        spatial_patterns = fit_recording(self.train_data, self.train_labels, self.channels, 125,
+                                         spatial_patterns=CommonSpatialPatterns(n_pairs=2))
+        csp = evaluate_recording(self.test_data, self.test_labels, self.channels, 125,
+                                 pipeline=CursorControlPipeline(PSD_METHOD.fft, spatial_patterns=spatial_patterns))
+        self.assertGreater(csp.decided_accuracy, 0.9)
+
+        # the sliding DFT applies the projection in the frequency domain
+        fft_pipeline = CursorControlPipeline(PSD_METHOD.fft, spatial_patterns=spatial_patterns)
+        sliding_pipeline = CursorControlPipeline(PSD_METHOD.sliding_dft, spatial_patterns=spatial_patterns)
+        for start in range(0, 250, 25):
+            window = self.test_data[:, start:start + 125]
+            self.assertAlmostEqual(fft_pipeline.process(window, self.channels, 125).hcon,
+                                   sliding_pipeline.process(window, self.channels, 125).hcon)
+
+    @staticmethod
+    def mark_trials(labels):
+        """Marks the runs of equal labels as the trials of the recording"""
+        changes = np.flatnonzero(np.diff(labels, prepend=-2, append=-2))
+        for start, end in zip(changes[:-1], changes[1:]):
+            if labels[start] != -1:
+                trial_handler.mark_trial(trial_handler.start_time + start * trial_handler.TIME_FOR_ONE_SAMPLE,
+                                         trial_handler.start_time + end * trial_handler.TIME_FOR_ONE_SAMPLE,
+                                         trial_handler.Labels(labels[start]))
+
+    def test_fit_trial_handler(self):
+        data, labels = SyntheticEEG(config.BCI_CHANNELS, 125, seed=5).generate(60)
+        trial_handler.reset_data()
+        trial_handler.send_raw_data(data)
+        trial_handler.mark_trial(trial_handler.start_time, trial_handler.start_time + 10,
+                                 trial_handler.Labels.CALIBRATION)
+        self.mark_trials(labels)
+        try:
+            np.testing.assert_array_equal(labels[1250:], trial_handler.create_label_array()[1250:])
+            spatial_patterns = fit_trial_handler(125)
+            expected = fit_recording(data[sort_channels(config.BCI_CHANNELS)[0]], labels,
+                                     sort_channels(config.BCI_CHANNELS)[1], 125)
+            np.testing.assert_allclose(expected.filters, spatial_patterns.filters)
+        finally:
+            trial_handler.reset_data()
+
+    def test_session_training(self):
+        """
+        The filters are trained once after enough trials of both classes and replace the montage before the next window
+        """
+        data, labels = SyntheticEEG(config.BCI_CHANNELS, 125, seed=5).generate(60)
+        trial_handler.reset_data()
+        trial_handler.send_raw_data(data)
+        trainer = SpatialPatternsTrainer(125, 1.0, 0.2, n_trials=2)
+        pipeline = cursor_control_algorithm.get_default_pipeline()
+        trainer.start()
+        try:
+            self.mark_trials(labels)
+            trainer.wait()
+            self.assertTrue(trainer.spatial_patterns.is_fitted)
+            self.assertIs(trainer.spatial_patterns, cursor_control_algorithm.used_spatial_patterns)
+            self.assertIs(pipeline, cursor_control_algorithm.get_default_pipeline())
+            self.assertIs(trainer.spatial_patterns, pipeline.spatial_patterns)
+        finally:
+            trainer.stop(wait=True)
+            cursor_control_algorithm.set_spatial_patterns(None)
+            trial_handler.reset_data()
+
+
+if __name__ == '__main__':
+    unittest.main()
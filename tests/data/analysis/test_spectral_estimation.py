@@ -0,0 +1,159 @@
+import unittest
+
+import mne
+import numpy as np
+import scipy.integrate
+from scipy import signal
+
+from scripts.data.analysis.cursor_control_algorithm import PSD_METHOD, integrate_psd_values
+from scripts.data.analysis.spectral_estimation import BandIntegrator, BurgEstimator, MultitaperEngine, \
+    SlidingDFTBandPower, burg_ar, dpss_tapers
+
+
+class TestMultitaperEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.samples = np.random.default_rng(0).standard_normal((2, 500))
+        self.engine = MultitaperEngine()
+
+    def test_matches_mne(self):
+        """
+        The engine should calculate the same psd as mne for narrow bands (DFT matrix) and the full spectrum (FFT)
+        """
+        for n_times, f_min, f_max in [(125, 8, 12), (250, 8, 30), (500, 0, np.inf), (249, 0, 125)]:
+            samples = self.samples[:, :n_times]
+            expected, expected_freqs = mne.time_frequency.psd_array_multitaper(samples, sfreq=250, bandwidth=4,
+                                                                               fmin=f_min, fmax=f_max, verbose=False)
+            psds, freqs = self.engine.psd(samples, 250, 4, f_min, f_max)
+            np.testing.assert_array_almost_equal(freqs, expected_freqs)
+            np.testing.assert_allclose(psds, expected, rtol=1e-8)
+
+    def test_float32(self):
+        """
+        float32 samples are processed with a float32 plan of their own
+        """
+        for n_times, f_min, f_max in [(125, 8, 12), (500, 0, np.inf)]:
+            samples = self.samples[:, :n_times]
+            expected, _ = self.engine.psd(samples, 250, 4, f_min, f_max)
+            psds, _ = self.engine.psd(samples.astype(np.float32), 250, 4, f_min, f_max)
+            self.assertEqual(np.float32, psds.dtype)
+            np.testing.assert_allclose(psds, expected, rtol=1e-4)
+        self.assertIsNot(self.engine.plan(125, 250, 4, 8, 12), self.engine.plan(125, 250, 4, 8, 12, np.float32))
+
+    def test_plans_are_cached(self):
+        plan = self.engine.plan(250, 250, 4, 8, 12)
+        self.assertIs(plan, self.engine.plan(250, 250, 4, 8, 12))
+        self.assertIs(dpss_tapers(250, 250, 4), dpss_tapers(250, 250, 4))
+
+    def test_invalid_bandwidth(self):
+        with self.assertRaises(ValueError):
+            self.engine.psd(self.samples[:, :100], 250, 1)
+
+
+class TestSlidingDFTBandPower(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.samples = rng.standard_normal((4, 2000)) * rng.uniform(1, 20, (4, 1)) + rng.uniform(-100, 100, (4, 1))
+        self.spatial_filter = np.array([[1, 0, -0.5, -0.5], [0, 1, -0.5, -0.5]])
+
+    def expected(self, window: np.ndarray):
+        standardized = (window - window.mean(axis=1, keepdims=True)) / window.std(axis=1, keepdims=True)
+        spectrum = np.abs(np.fft.rfft(self.spatial_filter @ standardized, axis=-1))
+        freqs = np.fft.rfftfreq(window.shape[1], 1 / 250)
+        band = (freqs >= 8) & (freqs <= 12)
+        return spectrum[:, band], freqs[band]
+
+    def test_equals_fft_of_standardized_window(self):
+        estimator = SlidingDFTBandPower(resync_interval=1000)
+        for start in range(0, 1750, 10):
+            window = self.samples[:, start:start + 250]
+            spectra, freqs = estimator.update(window, 10, 250, 8, 12, self.spatial_filter)
+            expected_spectra, expected_freqs = self.expected(window)
+            np.testing.assert_array_equal(freqs, expected_freqs)
+            np.testing.assert_allclose(spectra, expected_spectra, rtol=1e-8, atol=1e-9)
+        self.assertGreater(estimator.updates_since_resync, 100)
+
+    def test_recalculates_after_gap(self):
+        estimator = SlidingDFTBandPower()
+        estimator.update(self.samples[:, :250], 10, 250, 8, 12, self.spatial_filter)
+        window = self.samples[:, 500:750]  # does not continue the previous window
+        spectra, _ = estimator.update(window, 10, 250, 8, 12, self.spatial_filter)
+        np.testing.assert_allclose(spectra, self.expected(window)[0], rtol=1e-10)
+        self.assertEqual(0, estimator.updates_since_resync)
+
+
+class TestBurgEstimator(unittest.TestCase):
+
+    def setUp(self):
+        # AR(2) process x[n] - 1.2 x[n - 1] + 0.6 x[n - 2] = e[n]
+        self.polynomial = [1, -1.2, 0.6]
+        white = np.random.default_rng(2).standard_normal((3, 2, 5000))
+        self.samples = signal.lfilter([1], self.polynomial, white, axis=-1)
+
+    def test_recovers_ar_coefficients(self):
+        ar, noise_variance = burg_ar(self.samples, 2)
+        np.testing.assert_allclose(ar, np.broadcast_to(self.polynomial[1:], ar.shape), atol=0.05)
+        np.testing.assert_allclose(noise_variance, 1, atol=0.1)
+
+    def test_batch_equals_single_rows(self):
+        ar, noise_variance = burg_ar(self.samples[..., :200], 10)
+        for i, j in np.ndindex(self.samples.shape[:2]):
+            row_ar, row_noise_variance = burg_ar(self.samples[i, j, :200], 10)
+            np.testing.assert_allclose(ar[i, j], row_ar, rtol=1e-10, atol=1e-14)
+            np.testing.assert_allclose(noise_variance[i, j], row_noise_variance, rtol=1e-10)
+
+    def test_psd_of_ar_model(self):
+        """
+        The psd is the frequency response of the AR model on the requested band
+        """
+        estimator = BurgEstimator(order=10)
+        psds, freqs = estimator.psd(self.samples[0], 250, 8, 12)
+        np.testing.assert_allclose(freqs, np.arange(8, 12.1, 0.25))
+        ar, noise_variance = burg_ar(self.samples[0] - self.samples[0].mean(axis=-1, keepdims=True), 10)
+        for row in range(2):
+            _, response = signal.freqz([1], np.concatenate([[1], ar[row]]), worN=freqs, fs=250)
+            np.testing.assert_allclose(psds[row], 2 * noise_variance[row] / 250 * np.abs(response) ** 2, rtol=1e-10)
+
+    def test_invalid_order(self):
+        with self.assertRaises(ValueError):
+            burg_ar(self.samples[..., :10], 10)
+
+
+class TestBandIntegrator(unittest.TestCase):
+
+    def setUp(self):
+        self.integrator = BandIntegrator()
+        self.freqs = np.fft.rfftfreq(250, 1 / 125)
+        self.psds = np.random.default_rng(5).random((2, len(self.freqs)))
+
+    def test_equals_trapezoid_of_band(self):
+        bands = ((8, 12), (12.5, 30), (0, 62.5), (70, 80))
+        band_powers = self.integrator.integrate(self.psds, self.freqs, bands)
+        self.assertEqual((2, 4), band_powers.shape)
+        for i, (f_min, f_max) in enumerate(bands):
+            in_band = (self.freqs >= f_min) & (self.freqs <= f_max)
+            expected = scipy.integrate.trapezoid(self.psds[:, in_band], self.freqs[in_band]) if in_band.any() else 0
+            np.testing.assert_allclose(band_powers[:, i], expected, rtol=1e-12)
+
+    def test_weights_are_cached(self):
+        weights = self.integrator.weights(self.freqs, ((8, 12),))
+        self.assertIs(weights, self.integrator.weights(np.fft.rfftfreq(250, 1 / 125), ((8, 12),)))
+        self.assertIsNot(weights, self.integrator.weights(self.freqs, ((8, 13),)))
+
+    def test_integrate_psd_values_needs_band(self):
+        """
+        The PSD of the fft covers all frequencies, integrating it without the band would integrate the whole spectrum
+        """
+        with self.assertRaises(ValueError):
+            integrate_psd_values(self.psds[0], self.freqs, PSD_METHOD.fft)
+        in_band = (self.freqs >= 8) & (self.freqs <= 12)
+        self.assertAlmostEqual(scipy.integrate.trapezoid(self.psds[0, in_band], self.freqs[in_band]),
+                               integrate_psd_values(self.psds[0], self.freqs, PSD_METHOD.fft, (8, 12)))
+        # the multitaper PSD only covers the band
+        self.assertAlmostEqual(scipy.integrate.trapezoid(self.psds[0, in_band], self.freqs[in_band]),
+                               integrate_psd_values(self.psds[0, in_band], self.freqs[in_band], PSD_METHOD.multitaper))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import time
+import unittest
+
+import numpy as np
+
+import scripts.config as config
+from scripts.data.acquisition.channels import sort_channels
+from scripts.data.analysis import cursor_control_algorithm
+from scripts.data.analysis.cursor_control_algorithm import CursorControlPipeline, PSD_METHOD, set_profiler
+from scripts.data.analysis.stage_profiler import StageProfiler
+from scripts.data.synthetic.eeg_generator import SyntheticEEG
+from scripts.utils.event_listener import subscribe, unsubscribe
+
+
+class TestStageProfiler(unittest.TestCase):
+
+    def setUp(self):
+        data, _ = SyntheticEEG(config.BCI_CHANNELS, 125, seed=4).generate(10)
+        channel_order, self.used_ch_names = sort_channels(config.BCI_CHANNELS)
+        self.windows = [data[channel_order, start:start + 125] for start in range(0, data.shape[1] - 124, 25)]
+
+    def test_laps(self):
+        profiler = StageProfiler()
+        profiler.start()
+        time.sleep(0.01)
+        profiler.lap('first')
+        profiler.lap('second')
+        profiler.stop()
+        # a stage outside of start and stop is not timed
+        profiler.lap('outside')
+        profiler.count('windows')
+        summary = profiler.summary()
+        self.assertEqual(['first', 'second'], list(profiler.stages))
+        self.assertGreaterEqual(summary['first']['max_ms'], 10)
+        self.assertGreater(summary['first']['share'], summary['second']['share'])
+        self.assertEqual(1, summary['windows'])
+
+    def test_pipeline_stages(self):
+        """
+        The profiler times every stage of every window and does not change the results
+        """
+        for method in [PSD_METHOD.multitaper, PSD_METHOD.sliding_dft]:
+            profiler = StageProfiler()
+            pipeline = CursorControlPipeline(method, profiler=profiler)
+            reference = CursorControlPipeline(method)
+            for window in self.windows:
+                result = pipeline.process(window, self.used_ch_names, 125)
+                self.assertEqual(reference.process(window, self.used_ch_names, 125).hcon, result.hcon)
+            self.assertEqual(len(self.windows), profiler.counters['windows'])
+            self.assertTrue({'psd', 'integration', 'normalization'} <= set(profiler.stages))
+            for histogram in profiler.stages.values():
+                self.assertEqual(len(self.windows), histogram.count)
+
+    def test_process_windows(self):
+        profiler = StageProfiler()
+        pipeline = CursorControlPipeline(PSD_METHOD.fft, profiler=profiler)
+        pipeline.process_windows(np.array(self.windows), self.used_ch_names, 125)
+        self.assertEqual(len(self.windows), profiler.counters['windows'])
+        self.assertEqual(['spatial_filter', 'psd', 'integration', 'normalization'], list(profiler.stages))
+
+    def test_set_profiler(self):
+        """
+        The profiler of perform_algorithm is passed on to the pipeline of the algorithm worker
+        """
+        changes = list()
+
+        def on_changed(attribute, value):
+            changes.append((attribute, value))
+
+        subscribe("pipeline_changed", on_changed)
+        original = cursor_control_algorithm.used_profiler
+        try:
+            profiler = StageProfiler()
+            set_profiler(profiler)
+            self.assertIs(profiler, cursor_control_algorithm.get_default_pipeline().profiler)
+            set_profiler(None)
+            self.assertIsNone(cursor_control_algorithm.get_default_pipeline().profiler)
+        finally:
+            unsubscribe("pipeline_changed", on_changed)
+            set_profiler(original)
+        self.assertEqual([('profiler', profiler), ('profiler', None)], changes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -31,6 +31,14 @@ class MyTestCase(unittest.TestCase):
             expected_array[i] = [1, 2, 3, 4]
         self.assertEqual(expected_array, trial_handler.raw_data)
 
+    def test_send_raw_data_chunks(self):
+        data1 = [[1, 2] for _ in range(16)]
+        data2 = np.array([[3, 4, 5] for _ in range(16)])
+        trial_handler.send_raw_data(data1, start=time.time())
+        trial_handler.send_raw_data(data2)
+        expected_array = [[1, 2, 3, 4, 5] for _ in range(16)]
+        self.assertEqual(expected_array, [[int(sample) for sample in channel] for channel in trial_handler.raw_data])
+
     def test_mark_trial(self):
         data1 = [[1] for _ in range(16)]
         start = time.time()
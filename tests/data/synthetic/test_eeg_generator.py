@@ -0,0 +1,55 @@
+import time
+import unittest
+
+import numpy as np
+
+from scripts import config
+from scripts.data.extraction.trial_handler import Labels
+from scripts.data.synthetic.eeg_generator import SyntheticEEG
+
+
+def mu_power(samples: np.ndarray, sampling_rate: float):
+    spectrum = np.abs(np.fft.rfft(samples)) ** 2
+    freqs = np.fft.rfftfreq(len(samples), d=1 / sampling_rate)
+    return spectrum[(freqs >= 8) & (freqs <= 12)].sum()
+
+
+class TestSyntheticEEG(unittest.TestCase):
+
+    def test_shape_and_labels(self):
+        generator = SyntheticEEG(sampling_rate=250, trial_duration=4, rest_duration=2, seed=1)
+        chan_data, chan_label = generator.generate(60)
+        self.assertEqual((len(config.BCI_CHANNELS), 60 * 250), chan_data.shape)
+        self.assertEqual(60 * 250, len(chan_label))
+        self.assertEqual({-1, 0, 1}, set(np.unique(chan_label)))
+        # 10 trials of 4 s each
+        self.assertEqual(10 * 4 * 250, np.count_nonzero(chan_label != -1))
+        np.testing.assert_array_equal(chan_label[:2 * 250], -1)
+
+    def test_blocks_continue_schedule(self):
+        generator = SyntheticEEG(sampling_rate=125, seed=2)
+        labels = np.concatenate([generator.next_block(n)[1] for n in [7, 300, 1, 1000, 92]])
+        self.assertEqual(1400, generator.samples_generated)
+        changes = np.flatnonzero(np.diff(labels != -1))
+        # trials start after 2 s rest and last 4 s
+        np.testing.assert_array_equal(changes + 1, [250, 750, 1000])
+
+    def test_desynchronization(self):
+        generator = SyntheticEEG(sampling_rate=125, line_noise_freq=None, seed=3)
+        chan_data, chan_label = generator.generate(600)
+        c3 = chan_data[config.BCI_CHANNELS.index('C3')]
+        c4 = chan_data[config.BCI_CHANNELS.index('C4')]
+        left, right = chan_label == Labels.LEFT.value, chan_label == Labels.RIGHT.value
+        self.assertLess(mu_power(c3[left], 125) / left.sum(), mu_power(c3[right], 125) / right.sum())
+        self.assertLess(mu_power(c4[right], 125) / right.sum(), mu_power(c4[left], 125) / left.sum())
+
+    def test_one_hour_is_fast(self):
+        generator = SyntheticEEG(sampling_rate=250, seed=4)
+        start = time.perf_counter()
+        chan_data, _ = generator.generate(3600)
+        self.assertEqual(3600 * 250, chan_data.shape[1])
+        self.assertLess(time.perf_counter() - start, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import tempfile
+import types
+import unittest
+
+import numpy as np
+
+import scripts.data.analysis.cursor_control_algorithm as cursor_control_algorithm
+from scripts.data.analysis.cursor_control_algorithm import CursorControlResult, publish_result
+from scripts.utils.latency_tracing import LatencyHistogram, LatencyTracer, STAGES, latency_path
+
+
+class TestLatencyHistogram(unittest.TestCase):
+
+    def test_percentiles(self):
+        """
+        The percentiles are accurate to the width of a bin
+        """
+        histogram = LatencyHistogram()
+        latencies = np.random.default_rng(3).lognormal(np.log(0.02), 0.5, 5000)
+        for latency in latencies:
+            histogram.add(latency)
+        for q in (50, 95, 99):
+            self.assertAlmostEqual(np.percentile(latencies, q), histogram.percentile(q),
+                                   delta=0.13 * np.percentile(latencies, q))
+        self.assertEqual(len(latencies), histogram.count)
+        self.assertEqual(latencies.max(), histogram.maximum)
+
+    def test_out_of_range(self):
+        histogram = LatencyHistogram()
+        for latency in (0.0, 1e-9, 100.0):
+            histogram.add(latency)
+        self.assertEqual(3, histogram.counts.sum())
+        self.assertEqual(100.0, histogram.percentile(99))
+        self.assertEqual(0.0, LatencyHistogram().percentile(50))
+
+
+class TestLatencyTracer(unittest.TestCase):
+
+    def trace(self, tracer: LatencyTracer, *times):
+        trace = tracer.begin(times[0])
+        for stage, now in zip(STAGES[1:], times[1:]):
+            trace.stamp(stage, now)
+        return trace
+
+    def test_movement_waits_for_drawing(self):
+        tracer = LatencyTracer()
+        tracer.finish(self.trace(tracer, 0.0, 0.01, 0.03, 0.031), moved=True)
+        self.assertEqual(0, tracer.histograms['end_to_end'].count)
+        tracer.drawn()
+        summary = tracer.summary()
+        for stage in STAGES[1:] + ('end_to_end',):
+            self.assertEqual(1, summary[stage]['count'])
+        self.assertGreater(summary['drawn']['max_ms'], 0)
+        # the stages add up to the delay from the samples to the movement
+        self.assertAlmostEqual(summary['end_to_end']['max_ms'],
+                               sum(summary[stage]['max_ms'] for stage in STAGES[1:]))
+
+    def test_window_without_movement(self):
+        tracer = LatencyTracer()
+        tracer.finish(self.trace(tracer, 0.0, 0.01, 0.03, 0.031), moved=False)
+        tracer.drawn()
+        self.assertEqual(1, tracer.histograms['published'].count)
+        self.assertEqual(0, tracer.histograms['drawn'].count)
+        self.assertEqual(0, tracer.histograms['end_to_end'].count)
+
+    def test_disabled(self):
+        tracer = LatencyTracer(enabled=False)
+        self.assertIsNone(tracer.begin())
+        tracer.finish(None, moved=True)
+        tracer.drawn()
+        self.assertEqual(0, tracer.histograms['end_to_end'].count)
+
+    def test_publish_result(self):
+        """
+        A published label finishes the trace of its window
+        """
+        tracer = LatencyTracer()
+        trace = tracer.begin()
+        trace.stamp('processed')
+        result = CursorControlResult(hcon=0.0, standardized_hcon=-1.0, area_c3=0.0, area_c4=0.0, label=-1)
+        original, cursor_control_algorithm.tracer = cursor_control_algorithm.tracer, tracer
+        try:
+            publish_result(result, types.SimpleNamespace(draw_plot=False), trace=trace)
+        finally:
+            cursor_control_algorithm.tracer = original
+        self.assertIsNotNone(trace.times[STAGES.index('published')])
+        self.assertEqual(1, tracer.histograms['published'].count)
+
+    def test_save(self):
+        tracer = LatencyTracer()
+        tracer.finish(self.trace(tracer, 0.0, 0.01, 0.03, 0.031), moved=True)
+        tracer.drawn()
+        with tempfile.TemporaryDirectory() as directory:
+            path = latency_path(os.path.join(directory, 'session-1'))
+            self.assertTrue(path.endswith('session-1.latency.npz'))
+            tracer.save(path)
+            with np.load(path) as latencies:
+                self.assertEqual(list(tracer.histograms), list(latencies['stages']))
+                self.assertEqual((len(tracer.histograms), 3), latencies['percentiles'].shape)
+                self.assertEqual(1, latencies['counts'][list(latencies['stages']).index('end_to_end')].sum())
+
+
+if __name__ == '__main__':
+    unittest.main()